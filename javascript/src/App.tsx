@@ -34,6 +34,11 @@ interface ConversationListItem {
   created_at: string; // ISO date string
 }
 
+interface ConversationListResponse {
+  items: ConversationListItem[];
+  next_cursor: string | null;
+}
+
 interface Turn {
   id: string;
   parent_id: string | null;
@@ -41,6 +46,7 @@ interface Turn {
   branched_child_ids: string[];
   human_text: string | null;
   bot_text: string | null;
+  status: "pending" | "running" | "complete" | "failed";
   created_at: string;
 }
 
@@ -173,6 +179,24 @@ function Chat({ onNewConversation }: { onNewConversation?: () => void }) {
   const [isReplying, setIsReplying] = useState(false);
   const [replyMode, setReplyMode] = useState<"reply" | "branch">("reply");
 
+  // With the server's job queue on, a new turn comes back before its response is
+  // generated; long-poll until it's done
+  const waitForTurn = async (turn: Turn) => {
+    let current = turn;
+    while (current.status === "pending" || current.status === "running") {
+      const user = auth.currentUser;
+      if (!user) return;
+      const token = await user.getIdToken();
+      const res = await fetch(`${apiHost}/api/turn/${current.id}?wait=25`, {
+        headers: { Authorization: `Bearer ${token}` },
+      });
+      if (!res.ok) throw new Error(`HTTP ${res.status}`);
+      current = await res.json();
+      const updated = current;
+      setTurns((prev) => prev.map((t) => (t.id === updated.id ? updated : t)));
+    }
+  };
+
   const handleReply = async (e: React.FormEvent) => {
     e.preventDefault();
     if (!replyText.trim() || turns.length === 0) return;
@@ -211,6 +235,9 @@ function Chat({ onNewConversation }: { onNewConversation?: () => void }) {
         }
       } else {
         setTurns((prev) => [...prev, newTurn]);
+        waitForTurn(newTurn).catch((err) =>
+          console.error("Failed to fetch reply:", err)
+        );
       }
       setReplyText("");
     } catch (err) {
@@ -244,6 +271,11 @@ function Chat({ onNewConversation }: { onNewConversation?: () => void }) {
         const data: Turn[] = await res.json();
         setTurns(data);
         setError(null);
+        if (data.length > 0) {
+          waitForTurn(data[data.length - 1]).catch((err) =>
+            console.error("Failed to fetch reply:", err)
+          );
+        }
       } catch (err) {
         console.error("Error fetching conversation:", err);
         setError("Failed to load conversation.");
@@ -396,14 +428,22 @@ function App() {
     string | null
   >(null);
 
-  const fetchConversations = async () => {
+  const [nextConversationCursor, setNextConversationCursor] = useState<
+    string | null
+  >(null);
+
+  // Fetches the first page of conversations, or the page after `cursor` and appends it
+  const fetchConversations = async (cursor: string | null = null) => {
     const user = auth.currentUser;
     if (!user) return;
 
     try {
       const token = await user.getIdToken();
 
-      const response = await fetch(`${apiHost}/api/conversations`, {
+      const params = new URLSearchParams();
+      if (cursor) params.set("cursor", cursor);
+
+      const response = await fetch(`${apiHost}/api/conversations?${params}`, {
         headers: {
           Authorization: `Bearer ${token}`,
         },
@@ -413,15 +453,13 @@ function App() {
         throw new Error(`HTTP ${response.status}`);
       }
 
-      const data: ConversationListItem[] = await response.json();
+      // Pages come back sorted by created_at DESC
+      const data: ConversationListResponse = await response.json();
 
-      // Sort client-side by created_at DESC
-      const sorted = data.sort(
-        (a, b) =>
-          new Date(b.created_at).getTime() - new Date(a.created_at).getTime()
+      setConversations((prev) =>
+        cursor ? [...prev, ...data.items] : data.items
       );
-
-      setConversations(sorted);
+      setNextConversationCursor(data.next_cursor);
       setConversationFetchError(null);
     } catch (err) {
       console.error("Failed to fetch conversations:", err);
@@ -478,6 +516,7 @@ function App() {
       console.log("Signed out successfully");
       setUserData(null);
       setConversations([]); // clear sidebar
+      setNextConversationCursor(null);
       navigate("/"); // ⬅️ Redirect to Home
     } catch (err) {
       console.error("Logout error:", err);
@@ -640,6 +679,16 @@ function App() {
                 </Link>
               </li>
             ))}
+            {nextConversationCursor && (
+              <li>
+                <button
+                  onClick={() => fetchConversations(nextConversationCursor)}
+                  style={{ width: "100%", fontSize: "14px" }}
+                >
+                  Load more
+                </button>
+              </li>
+            )}
           </ul>
         )}
       </div>
@@ -663,7 +712,7 @@ function App() {
               element={
                 <Home
                   userData={userData}
-                  onNewConversation={fetchConversations}
+                  onNewConversation={() => fetchConversations()}
                 />
               }
             />
@@ -672,7 +721,9 @@ function App() {
             <Route path="/signup" element={<Signup />} />
             <Route
               path="/chat/:identifyingTurnId"
-              element={<Chat onNewConversation={fetchConversations} />}
+              element={
+                <Chat onNewConversation={() => fetchConversations()} />
+              }
             />
           </Routes>
         )}
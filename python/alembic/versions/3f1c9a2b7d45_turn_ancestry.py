@@ -0,0 +1,82 @@
+"""Add materialized ancestry (root_id, depth, path) to turn
+
+Revision ID: 3f1c9a2b7d45
+Revises:
+Create Date: 2026-10-18 09:12:31.402118
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlalchemy_utils
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = "3f1c9a2b7d45"
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        "turn",
+        sa.Column("root_id", sa.Uuid(), nullable=True),
+        schema="main",
+    )
+    op.add_column(
+        "turn",
+        sa.Column("depth", sa.Integer(), nullable=False, server_default="0"),
+        schema="main",
+    )
+    op.add_column(
+        "turn",
+        sa.Column(
+            "path",
+            postgresql.ARRAY(sqlalchemy_utils.types.uuid.UUIDType()),
+            nullable=False,
+            server_default="{}",
+        ),
+        schema="main",
+    )
+
+    # Backfill by walking every tree down from its root
+    op.execute(
+        """
+        WITH RECURSIVE lineage AS (
+            SELECT id, id AS root_id, 0 AS depth, ARRAY[id] AS path
+            FROM main.turn
+            WHERE parent_id IS NULL
+            UNION ALL
+            SELECT
+                child.id, lineage.root_id, lineage.depth + 1, lineage.path || child.id
+            FROM main.turn AS child
+            JOIN lineage ON child.parent_id = lineage.id
+        )
+        UPDATE main.turn
+        SET root_id = lineage.root_id, depth = lineage.depth, path = lineage.path
+        FROM lineage
+        WHERE turn.id = lineage.id
+        """
+    )
+
+    op.alter_column("turn", "depth", server_default=None, schema="main")
+    op.alter_column("turn", "path", server_default=None, schema="main")
+    op.create_index(
+        "ix_turn_root_id_depth", "turn", ["root_id", "depth"], schema="main"
+    )
+    op.create_index(
+        "ix_turn_path", "turn", ["path"], schema="main", postgresql_using="gin"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_turn_path", table_name="turn", schema="main")
+    op.drop_index("ix_turn_root_id_depth", table_name="turn", schema="main")
+    op.drop_column("turn", "path", schema="main")
+    op.drop_column("turn", "depth", schema="main")
+    op.drop_column("turn", "root_id", schema="main")
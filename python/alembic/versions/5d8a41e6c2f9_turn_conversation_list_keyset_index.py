@@ -0,0 +1,56 @@
+"""Extend the conversation list index with id for keyset pagination
+
+Revision ID: 5d8a41e6c2f9
+Revises: b7e2d1c08a63
+Create Date: 2026-10-18 12:03:44.187590
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "5d8a41e6c2f9"
+down_revision: Union[str, Sequence[str], None] = "b7e2d1c08a63"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # (created_at, id) is the page cursor, so both have to be in the index for the
+    # row comparison to be an index condition rather than a filter
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_turn_user_id_created_at_id",
+            "turn",
+            ["user_id", "created_at", "id"],
+            schema="main",
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            "ix_turn_user_id_created_at",
+            table_name="turn",
+            schema="main",
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_turn_user_id_created_at",
+            "turn",
+            ["user_id", "created_at"],
+            schema="main",
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            "ix_turn_user_id_created_at_id",
+            table_name="turn",
+            schema="main",
+            postgresql_concurrently=True,
+        )
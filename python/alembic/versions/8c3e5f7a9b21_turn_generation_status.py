@@ -0,0 +1,67 @@
+"""Add generation status to turn for the job queue
+
+Revision ID: 8c3e5f7a9b21
+Revises: 5d8a41e6c2f9
+Create Date: 2026-10-18 14:21:09.512347
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "8c3e5f7a9b21"
+down_revision: Union[str, Sequence[str], None] = "5d8a41e6c2f9"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Existing turns were generated inline: they either have a response or the
+    # generation failed
+    op.add_column(
+        "turn",
+        sa.Column("status", sa.String(), nullable=False, server_default="complete"),
+        schema="main",
+    )
+    op.execute("UPDATE main.turn SET status = 'failed' WHERE bot_text IS NULL")
+    op.alter_column("turn", "status", server_default=None, schema="main")
+    op.add_column(
+        "turn",
+        sa.Column("attempts", sa.Integer(), nullable=False, server_default="0"),
+        schema="main",
+    )
+    op.alter_column("turn", "attempts", server_default=None, schema="main")
+    op.add_column(
+        "turn",
+        sa.Column("claimed_at", sa.DateTime(timezone=True), nullable=True),
+        schema="main",
+    )
+
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_turn_generation_queue",
+            "turn",
+            ["created_at"],
+            schema="main",
+            postgresql_where=sa.text("status IN ('pending', 'running')"),
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_turn_generation_queue",
+            table_name="turn",
+            schema="main",
+            postgresql_concurrently=True,
+        )
+    op.drop_column("turn", "claimed_at", schema="main")
+    op.drop_column("turn", "attempts", schema="main")
+    op.drop_column("turn", "status", schema="main")
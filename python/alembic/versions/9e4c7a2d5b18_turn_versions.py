@@ -0,0 +1,106 @@
+"""Replace turn.updated_at with version counters bumped on commit order
+
+Revision ID: 9e4c7a2d5b18
+Revises: f8a3c6d1e572
+Create Date: 2026-10-18 22:41:53.617209
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlalchemy_utils
+
+
+# revision identifiers, used by Alembic.
+revision: str = "9e4c7a2d5b18"
+down_revision: Union[str, Sequence[str], None] = "f8a3c6d1e572"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BUMP_TURN_VERSIONS = """
+CREATE OR REPLACE FUNCTION main.bump_turn_versions() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    UPDATE main."user" SET turns_version = turns_version + 1
+    WHERE id IN (SELECT user_id FROM changed_turns);
+    INSERT INTO main.tree_version (root_id, version)
+    SELECT DISTINCT root_id, 1 FROM changed_turns WHERE root_id IS NOT NULL
+    ON CONFLICT (root_id) DO UPDATE SET version = tree_version.version + 1;
+    RETURN NULL;
+END
+$$
+"""
+TURN_VERSION_TRIGGERS = {
+    "turn_versions_insert": "AFTER INSERT ON main.turn REFERENCING NEW TABLE",
+    "turn_versions_update": "AFTER UPDATE ON main.turn REFERENCING NEW TABLE",
+    "turn_versions_delete": "AFTER DELETE ON main.turn REFERENCING OLD TABLE",
+}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # A constant default, so existing users get it without the table being rewritten.
+    # Trees without a tree_version row yet count as version 0.
+    op.add_column(
+        "user",
+        sa.Column("turns_version", sa.BigInteger(), nullable=False, server_default="0"),
+        schema="main",
+    )
+    op.create_table(
+        "tree_version",
+        sa.Column("root_id", sqlalchemy_utils.types.uuid.UUIDType(), nullable=False),
+        sa.Column("version", sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint("root_id"),
+        schema="main",
+    )
+    op.execute(BUMP_TURN_VERSIONS)
+    for name, when in TURN_VERSION_TRIGGERS.items():
+        op.execute(
+            f"CREATE TRIGGER {name} {when} AS changed_turns"
+            " FOR EACH STATEMENT EXECUTE FUNCTION main.bump_turn_versions()"
+        )
+
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_turn_user_id_updated_at",
+            table_name="turn",
+            schema="main",
+            postgresql_concurrently=True,
+        )
+    op.drop_column("turn", "updated_at", schema="main")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.add_column(
+        "turn",
+        sa.Column(
+            "updated_at",
+            sa.DateTime(timezone=True),
+            nullable=False,
+            server_default=sa.text("now()"),
+        ),
+        schema="main",
+    )
+    op.alter_column(
+        "turn",
+        "updated_at",
+        server_default=sa.text("clock_timestamp()"),
+        schema="main",
+    )
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_turn_user_id_updated_at",
+            "turn",
+            ["user_id", "updated_at"],
+            schema="main",
+            postgresql_concurrently=True,
+        )
+
+    for name in TURN_VERSION_TRIGGERS:
+        op.execute(f"DROP TRIGGER {name} ON main.turn")
+    op.execute("DROP FUNCTION main.bump_turn_versions()")
+    op.drop_table("tree_version", schema="main")
+    op.drop_column("user", "turns_version", schema="main")
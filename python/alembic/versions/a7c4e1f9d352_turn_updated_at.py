@@ -0,0 +1,63 @@
+"""Add updated_at to turn, for ETags
+
+Revision ID: a7c4e1f9d352
+Revises: e4b9d2a61f38
+Create Date: 2026-10-18 16:40:12.305718
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "a7c4e1f9d352"
+down_revision: Union[str, Sequence[str], None] = "e4b9d2a61f38"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Add the column with a stable default first: existing turns all get the time of
+    # the migration without the table being rewritten (which a volatile default like
+    # clock_timestamp() would force)
+    op.add_column(
+        "turn",
+        sa.Column(
+            "updated_at",
+            sa.DateTime(timezone=True),
+            nullable=False,
+            server_default=sa.text("now()"),
+        ),
+        schema="main",
+    )
+    op.alter_column(
+        "turn",
+        "updated_at",
+        server_default=sa.text("clock_timestamp()"),
+        schema="main",
+    )
+
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_turn_user_id_updated_at",
+            "turn",
+            ["user_id", "updated_at"],
+            schema="main",
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_turn_user_id_updated_at",
+            table_name="turn",
+            schema="main",
+            postgresql_concurrently=True,
+        )
+    op.drop_column("turn", "updated_at", schema="main")
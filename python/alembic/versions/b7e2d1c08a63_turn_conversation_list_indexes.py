@@ -0,0 +1,69 @@
+"""Add indexes for the conversation list and child lookups on turn
+
+Revision ID: b7e2d1c08a63
+Revises: 3f1c9a2b7d45
+Create Date: 2026-10-18 10:47:05.916342
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "b7e2d1c08a63"
+down_revision: Union[str, Sequence[str], None] = "3f1c9a2b7d45"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Build concurrently so the turn table stays writable while this runs
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_turn_user_id_created_at",
+            "turn",
+            ["user_id", "created_at"],
+            schema="main",
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            "ix_turn_parent_id",
+            "turn",
+            ["parent_id"],
+            schema="main",
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            "ix_turn_branched_child_ids",
+            "turn",
+            ["branched_child_ids"],
+            schema="main",
+            postgresql_using="gin",
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_turn_branched_child_ids",
+            table_name="turn",
+            schema="main",
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            "ix_turn_parent_id",
+            table_name="turn",
+            schema="main",
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            "ix_turn_user_id_created_at",
+            table_name="turn",
+            schema="main",
+            postgresql_concurrently=True,
+        )
@@ -0,0 +1,61 @@
+"""Add a full-text search vector to turn
+
+Revision ID: c5d8f2a4e619
+Revises: a7c4e1f9d352
+Create Date: 2026-10-18 18:05:47.118264
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = "c5d8f2a4e619"
+down_revision: Union[str, Sequence[str], None] = "a7c4e1f9d352"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # A stored generated column: adding it rewrites the table, computing every
+    # existing turn's vector, under an exclusive lock
+    op.add_column(
+        "turn",
+        sa.Column(
+            "search_vector",
+            postgresql.TSVECTOR(),
+            sa.Computed(
+                "setweight(to_tsvector('english', coalesce(human_text, '')), 'A')"
+                " || setweight(to_tsvector('english', coalesce(bot_text, '')), 'B')",
+                persisted=True,
+            ),
+        ),
+        schema="main",
+    )
+
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_turn_search_vector",
+            "turn",
+            ["search_vector"],
+            schema="main",
+            postgresql_using="gin",
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_turn_search_vector",
+            table_name="turn",
+            schema="main",
+            postgresql_concurrently=True,
+        )
+    op.drop_column("turn", "search_vector", schema="main")
@@ -0,0 +1,44 @@
+"""Drop the unused GIN index on turn.branched_child_ids
+
+Revision ID: d2f6b8e3a194
+Revises: c5d8f2a4e619
+Create Date: 2026-10-18 21:12:38.504117
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "d2f6b8e3a194"
+down_revision: Union[str, Sequence[str], None] = "c5d8f2a4e619"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Branch parents are found by joining on their primary key (`= ANY`), which a GIN
+    # index can't serve, so this only slowed down every branch insert
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_turn_branched_child_ids",
+            table_name="turn",
+            schema="main",
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_turn_branched_child_ids",
+            "turn",
+            ["branched_child_ids"],
+            schema="main",
+            postgresql_using="gin",
+            postgresql_concurrently=True,
+        )
@@ -0,0 +1,38 @@
+"""Add prompt_tokens and rolling summary to turn
+
+Revision ID: e4b9d2a61f38
+Revises: 8c3e5f7a9b21
+Create Date: 2026-10-18 15:02:31.846120
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = "e4b9d2a61f38"
+down_revision: Union[str, Sequence[str], None] = "8c3e5f7a9b21"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        "turn", sa.Column("prompt_tokens", sa.Integer(), nullable=True), schema="main"
+    )
+    op.add_column(
+        "turn",
+        sa.Column("summary", sqlmodel.sql.sqltypes.AutoString(), nullable=True),
+        schema="main",
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("turn", "summary", schema="main")
+    op.drop_column("turn", "prompt_tokens", schema="main")
@@ -0,0 +1,44 @@
+"""Drop the unused GIN index on turn.path
+
+Revision ID: f8a3c6d1e572
+Revises: d2f6b8e3a194
+Create Date: 2026-10-18 21:34:09.271853
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "f8a3c6d1e572"
+down_revision: Union[str, Sequence[str], None] = "d2f6b8e3a194"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Paths are only ever read from the turn they belong to (looked up by primary
+    # key), never searched, so this only made every insert write GIN entries
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_turn_path",
+            table_name="turn",
+            schema="main",
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_turn_path",
+            "turn",
+            ["path"],
+            schema="main",
+            postgresql_using="gin",
+            postgresql_concurrently=True,
+        )
@@ -1,5 +1,11 @@
 import base64
+import hashlib
+import logging
 import os
+import time
+from collections import OrderedDict
+from collections.abc import Callable
+from threading import Lock
 from typing import Any
 
 import firebase_admin
@@ -7,14 +13,32 @@ from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from firebase_admin import auth as fb_auth
 from firebase_admin import credentials
+from starlette.concurrency import run_in_threadpool
 
 # TODO: remove from web
 from web.schemas.user import CurrentUser
+from web.timing import timed
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
 
 bearer_scheme = HTTPBearer(auto_error=False)
 
+# How many verified tokens to remember (a few per active user)
+TOKEN_CACHE_SIZE = int(os.environ.get("FIREBASE_TOKEN_CACHE_SIZE", 10_000))
+
+
+_authenticate_lock = Lock()
+
 
 def authenticate():
+    """
+    Initialize the Firebase app for this process, if it isn't yet. Called on first use
+    (and at startup, to fail fast on missing settings) rather than at import.
+    """
+    if firebase_admin._apps:
+        return
+
     project_id = os.getenv("FIREBASE_PROJECT_ID")
     client_email = os.getenv("FIREBASE_CLIENT_EMAIL")
     private_key_b64 = os.getenv("FIREBASE_PRIVATE_KEY_BASE64")
@@ -25,32 +49,100 @@ def authenticate():
     # Decode the base64 private key
     private_key = base64.b64decode(private_key_b64).decode("utf-8")
 
-    if not firebase_admin._apps:
-        cred = credentials.Certificate(
-            {
-                "type": "service_account",
-                "project_id": project_id,
-                "private_key_id": "dummy",  # not strictly used in verification
-                "private_key": private_key,
-                "client_email": client_email,
-                "client_id": "dummy",
-                "auth_uri": "https://accounts.google.com/o/oauth2/auth",
-                "token_uri": "https://oauth2.googleapis.com/token",
-                "auth_provider_x509_cert_url": "https://www.googleapis.com/oauth2/v1/certs",
-                "client_x509_cert_url": f"https://www.googleapis.com/robot/v1/metadata/x509/{client_email}",
-            }
-        )
-        firebase_admin.initialize_app(cred)
+    with _authenticate_lock:
+        if not firebase_admin._apps:
+            cred = credentials.Certificate(
+                {
+                    "type": "service_account",
+                    "project_id": project_id,
+                    "private_key_id": "dummy",  # not strictly used in verification
+                    "private_key": private_key,
+                    "client_email": client_email,
+                    "client_id": "dummy",
+                    "auth_uri": "https://accounts.google.com/o/oauth2/auth",
+                    "token_uri": "https://oauth2.googleapis.com/token",
+                    "auth_provider_x509_cert_url": "https://www.googleapis.com/oauth2/v1/certs",
+                    "client_x509_cert_url": f"https://www.googleapis.com/robot/v1/metadata/x509/{client_email}",
+                }
+            )
+            firebase_admin.initialize_app(cred)
+
+
+def _forget_app() -> None:
+    # A forked child (e.g. a gunicorn worker under --preload) makes its own app rather
+    # than sharing its parent's HTTP sessions, and mustn't inherit a lock some other
+    # thread of the parent held
+    global _authenticate_lock
+    _authenticate_lock = Lock()
+    firebase_admin._apps.clear()
+
+
+os.register_at_fork(after_in_child=_forget_app)
 
 
 def verify_firebase_token(token: str) -> dict[str, Any]:
+    authenticate()
     return fb_auth.verify_id_token(token)
 
 
+def get_token_verifier() -> Callable[[str], dict[str, Any]]:
+    """
+    The ID token verifier `get_current_user` uses: Firebase's, unless a test (or the
+    load test, see benchmarks/load_app.py) overrides this dependency
+    """
+    return verify_firebase_token
+
+
+class TokenCache:
+    """
+    Users for tokens that have already been verified, keyed by a hash of the token (so
+    the tokens themselves aren't kept around), each dropped at its token's expiry.
+    Evicts the least recently used token when full.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        # Token hash -> (user, `exp` claim)
+        self._entries: OrderedDict[str, tuple[CurrentUser, float]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, key: str) -> CurrentUser | None:
+        entry = self._entries.get(key)
+        if entry is None or entry[1] <= time.time():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, key: str, user: CurrentUser, expires_at: float) -> None:
+        self._entries[key] = (user, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+token_cache = TokenCache(TOKEN_CACHE_SIZE)
+
+
 # TODO: try to remove async/await
 # TODO: if this is FastAPI-coupled, figure out better organization
 async def get_current_user(
     creds: HTTPAuthorizationCredentials = Depends(bearer_scheme),
+    token_verifier: Callable[[str], dict[str, Any]] = Depends(get_token_verifier),
 ) -> CurrentUser:
     if not creds or creds.scheme.lower() != "bearer":
         raise HTTPException(
@@ -59,8 +151,15 @@ async def get_current_user(
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+    cache_key = TokenCache.key(creds.credentials)
+    if user := token_cache.get(cache_key):
+        return user
+
     try:
-        decoded = verify_firebase_token(creds.credentials)
+        # Signature verification is CPU work (plus the odd certificate fetch), so it
+        # stays off the event loop
+        with timed("auth"):
+            decoded = await run_in_threadpool(token_verifier, creds.credentials)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -85,7 +184,7 @@ async def get_current_user(
     }
     custom_claims = {k: v for k, v in decoded.items() if k not in reserved}
 
-    return CurrentUser(
+    user = CurrentUser(
         uid=decoded.get("uid") or decoded.get("user_id"),
         email=decoded.get("email"),
         name=decoded.get("name"),
@@ -93,3 +192,5 @@ async def get_current_user(
         email_verified=decoded.get("email_verified"),
         claims=custom_claims,
     )
+    token_cache.put(cache_key, user, decoded["exp"])
+    return user
@@ -0,0 +1,80 @@
+import time
+
+import pytest
+from auth import firebase
+from auth.firebase import get_current_user, get_token_verifier
+from benchmarks.fake_auth import fake_id_token, verify_fake_token
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from web.schemas.user import CurrentUser
+
+app = FastAPI()
+
+
+@app.get("/me")
+async def me(user: CurrentUser = Depends(get_current_user)):
+    return user
+
+
+client = TestClient(app)
+
+
+@pytest.fixture(name="verifier_calls")
+def verifier_calls_fixture():
+    """Verifies fake tokens, counting the verifications"""
+    calls = []
+
+    def verifier(token: str):
+        calls.append(token)
+        return verify_fake_token(token)
+
+    app.dependency_overrides[get_token_verifier] = lambda: verifier
+    firebase.token_cache.clear()
+    yield calls
+    firebase.token_cache.clear()
+    del app.dependency_overrides[get_token_verifier]
+
+
+def _get_me(token: str):
+    return client.get("/me", headers={"Authorization": f"Bearer {token}"})
+
+
+def test_verified_tokens_are_cached(verifier_calls):
+    token = fake_id_token("cache_test_uid", "cache@test.com")
+
+    for _ in range(3):
+        response = _get_me(token)
+        assert response.status_code == 200
+        assert response.json()["uid"] == "cache_test_uid"
+    assert len(verifier_calls) == 1
+
+    # Each token is verified (once) on its own
+    assert _get_me(fake_id_token("other_uid", "other@test.com")).status_code == 200
+    assert len(verifier_calls) == 2
+
+
+def test_invalid_and_expired_tokens(verifier_calls):
+    assert _get_me("not-a-token").status_code == 401
+    assert client.get("/me").status_code == 401
+
+    expired = fake_id_token("expired_uid", "expired@test.com", expires_in=-1)
+    assert _get_me(expired).status_code == 401
+    assert len(firebase.token_cache) == 0
+
+
+def test_token_cache_expiry_and_eviction():
+    cache = firebase.TokenCache(maxsize=2)
+    user = CurrentUser(uid="uid", email="uid@test.com")
+
+    cache.put("expired", user, time.time() - 1)
+    assert cache.get("expired") is None
+    assert len(cache) == 0
+
+    cache.put("a", user, time.time() + 60)
+    cache.put("b", user, time.time() + 60)
+    cache.get("a")
+    cache.put("c", user, time.time() + 60)
+    # "b" was the least recently used
+    assert cache.get("b") is None
+    assert cache.get("a") is user
+    assert cache.get("c") is user
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Latency of branching from a turn: one transaction vs the old two-commit write.
+
+The old write committed the new turn, refreshed it, then read-modified-wrote the
+parent's branched_child_ids list and committed again; it's kept here as `two_commits`
+for comparison. Each batch fires `--concurrency` branches at one parent, from that many
+threads, against the test database, and reports per-branch latency and how many of the
+branches the parent actually ended up listing.
+
+Run from the python directory:
+    python -m benchmarks.branch_writes [--concurrency 1 50] [--repeat 5]
+"""
+
+import argparse
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from uuid import UUID
+
+from database.database import create_all_tables, get_test_engine
+from models.turn import Turn
+from models.user import User
+from sqlmodel import Session, delete, select
+from web.dao import conversations
+from web.dao.conversations import _with_ancestry
+
+BENCHMARK_UID = "branch_writes_benchmark"
+
+
+def two_commits(session: Session, user_id: UUID, parent_turn_id: UUID, text: str):
+    parent = session.get(Turn, parent_turn_id)
+
+    if not parent or parent.user_id != user_id:
+        raise ValueError("Invalid parent or unauthorized")
+
+    new_turn = _with_ancestry(
+        Turn(
+            user_id=user_id,
+            human_text=text,
+            model="gemini-2.5-flash",
+            title=parent.title + " - branch",
+            parent_id=parent.id,
+            bot_text=None,
+        ),
+        parent,
+    )
+
+    session.add(new_turn)
+    session.commit()
+    session.refresh(new_turn)
+
+    parent.branched_child_ids = parent.branched_child_ids or []
+    parent.branched_child_ids.append(new_turn.id)
+
+    session.add(parent)
+    session.commit()
+
+    return new_turn
+
+
+def delete_benchmark_data(session: Session) -> None:
+    user_ids = select(User.id).where(User.uid == BENCHMARK_UID)
+    session.exec(delete(Turn).where(Turn.user_id.in_(user_ids)))
+    session.exec(delete(User).where(User.uid == BENCHMARK_UID))
+    session.commit()
+
+
+def run_batch(engine, branch, user_id: UUID, concurrency: int):
+    """Per-branch latencies (s), and how many branches the parent lists"""
+    with Session(engine) as session:
+        parent = Turn(
+            user_id=user_id, human_text="Q", bot_text="A", model="m", title="T"
+        )
+        session.add(parent)
+        session.commit()
+        parent_id = parent.id
+
+    def timed_branch(i: int) -> float:
+        with Session(engine) as session:
+            start = time.perf_counter()
+            branch(session, user_id, parent_id, f"Branch {i}")
+            return time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(timed_branch, range(concurrency)))
+
+    with Session(engine) as session:
+        listed = len(session.get(Turn, parent_id).branched_child_ids)
+    return latencies, listed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 50])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    engine = get_test_engine()
+    create_all_tables(engine)
+
+    with Session(engine) as session:
+        # In case a previous run was interrupted
+        delete_benchmark_data(session)
+        user = User(uid=BENCHMARK_UID, email=f"{BENCHMARK_UID}@example.com")
+        session.add(user)
+        session.commit()
+        user_id = user.id
+
+    writes = {
+        "two commits": two_commits,
+        "one transaction": conversations.branch_reply_to_turn,
+    }
+
+    print(
+        f"{'write':>16} {'concurrent':>10} {'p50 (ms)':>9} {'mean (ms)':>10}"
+        f" {'listed':>8}"
+    )
+    try:
+        for concurrency in args.concurrency:
+            for name, branch in writes.items():
+                latencies, listed, expected = [], 0, 0
+                for _ in range(args.repeat):
+                    batch, batch_listed = run_batch(
+                        engine, branch, user_id, concurrency
+                    )
+                    latencies += batch
+                    listed += batch_listed
+                    expected += concurrency
+                print(
+                    f"{name:>16} {concurrency:>10}"
+                    f" {statistics.median(latencies) * 1000:>9.2f}"
+                    f" {statistics.mean(latencies) * 1000:>10.2f}"
+                    f" {listed:>4}/{expected:<4}",
+                    flush=True,
+                )
+    finally:
+        with Session(engine) as session:
+            delete_benchmark_data(session)
+
+
+if __name__ == "__main__":
+    main()
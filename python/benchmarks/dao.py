@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+Conversation DAO latency against a synthetic forest of deep and wide trees.
+
+Generates `--turns` turns for `--users` users in the test database, shaped as trees:
+each has a primary thread `--depth` turns long, and every `--branch-every` turns along
+it `--branching` branches of `--branch-depth` turns each, bulk loaded with COPY (see
+database/seed.py).
+
+Then times, over `--repeat` randomly chosen users and trees:
+- get_separable_conversations (a user's first page of 50)
+- get_full_conversation_from_turn_id (from the middle of a primary thread)
+- reply_to_turn (onto the end of a primary thread)
+- branch_reply_to_turn (from a turn part way down a primary thread)
+- search_turns, for a word in almost every turn, one in a few percent of them, one in
+  a few hundredths of a percent, and two middling words together (the synthetic texts
+  are drawn from a Zipf-like vocabulary)
+
+and prints the results (with the shape, so runs on different shapes aren't compared)
+as JSON. Pass an earlier run's JSON as `--compare` to also print the change per
+operation. The generated data is deleted afterwards unless `--keep`.
+
+Run from the python directory:
+    python -m benchmarks.dao [--turns 1000000] [--output before.json]
+    python -m benchmarks.dao [--turns 1000000] --compare before.json
+"""
+
+import argparse
+import json
+import math
+import random
+import statistics
+import subprocess
+import sys
+import time
+from dataclasses import asdict, dataclass
+from uuid import UUID
+
+from database.database import create_all_tables, get_test_engine
+from database.seed import (
+    SyntheticTree,
+    TreeShape,
+    seed_forest,
+    seed_synthetic_users,
+)
+from models.turn import Turn
+from models.user import User
+from sqlalchemy import event
+from sqlmodel import Session, delete, select
+from web.dao import conversations
+
+BENCHMARK_UID_PREFIX = "dao_benchmark_"
+
+
+@dataclass
+class SampleTree:
+    """The turns of one generated tree that the timed operations start from"""
+
+    user_id: UUID
+    middle_id: UUID
+    tip_id: UUID
+    branch_point_id: UUID
+
+    @classmethod
+    def of(cls, tree: SyntheticTree) -> "SampleTree":
+        return cls(
+            user_id=tree.user_id,
+            middle_id=tree.trunk[len(tree.trunk) // 2],
+            tip_id=tree.trunk[-1],
+            branch_point_id=tree.branch_points[len(tree.branch_points) // 2]
+            if tree.branch_points
+            else tree.trunk[0],
+        )
+
+
+def load_forest(
+    engine, *, users: int, turns: int, shape: TreeShape
+) -> list[SampleTree]:
+    with Session(engine) as session:
+        user_ids = seed_synthetic_users(session, users, prefix=BENCHMARK_UID_PREFIX)
+        trees = seed_forest(session, user_ids, turns=turns, shape=shape)
+        session.commit()
+    return [SampleTree.of(tree) for tree in trees]
+
+
+def delete_benchmark_data(engine) -> None:
+    with Session(engine) as session:
+        user_ids = select(User.id).where(User.uid.startswith(BENCHMARK_UID_PREFIX))
+        session.exec(delete(Turn).where(Turn.user_id.in_(user_ids)))
+        session.exec(delete(User).where(User.uid.startswith(BENCHMARK_UID_PREFIX)))
+        session.commit()
+
+
+def time_operation(engine, operation, samples: list[SampleTree], repeat: int) -> dict:
+    """Latency percentiles (ms) and queries per call for `operation(session, sample)`"""
+    queries = 0
+
+    def count(*args):
+        nonlocal queries
+        queries += 1
+
+    latencies = []
+    query_counts = []
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        with Session(engine) as session:
+            for _ in range(repeat):
+                sample = random.choice(samples)
+                # Nothing cached from the last call
+                session.expunge_all()
+                queries = 0
+                start = time.perf_counter()
+                operation(session, sample)
+                latencies.append((time.perf_counter() - start) * 1000)
+                query_counts.append(queries)
+                session.commit()
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+
+    latencies.sort()
+    return {
+        "p50_ms": round(statistics.median(latencies), 3),
+        "p95_ms": round(latencies[max(0, math.ceil(len(latencies) * 0.95) - 1)], 3),
+        "mean_ms": round(statistics.mean(latencies), 3),
+        "max_ms": round(latencies[-1], 3),
+        "queries": statistics.median(query_counts),
+    }
+
+
+OPERATIONS = {
+    "get_separable_conversations": lambda session, sample: (
+        conversations.get_separable_conversations(session, sample.user_id, limit=50)
+    ),
+    "get_full_conversation_from_turn_id": lambda session, sample: (
+        conversations.get_full_conversation_from_turn_id(
+            session, sample.middle_id, sample.user_id
+        )
+    ),
+    "reply_to_turn": lambda session, sample: conversations.reply_to_turn(
+        session, sample.user_id, sample.tip_id, "Benchmark reply"
+    ),
+    "branch_reply_to_turn": lambda session, sample: conversations.branch_reply_to_turn(
+        session, sample.user_id, sample.branch_point_id, "Benchmark branch"
+    ),
+    "search_turns (common word)": lambda session, sample: conversations.search_turns(
+        session, sample.user_id, "word0"
+    ),
+    "search_turns (middling word)": lambda session, sample: conversations.search_turns(
+        session, sample.user_id, "word100"
+    ),
+    "search_turns (rare word)": lambda session, sample: conversations.search_turns(
+        session, sample.user_id, "word9000"
+    ),
+    "search_turns (two words)": lambda session, sample: conversations.search_turns(
+        session, sample.user_id, "word50 word60"
+    ),
+}
+
+
+def _git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_comparison(baseline: dict, results: dict) -> None:
+    if baseline["params"] != results["params"]:
+        print(
+            "Warning: the baseline was run with different parameters",
+            file=sys.stderr,
+        )
+    print(
+        f"{'operation':>36} {'before p50':>11} {'after p50':>10} {'change':>8}",
+        file=sys.stderr,
+    )
+    for name, after in results["operations"].items():
+        before = baseline["operations"].get(name)
+        if not before:
+            continue
+        change = after["p50_ms"] / before["p50_ms"] - 1
+        print(
+            f"{name:>36} {before['p50_ms']:>9.2f}ms {after['p50_ms']:>8.2f}ms"
+            f" {change:>+8.0%}",
+            file=sys.stderr,
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--turns", type=int, default=100_000)
+    parser.add_argument("--depth", type=int, default=50)
+    parser.add_argument("--branching", type=int, default=2)
+    parser.add_argument("--branch-every", type=int, default=10)
+    parser.add_argument("--branch-depth", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Also write the results JSON to this file")
+    parser.add_argument("--compare", help="An earlier run's results JSON")
+    parser.add_argument(
+        "--keep", action="store_true", help="Leave the generated data in place"
+    )
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    shape = TreeShape(
+        depth=args.depth,
+        branching=args.branching,
+        branch_every=args.branch_every,
+        branch_depth=args.branch_depth,
+    )
+
+    engine = get_test_engine()
+    create_all_tables(engine)
+    # In case a previous run was interrupted (or kept its data)
+    delete_benchmark_data(engine)
+
+    try:
+        print(f"Generating {args.turns} turns...", file=sys.stderr, flush=True)
+        start = time.perf_counter()
+        samples = load_forest(engine, users=args.users, turns=args.turns, shape=shape)
+        load_seconds = time.perf_counter() - start
+
+        results = {
+            "benchmark": "dao",
+            "revision": _git_revision(),
+            "params": {
+                "users": args.users,
+                "turns": args.turns,
+                **asdict(shape),
+                "repeat": args.repeat,
+                "seed": args.seed,
+            },
+            "dataset": {
+                "trees": len(samples),
+                "turns": len(samples) * shape.size(),
+                "load_seconds": round(load_seconds, 1),
+            },
+            "operations": {},
+        }
+        for name, operation in OPERATIONS.items():
+            print(f"Timing {name}...", file=sys.stderr, flush=True)
+            results["operations"][name] = time_operation(
+                engine, operation, samples, args.repeat
+            )
+    finally:
+        if not args.keep:
+            delete_benchmark_data(engine)
+
+    output = json.dumps(results, indent=2)
+    print(output, flush=True)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    if args.compare:
+        with open(args.compare) as f:
+            print_comparison(json.load(f), results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,28 @@
+"""
+Local stand-in for Firebase ID token verification, for load testing and tests.
+
+`fake_id_token` mints an unsigned token for any uid, and `verify_fake_token` accepts
+it. They're only ever swapped in for Firebase's verifier through `dependency_overrides`
+(see benchmarks/load_app.py), never by configuration.
+"""
+
+import base64
+import json
+import time
+from typing import Any
+
+
+def fake_id_token(uid: str, email: str, *, expires_in: int = 3600) -> str:
+    """An unsigned stand-in for a Firebase ID token, accepted by `verify_fake_token`"""
+    claims = {"uid": uid, "email": email, "exp": int(time.time()) + expires_in}
+    return "fake." + base64.urlsafe_b64encode(json.dumps(claims).encode()).decode()
+
+
+def verify_fake_token(token: str) -> dict[str, Any]:
+    prefix, _, payload = token.partition(".")
+    if prefix != "fake":
+        raise ValueError("Not a fake ID token")
+    claims = json.loads(base64.urlsafe_b64decode(payload))
+    if claims["exp"] <= time.time():
+        raise ValueError("Token expired")
+    return claims
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+How many generations one app process can have in flight at once.
+
+Starts the stub Gemini server with a fixed latency, then fires batches of concurrent
+POST /api/conversation/create requests at the app in this process (a single event
+loop, like one UvicornWorker) against the test database. If generation parks
+coroutines rather than threads, a batch takes about one model round trip however large
+it is (the answer and the title are requested concurrently).
+
+Run from the python directory:
+    python -m benchmarks.generation_concurrency [--latency 1.0] [--concurrency 1 50 200]
+"""
+
+import argparse
+import asyncio
+import os
+import time
+
+from benchmarks import stub_gemini
+
+STUB_PORT = 8765
+
+# Must be set before the app (and so the genai client) is imported
+os.environ["GOOGLE_GEMINI_BASE_URL"] = f"http://127.0.0.1:{STUB_PORT}"
+os.environ.setdefault("GEMINI_API_KEY", "stub")
+os.environ["USE_GEMINI"] = "1"
+
+import httpx  # noqa: E402
+import web.app  # noqa: E402
+from database.database import create_all_tables, get_test_engine  # noqa: E402
+from models.turn import Turn  # noqa: E402
+from models.user import User  # noqa: E402
+from sqlmodel import Session, delete, select  # noqa: E402
+from web.admission import AdmissionControl  # noqa: E402
+from web.app import app, get_current_user, get_session  # noqa: E402
+from web.schemas.user import CurrentUser  # noqa: E402
+
+BENCHMARK_UID = "generation_concurrency_benchmark"
+
+
+def delete_benchmark_data(session: Session) -> None:
+    user_ids = select(User.id).where(User.uid == BENCHMARK_UID)
+    session.exec(delete(Turn).where(Turn.user_id.in_(user_ids)))
+    session.exec(delete(User).where(User.uid == BENCHMARK_UID))
+    session.commit()
+
+
+def override_get_session():
+    with Session(get_test_engine()) as session:
+        yield session
+
+
+async def run_batch(client: httpx.AsyncClient, concurrency: int) -> float:
+    async def create(i: int):
+        response = await client.post(
+            "/api/conversation/create", json={"text": f"Question {i}"}
+        )
+        response.raise_for_status()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(create(i) for i in range(concurrency)))
+    return time.perf_counter() - start
+
+
+async def run(concurrencies: list[int], latency: float):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://app", timeout=None
+    ) as client:
+        print(f"model latency {latency:.2f}s per call, answer and title in parallel")
+        print(f"{'concurrent':>10} {'wall (s)':>10} {'req/s':>8} {'serial (s)':>11}")
+        for concurrency in concurrencies:
+            elapsed = await run_batch(client, concurrency)
+            print(
+                f"{concurrency:>10} {elapsed:>10.2f} {concurrency / elapsed:>8.1f}"
+                f" {concurrency * latency:>11.0f}",
+                flush=True,
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--latency", type=float, default=1.0)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 50, 200])
+    args = parser.parse_args()
+
+    stub = stub_gemini.serve_in_thread(STUB_PORT, args.latency)
+    create_all_tables(get_test_engine())
+
+    with Session(get_test_engine()) as session:
+        # In case a previous run was interrupted
+        delete_benchmark_data(session)
+        session.add(User(uid=BENCHMARK_UID, email=f"{BENCHMARK_UID}@example.com"))
+        session.commit()
+
+    app.dependency_overrides[get_session] = override_get_session
+    app.dependency_overrides[get_current_user] = lambda: CurrentUser(
+        uid=BENCHMARK_UID, email=f"{BENCHMARK_UID}@example.com"
+    )
+    # One user makes every request, all at once: let them all in
+    web.app.llm_admission = AdmissionControl(
+        burst=sum(args.concurrency),
+        max_per_user=max(args.concurrency),
+        max_total=max(args.concurrency),
+    )
+
+    try:
+        asyncio.run(run(args.concurrency, args.latency))
+    finally:
+        with Session(get_test_engine()) as session:
+            delete_benchmark_data(session)
+        stub.should_exit = True
+
+
+if __name__ == "__main__":
+    main()
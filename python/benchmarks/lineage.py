@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Latency of get_full_conversation_from_turn_id versus thread depth.
+
+Builds linear threads of increasing depth in the test database (inside a transaction
+that is rolled back afterwards) and times the single-query lineage fetch against the
+old one-`session.get`-per-turn walk.
+
+Run from the python directory:
+    python -m benchmarks.lineage [--depths 10 50 200 1000] [--repeat 20]
+"""
+
+import argparse
+import statistics
+import time
+from uuid import UUID, uuid4
+
+from database.database import create_all_tables, get_test_engine
+from models.turn import Turn
+from sqlmodel import Session, text
+from web.dao import conversations
+
+
+def build_thread(session: Session, user_id: UUID, depth: int) -> list[UUID]:
+    turns = [
+        Turn(
+            user_id=user_id,
+            title="Benchmark",
+            human_text=f"Question {i}",
+            bot_text=f"Answer {i}",
+            model="gemini-2.5-flash",
+        )
+        for i in range(depth)
+    ]
+    root = turns[0]
+    for depth, (parent, child) in enumerate(zip(turns, turns[1:]), start=1):
+        child.parent_id = parent.id
+        parent.primary_child_id = child.id
+        child.root_id = root.id
+        child.depth = depth
+        child.path = [turn.id for turn in turns[: depth + 1]]
+
+    session.add_all(turns)
+    session.flush()
+    # Fresh statistics so the planner picks the primary key index for the walk
+    session.execute(text("ANALYZE main.turn"))
+    return [turn.id for turn in turns]
+
+
+def naive_walk(session: Session, turn_id: UUID) -> list[Turn]:
+    """The previous implementation: one round trip per ancestor and descendant"""
+    current = session.get(Turn, turn_id)
+    earlier = [current]
+    while current.parent_id:
+        current = session.get(Turn, current.parent_id)
+        earlier = [current, *earlier]
+
+    current = session.get(Turn, turn_id)
+    while current.primary_child_id:
+        current = session.get(Turn, current.primary_child_id)
+        earlier.append(current)
+    return earlier
+
+
+def time_ms(fn, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--depths", type=int, nargs="+", default=[10, 50, 200, 1000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    test_engine = get_test_engine()
+    create_all_tables(test_engine)
+
+    print(f"{'depth':>8} {'query (ms)':>10} {'naive (ms)':>12} {'speedup':>8}")
+    with test_engine.connect() as connection:
+        transaction = connection.begin()
+        try:
+            for depth in args.depths:
+                session = Session(bind=connection)
+                user_id = uuid4()
+                turn_ids = build_thread(session, user_id, depth)
+                # Start in the middle so both walks have work to do
+                middle = turn_ids[depth // 2]
+
+                def cte():
+                    # Clear the identity map so every run pays for its round trips
+                    session.expunge_all()
+                    convo = conversations.get_full_conversation_from_turn_id(
+                        session, middle, user_id
+                    )
+                    assert len(convo) == depth
+
+                def naive():
+                    session.expunge_all()
+                    assert len(naive_walk(session, middle)) == depth
+
+                cte_ms = time_ms(cte, args.repeat)
+                naive_ms = time_ms(naive, args.repeat)
+                speedup = naive_ms / cte_ms
+                print(f"{depth:>8} {cte_ms:>10.2f} {naive_ms:>12.2f} {speedup:>7.1f}x")
+                session.close()
+        finally:
+            transaction.rollback()
+
+
+if __name__ == "__main__":
+    main()
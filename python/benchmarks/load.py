@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+"""
+End-to-end HTTP load test: throughput and latency per endpoint, per worker count.
+
+For each `--workers` count, starts the app under gunicorn with that many
+UvicornWorkers (as in the Procfile) against the test database, with fake Firebase auth
+(benchmarks/load_app.py) and the stub Gemini server (in this process, replying after
+`--latency` seconds). Then `--users` virtual users, each with its own fake ID token,
+make back-to-back calls for `--duration` seconds, picked at random by the `--mix`
+weights:
+
+    list    GET  /api/conversations
+    get     GET  /api/conversation/{turn_id}
+    create  POST /api/conversation/create
+    reply   POST /api/conversation/reply          (onto the user's latest turn)
+    branch  POST /api/conversation/branch-reply   (from one of the user's turns)
+
+and prints requests, errors, requests/sec and p50/p95/p99 latency per endpoint (and
+the results as JSON with `--output`). Pass `--url` instead to load an app that's
+already running; it needs to be benchmarks.load_app:app, in the same environment (see
+`server_env`).
+
+The load generator is a single event loop, so with many users on a small machine it
+can become the bottleneck itself: watch its CPU.
+
+Run from the python directory:
+    python -m benchmarks.load [--workers 1 2 4] [--users 50] [--duration 30]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import httpx
+from benchmarks import stub_gemini
+from benchmarks.fake_auth import fake_id_token
+from database.bulk import copy_users
+from database.database import create_all_tables, get_test_engine
+from models.turn import Turn
+from models.user import User
+from sqlmodel import Session, delete, select
+
+STUB_PORT = 8766
+APP_PORT = 8767
+BENCHMARK_UID_PREFIX = "load_benchmark_"
+
+DEFAULT_MIX = "list=40,get=30,reply=20,branch=5,create=5"
+
+
+def server_env(latency: float | None) -> dict[str, str]:
+    """The app's environment: test database and the stub model server"""
+    env = os.environ | {
+        "DATABASE_URL": os.environ["TEST_DATABASE_URL"],
+        "PYTHONPATH": str(Path(__file__).parent.parent),
+        # Every model call takes `latency`, so most requests would count as slow
+        "SLOW_REQUEST_SECONDS": os.environ.get("SLOW_REQUEST_SECONDS", "60"),
+        # Virtual users call back to back, far past a real user's limits (see
+        # web/admission.py), and the load is what's measured, not the app turning it
+        # away
+        "LLM_RATE_PER_MINUTE": os.environ.get("LLM_RATE_PER_MINUTE", "1000000"),
+        "LLM_RATE_BURST": os.environ.get("LLM_RATE_BURST", "1000"),
+        "LLM_MAX_CONCURRENT_PER_USER": os.environ.get(
+            "LLM_MAX_CONCURRENT_PER_USER", "1000"
+        ),
+        "LLM_MAX_CONCURRENT": os.environ.get("LLM_MAX_CONCURRENT", "1000000"),
+        "LLM_QUEUE_SECONDS": os.environ.get("LLM_QUEUE_SECONDS", "60"),
+    }
+    if latency is None:
+        env["USE_GEMINI"] = "0"
+    else:
+        env |= {
+            "USE_GEMINI": "1",
+            "GEMINI_API_KEY": "stub",
+            "GOOGLE_GEMINI_BASE_URL": f"http://127.0.0.1:{STUB_PORT}",
+        }
+    return env
+
+
+def start_app(
+    workers: int, latency: float | None, *, preload: bool = False
+) -> subprocess.Popen:
+    app = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "gunicorn",
+            "-w",
+            str(workers),
+            "-k",
+            "uvicorn.workers.UvicornWorker",
+            "--bind",
+            f"127.0.0.1:{APP_PORT}",
+            "--log-level",
+            "warning",
+            *(["--preload"] if preload else []),
+            "benchmarks.load_app:app",
+        ],
+        cwd=Path(__file__).parent.parent,
+        env=server_env(latency),
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{APP_PORT}/.health").is_success:
+                return app
+        except httpx.TransportError:
+            pass
+        if app.poll() is not None:
+            raise RuntimeError("The app exited on startup")
+        time.sleep(0.05)
+    app.terminate()
+    raise RuntimeError("The app didn't start within 60s")
+
+
+def stop_app(app: subprocess.Popen) -> None:
+    app.terminate()
+    try:
+        app.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        app.kill()
+
+
+def parse_mix(mix: str) -> dict[str, float]:
+    weights = {}
+    for item in mix.split(","):
+        name, _, weight = item.partition("=")
+        if name not in VirtualUser.CALLS:
+            raise ValueError(f"Unknown call {name!r} in --mix")
+        weights[name] = float(weight)
+    return weights
+
+
+@dataclass
+class Results:
+    # Call name -> latencies (s) of the successful requests
+    latencies: dict[str, list[float]] = field(default_factory=lambda: defaultdict(list))
+    errors: dict[str, int] = field(default_factory=lambda: defaultdict(int))
+
+    def summary(self, duration: float) -> dict:
+        calls = {}
+        for name in sorted(set(self.latencies) | set(self.errors)):
+            latencies = sorted(self.latencies[name])
+            calls[name] = {
+                "requests": len(latencies) + self.errors[name],
+                "errors": self.errors[name],
+                "rps": round(len(latencies) / duration, 1),
+                **_percentiles(latencies),
+            }
+        total = sum(len(latencies) for latencies in self.latencies.values())
+        return {"rps": round(total / duration, 1), "calls": calls}
+
+
+def _percentiles(latencies: list[float]) -> dict:
+    if len(latencies) < 2:
+        value = round(latencies[0] * 1000, 1) if latencies else None
+        return {"p50_ms": value, "p95_ms": value, "p99_ms": value}
+    cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+    return {
+        "p50_ms": round(cuts[49] * 1000, 1),
+        "p95_ms": round(cuts[94] * 1000, 1),
+        "p99_ms": round(cuts[98] * 1000, 1),
+    }
+
+
+class VirtualUser:
+    CALLS = ("list", "get", "create", "reply", "branch")
+
+    def __init__(self, client: httpx.AsyncClient, uid: str, results: Results):
+        self.client = client
+        self.results = results
+        self.headers = {
+            "Authorization": f"Bearer {fake_id_token(uid, f'{uid}@example.com')}"
+        }
+        # The user's turns, newest last
+        self.turn_ids: list[str] = []
+
+    async def request(self, name: str, method: str, url: str, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = await self.client.request(
+                method, url, headers=self.headers, **kwargs
+            )
+            response.raise_for_status()
+        except httpx.HTTPError:
+            self.results.errors[name] += 1
+            return None
+        body = response.json()
+        if isinstance(body, dict) and body.get("status") == "failed":
+            # The turn was saved, but generating its reply failed
+            self.results.errors[name] += 1
+        else:
+            self.results.latencies[name].append(time.perf_counter() - start)
+        return body
+
+    async def call(self, name: str) -> None:
+        if name == "list":
+            await self.request(name, "GET", "/api/conversations")
+        elif name == "get":
+            turn_id = random.choice(self.turn_ids)
+            await self.request(name, "GET", f"/api/conversation/{turn_id}")
+        elif name == "create":
+            body = await self.request(
+                name, "POST", "/api/conversation/create", json={"text": "Hello"}
+            )
+            if body:
+                self.turn_ids.append(body["turn_id"])
+        elif name == "reply":
+            await self.add_turn(name, "/api/conversation/reply", self.turn_ids[-1])
+        elif name == "branch":
+            await self.add_turn(
+                name, "/api/conversation/branch-reply", random.choice(self.turn_ids)
+            )
+
+    async def add_turn(self, name: str, url: str, parent_turn_id: str) -> None:
+        body = await self.request(
+            name, "POST", url, json={"parent_turn_id": parent_turn_id, "text": "And?"}
+        )
+        if body:
+            self.turn_ids.append(body["id"])
+
+    async def run(self, weights: dict[str, float], until: float) -> None:
+        # Every other call needs a turn to start from
+        while not self.turn_ids and time.monotonic() < until:
+            await self.call("create")
+        names = list(weights)
+        while time.monotonic() < until:
+            await self.call(random.choices(names, list(weights.values()))[0])
+
+
+async def run_load(
+    url: str, uids: list[str], weights: dict[str, float], duration: float
+) -> dict:
+    results = Results()
+    # A connection per user, so the client doesn't queue requests itself
+    limits = httpx.Limits(
+        max_connections=len(uids), max_keepalive_connections=len(uids)
+    )
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60) as client:
+        users = [VirtualUser(client, uid, results) for uid in uids]
+        start = time.monotonic()
+        await asyncio.gather(*(user.run(weights, start + duration) for user in users))
+        elapsed = time.monotonic() - start
+    return results.summary(elapsed)
+
+
+def print_summary(label: str, summary: dict) -> None:
+    print(f"\n{label}: {summary['rps']} req/s", flush=True)
+    print(
+        f"{'call':>8} {'requests':>9} {'errors':>7} {'req/s':>7}"
+        f" {'p50 (ms)':>9} {'p95 (ms)':>9} {'p99 (ms)':>9}"
+    )
+    for name, call in summary["calls"].items():
+        print(
+            f"{name:>8} {call['requests']:>9} {call['errors']:>7} {call['rps']:>7}"
+            f" {call['p50_ms'] or '-':>9} {call['p95_ms'] or '-':>9}"
+            f" {call['p99_ms'] or '-':>9}",
+            flush=True,
+        )
+
+
+def delete_benchmark_data(session: Session) -> None:
+    user_ids = select(User.id).where(User.uid.startswith(BENCHMARK_UID_PREFIX))
+    session.exec(delete(Turn).where(Turn.user_id.in_(user_ids)))
+    session.exec(delete(User).where(User.uid.startswith(BENCHMARK_UID_PREFIX)))
+    session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--mix", default=DEFAULT_MIX)
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=1.0,
+        help="Stub model latency in seconds; negative to use the app's built-in"
+        " fallback reply instead of a model server",
+    )
+    parser.add_argument("--url", help="Load this running app instead of starting one")
+    parser.add_argument("--output", help="Also write the results JSON to this file")
+    args = parser.parse_args()
+
+    weights = parse_mix(args.mix)
+    latency = args.latency if args.latency >= 0 else None
+    engine = get_test_engine()
+    create_all_tables(engine)
+
+    uids = [f"{BENCHMARK_UID_PREFIX}{i}" for i in range(args.users)]
+    with Session(engine) as session:
+        # In case a previous run was interrupted
+        delete_benchmark_data(session)
+        copy_users(session, ((uid, f"{uid}@example.com") for uid in uids))
+        session.commit()
+
+    stub = (
+        stub_gemini.serve_in_thread(STUB_PORT, latency) if latency is not None else None
+    )
+    results = {
+        "benchmark": "load",
+        "params": {
+            "users": args.users,
+            "duration": args.duration,
+            "mix": weights,
+            "latency": latency,
+        },
+        "runs": {},
+    }
+    try:
+        if args.url:
+            configs = [(args.url, None)]
+        else:
+            configs = [(f"{workers} workers", workers) for workers in args.workers]
+        for label, workers in configs:
+            app = start_app(workers, latency) if workers else None
+            try:
+                summary = asyncio.run(
+                    run_load(
+                        args.url or f"http://127.0.0.1:{APP_PORT}",
+                        uids,
+                        weights,
+                        args.duration,
+                    )
+                )
+            finally:
+                if app:
+                    stop_app(app)
+            print_summary(label, summary)
+            results["runs"][label] = summary
+    finally:
+        if stub:
+            stub.should_exit = True
+        with Session(engine) as session:
+            delete_benchmark_data(session)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(json.dumps(results, indent=2) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,13 @@
+"""
+The app as the load test (benchmarks/load.py) serves it: web.app's, with ID tokens
+verified by `verify_fake_token` instead of Firebase, so virtual users can mint their
+own. Run it like the Procfile's, from the python directory:
+
+    gunicorn -k uvicorn.workers.UvicornWorker benchmarks.load_app:app
+"""
+
+from auth.firebase import get_token_verifier
+from benchmarks.fake_auth import verify_fake_token
+from web.app import app
+
+app.dependency_overrides[get_token_verifier] = lambda: verify_fake_token
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Response building for long lineages and big trees: ORM + response_model vs rows.
+
+For each of `--sizes`, loads into the test database a tree of that many turns (branches
+off a primary thread, see database/seed.py) and a single thread of that many turns, up
+to MAX_THREAD_DEPTH: each turn stores its whole path, so a thread takes O(depth^2)
+space. Then times, `--repeat` times each,
+the two ways of building GET /api/conversation/{turn_id} and .../tree responses:
+
+    models  load Turn objects, then validate them against the response model and encode
+            the result, as FastAPI does for a handler that returns them
+    rows    select just the response's columns as dicts and encode those directly (what
+            the handlers do; see web/responses.py)
+
+and prints the median query and encoding time of each, and their total.
+
+Run from the python directory:
+    python -m benchmarks.serialization [--sizes 10 1000 10000] [--repeat 20]
+"""
+
+import argparse
+import json
+import statistics
+import time
+
+from benchmarks.dao import delete_benchmark_data
+from database.database import create_all_tables, get_test_engine
+from database.seed import TreeShape, seed_forest, seed_synthetic_users
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+from sqlmodel import Session
+from web import responses
+from web.app import TREE_COLUMNS, TURN_COLUMNS
+from web.dao import conversations
+from web.schemas.turn import ConversationTreeResponse, TurnResponse
+
+MAX_THREAD_DEPTH = 1000
+# The primary thread of a generated tree, at most
+MAX_TREE_DEPTH = 500
+
+LINEAGE = TypeAdapter(list[TurnResponse])
+TREE = TypeAdapter(ConversationTreeResponse)
+
+
+def encode_models(adapter: TypeAdapter, value) -> bytes:
+    """What FastAPI does with a handler's return value, given a response_model"""
+    validated = adapter.validate_python(value, from_attributes=True)
+    return JSONResponse(adapter.dump_python(validated, mode="json")).body
+
+
+def time_path(engine, query, encode, repeat: int) -> dict:
+    """Median ms to run `query(session)` and to `encode` its result"""
+    query_ms, encode_ms = [], []
+    with Session(engine) as session:
+        for _ in range(repeat):
+            session.expunge_all()
+            start = time.perf_counter()
+            result = query(session)
+            middle = time.perf_counter()
+            encode(result)
+            end = time.perf_counter()
+            query_ms.append((middle - start) * 1000)
+            encode_ms.append((end - middle) * 1000)
+    query_ms, encode_ms = statistics.median(query_ms), statistics.median(encode_ms)
+    return {
+        "query_ms": round(query_ms, 2),
+        "encode_ms": round(encode_ms, 2),
+        "total_ms": round(query_ms + encode_ms, 2),
+    }
+
+
+def tree_shape(size: int) -> TreeShape:
+    """A tree of `size` turns: a primary thread, and branches filling out the rest"""
+    depth = min(size, MAX_TREE_DEPTH)
+    branch_every = max(depth // 20, 1)
+    branch_points = len(range(branch_every, depth, branch_every))
+    branch_depth = (size - depth) // (2 * branch_points) if branch_points else 0
+    return TreeShape(
+        depth=depth,
+        branching=2 if branch_depth else 0,
+        branch_every=branch_every,
+        branch_depth=max(branch_depth, 1),
+    )
+
+
+def paths(user_id, tip_id, root_id) -> dict:
+    """Name -> (query, encode) for each way of building each response"""
+    return {
+        "lineage, models": (
+            lambda session: conversations.get_full_conversation_from_turn_id(
+                session, tip_id, user_id
+            ),
+            lambda turns: encode_models(LINEAGE, turns),
+        ),
+        "tree, models": (
+            lambda session: conversations.get_conversation_tree(
+                session, root_id, user_id
+            ),
+            lambda turns: encode_models(TREE, {"root_id": turns[0].id, "turns": turns}),
+        ),
+        "lineage, rows": (
+            lambda session: conversations.get_full_conversation_rows(
+                session, tip_id, user_id, TURN_COLUMNS
+            ),
+            responses.dumps,
+        ),
+        "tree, rows": (
+            lambda session: conversations.get_conversation_tree_rows(
+                session, root_id, user_id, TREE_COLUMNS
+            ),
+            lambda rows: responses.dumps({"root_id": rows[0]["id"], "turns": rows}),
+        ),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 1000, 10_000])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--output", help="Also write the results JSON to this file")
+    args = parser.parse_args()
+
+    engine = get_test_engine()
+    create_all_tables(engine)
+    # In case a previous run was interrupted
+    delete_benchmark_data(engine)
+
+    results = {"benchmark": "serialization", "sizes": {}}
+    try:
+        for size in args.sizes:
+            with Session(engine) as session:
+                (user_id,) = seed_synthetic_users(
+                    session, 1, prefix=f"dao_benchmark_serialization_{size}_"
+                )
+                depth = min(size, MAX_THREAD_DEPTH)
+                (thread,) = seed_forest(
+                    session,
+                    [user_id],
+                    turns=depth,
+                    shape=TreeShape(depth=depth, branching=0),
+                )
+                shape = tree_shape(size)
+                (tree,) = seed_forest(
+                    session, [user_id], turns=shape.size(), shape=shape
+                )
+                session.commit()
+
+            print(
+                f"\n{size} turns (tree: {shape.size()}, lineage: {depth})", flush=True
+            )
+            print(f"{'path':>34} {'query':>9} {'encode':>9} {'total':>9}")
+            results["sizes"][size] = {
+                "tree_turns": shape.size(),
+                "lineage_turns": depth,
+                "paths": {},
+            }
+            for name, (query, encode) in paths(
+                user_id, thread.trunk[-1], tree.trunk[0]
+            ).items():
+                timings = time_path(engine, query, encode, args.repeat)
+                results["sizes"][size]["paths"][name] = timings
+                print(
+                    f"{name:>34} {timings['query_ms']:>7.2f}ms"
+                    f" {timings['encode_ms']:>7.2f}ms {timings['total_ms']:>7.2f}ms",
+                    flush=True,
+                )
+    finally:
+        delete_benchmark_data(engine)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(json.dumps(results, indent=2) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Cold-start time: importing each of the app's entry modules, and starting the server.
+
+Imports each of `--modules` in a fresh interpreter (`python -X importtime`), `--repeat`
+times, and prints per module the median wall time of the whole process (interpreter
+startup included; see the "(python)" row for that alone), the module's import time
+including everything it imports, and its own top-level code alone: that's where import
+time side effects (clients, connections, network calls) show up. `--top` lists the
+slowest imports under the first module, by their own time.
+
+With `--serve`, also times starting the app under gunicorn (as in the Procfile) until it
+answers /.health, per `--workers` count, with and without --preload.
+
+Run from the python directory:
+    python -m benchmarks.startup [--repeat 5] [--serve --workers 1 4]
+"""
+
+import argparse
+import json
+import re
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from benchmarks.load import server_env, start_app, stop_app
+
+DEFAULT_MODULES = (
+    "web.app",
+    "llm.worker",
+    "llm.llm",
+    "auth.firebase",
+    "database.database",
+)
+
+# "import time: <self us> | <cumulative us> | <indented module name>"
+_IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)")
+
+
+def import_once(module: str | None) -> tuple[float, dict[str, tuple[int, int]]]:
+    """
+    Wall seconds for a fresh interpreter to import `module` (or do nothing), and
+    module -> (self us, cumulative us) for everything it imported
+    """
+    start = time.perf_counter()
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-X",
+            "importtime",
+            "-c",
+            f"import {module}" if module else "",
+        ],
+        cwd=Path(__file__).parent.parent,
+        env=server_env(None),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    wall = time.perf_counter() - start
+    imports = {}
+    for line in result.stderr.splitlines():
+        if match := _IMPORTTIME_LINE.match(line):
+            imports[match[4]] = (int(match[1]), int(match[2]))
+    return wall, imports
+
+
+def time_imports(module: str | None, repeat: int) -> dict:
+    walls, selfs, cumulatives = [], [], []
+    for _ in range(repeat):
+        wall, imports = import_once(module)
+        walls.append(wall)
+        own, cumulative = imports.get(module, (0, 0))
+        selfs.append(own)
+        cumulatives.append(cumulative)
+    return {
+        "wall_ms": round(statistics.median(walls) * 1000, 1),
+        "import_ms": round(statistics.median(cumulatives) / 1000, 1),
+        "self_ms": round(statistics.median(selfs) / 1000, 1),
+    }
+
+
+def slowest_imports(module: str, top: int) -> list[tuple[str, float]]:
+    _, imports = import_once(module)
+    ranked = sorted(imports.items(), key=lambda item: item[1][0], reverse=True)
+    return [(name, round(own / 1000, 1)) for name, (own, _) in ranked[:top]]
+
+
+def time_startup(workers: int, preload: bool) -> float:
+    """Seconds from starting gunicorn until the app answers /.health"""
+    start = time.perf_counter()
+    app = start_app(workers, None, preload=preload)
+    elapsed = time.perf_counter() - start
+    stop_app(app)
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--modules", nargs="+", default=list(DEFAULT_MODULES))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--serve", action="store_true")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--output", help="Also write the results JSON to this file")
+    args = parser.parse_args()
+
+    results = {"benchmark": "startup", "imports": {}, "serve": {}}
+
+    print(f"{'module':>20} {'wall (ms)':>10} {'import (ms)':>12} {'self (ms)':>10}")
+    for module in [None, *args.modules]:
+        timings = time_imports(module, args.repeat)
+        name = module or "(python)"
+        results["imports"][name] = timings
+        print(
+            f"{name:>20} {timings['wall_ms']:>10} {timings['import_ms']:>12}"
+            f" {timings['self_ms']:>10}",
+            flush=True,
+        )
+
+    results["slowest"] = slowest_imports(args.modules[0], args.top)
+    print(f"\nSlowest imports under {args.modules[0]}, by their own time:")
+    for name, own_ms in results["slowest"]:
+        print(f"{own_ms:>10} ms  {name}", flush=True)
+
+    if args.serve:
+        print()
+        for workers in args.workers:
+            for preload in (False, True):
+                label = f"{workers} workers{' --preload' if preload else ''}"
+                seconds = time_startup(workers, preload)
+                results["serve"][label] = round(seconds, 2)
+                print(f"{label:>22}: serving after {seconds:.2f}s", flush=True)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(json.dumps(results, indent=2) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Gemini API with configurable latency.
+
+Implements just enough of `generateContent`, `streamGenerateContent` and
+`cachedContents` for `google.genai` clients: every reply is a deterministic echo of the
+last user message, sent after `--latency` seconds (spread across the chunks when
+streaming). Point the app at it with:
+
+    GOOGLE_GEMINI_BASE_URL=http://127.0.0.1:8765 GEMINI_API_KEY=stub USE_GEMINI=1
+
+Run from the python directory:
+    python -m benchmarks.stub_gemini [--port 8765] [--latency 1.0]
+"""
+
+import argparse
+import asyncio
+import json
+import threading
+import time
+from collections import Counter
+from uuid import uuid4
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+STREAM_CHUNKS = 5
+
+
+def create_app(latency: float) -> FastAPI:
+    app = FastAPI(title="Stub Gemini")
+    # Cached content name -> its contents, and how many requests have used each
+    app.state.cached_contents = {}
+    app.state.cache_uses = Counter()
+
+    @app.post("/{version}/cachedContents")
+    async def create_cached_content(version: str, request: Request):
+        body = await request.json()
+        name = f"cachedContents/{uuid4().hex}"
+        app.state.cached_contents[name] = body.get("contents", [])
+        return JSONResponse({"name": name, "model": body.get("model")})
+
+    @app.post("/{version}/models/{model_and_method}")
+    async def generate(version: str, model_and_method: str, request: Request):
+        body = await request.json()
+        if "cachedContent" in body:
+            app.state.cache_uses[body["cachedContent"]] += 1
+        prompt = _last_user_text(body.get("contents", []))
+        text = f"Stub reply to: {prompt}"
+
+        if model_and_method.endswith(":streamGenerateContent"):
+            return StreamingResponse(
+                _stream(text, latency), media_type="text/event-stream"
+            )
+
+        await asyncio.sleep(latency)
+        return JSONResponse(_response(text))
+
+    return app
+
+
+def _last_user_text(contents: list[dict]) -> str:
+    for content in reversed(contents):
+        if content.get("role", "user") == "user":
+            return " ".join(part.get("text", "") for part in content.get("parts", []))
+    return ""
+
+
+def _response(text: str, *, finished: bool = True) -> dict:
+    candidate = {"content": {"role": "model", "parts": [{"text": text}]}, "index": 0}
+    if finished:
+        candidate["finishReason"] = "STOP"
+    return {"candidates": [candidate]}
+
+
+async def _stream(text: str, latency: float):
+    words = text.split(" ")
+    size = max(1, -(-len(words) // STREAM_CHUNKS))
+    chunks = [" ".join(words[i : i + size]) for i in range(0, len(words), size)]
+    for i, chunk in enumerate(chunks):
+        await asyncio.sleep(latency / len(chunks))
+        if i < len(chunks) - 1:
+            chunk += " "
+        payload = _response(chunk, finished=i == len(chunks) - 1)
+        yield f"data: {json.dumps(payload)}\r\n\r\n"
+
+
+def serve_in_thread(port: int, latency: float) -> uvicorn.Server:
+    """Start the stub on 127.0.0.1:`port` in a daemon thread; returns once it's up"""
+    server = uvicorn.Server(
+        uvicorn.Config(
+            create_app(latency), host="127.0.0.1", port=port, log_level="warning"
+        )
+    )
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=1.0)
+    args = parser.parse_args()
+
+    uvicorn.run(create_app(args.latency), host="127.0.0.1", port=args.port)
+
+
+if __name__ == "__main__":
+    main()
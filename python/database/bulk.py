@@ -0,0 +1,101 @@
+"""
+Bulk writes, for seeding and syncing many rows at once.
+
+The ORM inserts (and often selects) row by row. `copy_rows` streams rows to Postgres
+with COPY instead, for loading data known not to be there yet, and `upsert_users`
+inserts users in batches of VALUES, skipping the ones that already exist, for syncing.
+
+Both write in the session's transaction; the caller commits.
+"""
+
+import io
+import re
+from collections.abc import Iterable, Sequence
+from datetime import datetime
+from itertools import batched
+from uuid import UUID, uuid4
+
+from models.user import User
+from sqlalchemy import Table
+from sqlalchemy.dialects.postgresql import insert
+from sqlmodel import Session
+
+# Rows buffered per COPY
+COPY_BATCH_ROWS = 50_000
+
+# Users per INSERT (two parameters each, well under Postgres's 65535)
+UPSERT_BATCH_ROWS = 1000
+
+_COPY_ESCAPES = {"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"}
+_COPY_SPECIAL = re.compile(r"[\\\t\n\r]")
+
+
+def _copy_value(value) -> str:
+    """A value in COPY's text format"""
+    if isinstance(value, str):
+        # Checking first is much faster than always substituting, as most values
+        # have nothing to escape
+        if _COPY_SPECIAL.search(value):
+            return _COPY_SPECIAL.sub(lambda match: _COPY_ESCAPES[match[0]], value)
+        return value
+    if value is None:
+        return r"\N"
+    if isinstance(value, (list, tuple)):
+        # Only used for arrays of ids, which need no quoting
+        return "{" + ",".join(map(str, value)) + "}"
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def copy_rows(
+    session: Session, table: Table, columns: Sequence[str], rows: Iterable[Sequence]
+) -> int:
+    """
+    Load `rows` (values in `columns` order) into `table` with COPY, in batches of
+    COPY_BATCH_ROWS. Columns left out get their server defaults. Returns the row count.
+    """
+    preparer = session.get_bind().dialect.identifier_preparer
+    statement = (
+        f"COPY {preparer.format_table(table)}"
+        f" ({', '.join(preparer.quote(column) for column in columns)}) FROM STDIN"
+    )
+    cursor = session.connection().connection.cursor()
+
+    count = 0
+    try:
+        for batch in batched(rows, COPY_BATCH_ROWS):
+            buffer = io.StringIO()
+            for row in batch:
+                buffer.write("\t".join(map(_copy_value, row)))
+                buffer.write("\n")
+            buffer.seek(0)
+            cursor.copy_expert(statement, buffer)
+            count += len(batch)
+    finally:
+        cursor.close()
+    return count
+
+
+def copy_users(session: Session, users: Iterable[tuple[str, str]]) -> list[UUID]:
+    """Load new users, given as (uid, email), with COPY. Returns their ids, in order."""
+    rows = [(uuid4(), uid, email) for uid, email in users]
+    copy_rows(session, User.__table__, ("id", "uid", "email"), rows)
+    return [user_id for user_id, _, _ in rows]
+
+
+def upsert_users(session: Session, users: Iterable[tuple[str, str]]) -> list[str]:
+    """
+    Insert the users, given as (uid, email), that aren't in the database yet (by uid
+    or email), a batch per statement. Returns the uids that were inserted.
+    """
+    created = []
+    for batch in batched(users, UPSERT_BATCH_ROWS):
+        statement = (
+            insert(User)
+            .values([{"uid": uid, "email": email} for uid, email in batch])
+            .on_conflict_do_nothing()
+            .returning(User.uid)
+        )
+        created += session.execute(statement).scalars().all()
+    return created
@@ -1,33 +1,140 @@
 import importlib
 import os
 import pkgutil
+import time
+from functools import cache
 
 from models.metadata import MAIN
+from sqlalchemy.pool import NullPool, QueuePool
 from sqlmodel import Session, create_engine
 
-DATABASE_URL = os.environ["DATABASE_URL"]
+# Each gunicorn worker (and generation worker) process has its own pool, so the most
+# connections the app can open is processes * (DB_POOL_SIZE + DB_MAX_OVERFLOW). Keep
+# that under Postgres's max_connections.
+POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 5))
+MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", 5))
+# Seconds a request waits for a free connection before failing
+POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", 10))
+# Replace connections older than this many seconds, before the server (or a load
+# balancer) drops them
+POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", 1800))
+POOL_PRE_PING = os.environ.get("DB_POOL_PRE_PING", "1") == "1"
 
-# Fix for PostgreSQL URLs from Heroku
-if DATABASE_URL.startswith("postgres://"):
-    DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
+# Behind PgBouncer (transaction pooling), PgBouncer is the pool: open a connection per
+# checkout and close it on checkin. (psycopg2 doesn't use server-side prepared
+# statements, so transaction pooling is safe.)
+PGBOUNCER = os.environ.get("DB_PGBOUNCER", "0") == "1"
 
-engine = create_engine(DATABASE_URL)
 
-TEST_DATABASE_URL = os.environ["TEST_DATABASE_URL"]
-# Fix for PostgreSQL URLs from Heroku
-if TEST_DATABASE_URL.startswith("postgres://"):
-    TEST_DATABASE_URL = TEST_DATABASE_URL.replace("postgres://", "postgresql://", 1)
+def _database_url(name: str) -> str:
+    url = os.environ[name]
+    # Fix for PostgreSQL URLs from Heroku
+    if url.startswith("postgres://"):
+        url = url.replace("postgres://", "postgresql://", 1)
+    return url
 
-test_engine = create_engine(TEST_DATABASE_URL)
+
+class PoolStats:
+    def __init__(self):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def record(self, wait: float, *, timed_out: bool = False) -> None:
+        self.checkouts += not timed_out
+        self.timeouts += timed_out
+        self.wait_seconds += wait
+        self.max_wait_seconds = max(self.max_wait_seconds, wait)
+
+
+class _TimedPool:
+    """Records how long each checkout waited for a connection (or to connect)"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except Exception:
+            self.stats.record(time.perf_counter() - start, timed_out=True)
+            raise
+        self.stats.record(time.perf_counter() - start)
+        return connection
+
+
+class TimedQueuePool(_TimedPool, QueuePool):
+    pass
+
+
+class TimedNullPool(_TimedPool, NullPool):
+    pass
+
+
+def _create_engine(url: str):
+    if PGBOUNCER:
+        return create_engine(url, poolclass=TimedNullPool)
+    return create_engine(
+        url,
+        poolclass=TimedQueuePool,
+        pool_size=POOL_SIZE,
+        max_overflow=MAX_OVERFLOW,
+        pool_timeout=POOL_TIMEOUT,
+        pool_recycle=POOL_RECYCLE,
+        pool_pre_ping=POOL_PRE_PING,
+    )
+
+
+# Created on first use, so a process only ever connects to the databases it uses
+@cache
+def get_engine():
+    return _create_engine(_database_url("DATABASE_URL"))
+
+
+@cache
+def get_test_engine():
+    return _create_engine(_database_url("TEST_DATABASE_URL"))
+
+
+def _dispose_after_fork() -> None:
+    # A forked child (e.g. a gunicorn worker under --preload) mustn't use the pooled
+    # connections it inherited. Drop them without closing them: the parent still owns
+    # them, and closing would end its sessions.
+    for get in (get_engine, get_test_engine):
+        if get.cache_info().currsize:
+            get().dispose(close=False)
+
+
+os.register_at_fork(after_in_child=_dispose_after_fork)
+
+
+def pool_stats(engine) -> dict:
+    pool = engine.pool
+    stats = {
+        "checked_out": pool.checkedout() if isinstance(pool, QueuePool) else None,
+        "size": pool.size() if isinstance(pool, QueuePool) else None,
+        "overflow": pool.overflow() if isinstance(pool, QueuePool) else None,
+    }
+    if isinstance(pool, _TimedPool):
+        stats |= {
+            "checkouts": pool.stats.checkouts,
+            "timeouts": pool.stats.timeouts,
+            "wait_seconds_total": round(pool.stats.wait_seconds, 6),
+            "wait_seconds_max": round(pool.stats.max_wait_seconds, 6),
+        }
+    return stats
 
 
 def get_session():
-    with Session(engine) as session:
+    with Session(get_engine()) as session:
         yield session
 
 
 def get_test_session():
-    with Session(test_engine) as session:
+    with Session(get_test_engine()) as session:
         yield session
 
 
@@ -1,14 +1,20 @@
+import argparse
 import datetime
-from uuid import UUID
+import itertools
+import math
+import random
+from collections.abc import Iterator, Sequence
+from dataclasses import dataclass
+from uuid import UUID, uuid4
 
+from database.bulk import copy_rows, copy_users
 from models.turn import Turn  # Adjust if Turn is elsewhere
 from models.user import User
-from sqlmodel import Session, delete, select
+from sqlmodel import Session, delete, select, text
 
 
 def seed_turns(session: Session, user_id: UUID | None = None) -> bool:
     session.exec(delete(Turn))
-    session.commit()
 
     if user_id is None:
         user = session.scalars(select(User).where(User.email == "test@test.com")).one()
@@ -45,72 +51,42 @@ def seed_turns(session: Session, user_id: UUID | None = None) -> bool:
         "Green",  # TODO: something else
     )
 
-    purple_1_turn = Turn(
-        user_id=user_id,
-        title=purple_1[2],
-        human_text=purple_1[0],
-        bot_text=purple_1[1],
-        model="gemini-2.5-flash",
-        parent_id=None,
-        primary_child_id=None,
-        branched_child_ids=[],
-        created_at=datetime.datetime.now(datetime.UTC),
-    )
-    purple_2_turn = Turn(
-        user_id=user_id,
-        title=purple_2[2],
-        human_text=purple_2[0],
-        bot_text=purple_2[1],
-        model="gemini-2.5-flash",
-        parent_id=None,
-        primary_child_id=None,
-        branched_child_ids=[],
-        created_at=datetime.datetime.now(datetime.UTC),
-    )
-    blue_1_turn = Turn(
-        user_id=user_id,
-        title=blue_1[2],
-        human_text=blue_1[0],
-        bot_text=blue_1[1],
-        model="gemini-2.5-flash",
-        parent_id=None,
-        primary_child_id=None,
-        branched_child_ids=[],
-        created_at=datetime.datetime.now(datetime.UTC),
-    )
-    blue_2_turn = Turn(
-        user_id=user_id,
-        title=blue_2[2],
-        human_text=blue_2[0],
-        bot_text=blue_2[1],
-        model="gemini-2.5-flash",
-        parent_id=None,
-        primary_child_id=None,
-        branched_child_ids=[],
-        created_at=datetime.datetime.now(datetime.UTC),
-    )
-    blue_3_turn = Turn(
-        user_id=user_id,
-        title=blue_3[2],
-        human_text=blue_3[0],
-        bot_text=blue_3[1],
-        model="gemini-2.5-flash",
-        parent_id=None,
-        primary_child_id=None,
-        branched_child_ids=[],
-        created_at=datetime.datetime.now(datetime.UTC),
-    )
-    green_1_turn = Turn(
-        user_id=user_id,
-        title=green_1[2],
-        human_text=green_1[0],
-        bot_text=green_1[1],
-        model="gemini-2.5-flash",
-        parent_id=None,
-        primary_child_id=None,
-        branched_child_ids=[],
-        created_at=datetime.datetime.now(datetime.UTC),
-    )
+    now = datetime.datetime.now(datetime.UTC)
+
+    def make_turn(content: tuple, parent: Turn | None = None) -> Turn:
+        human_text, bot_text, title = content
+        turn = Turn(
+            user_id=user_id,
+            title=title,
+            human_text=human_text,
+            bot_text=bot_text,
+            model="gemini-2.5-flash",
+            parent_id=parent.id if parent else None,
+            primary_child_id=None,
+            branched_child_ids=[],
+            created_at=now,
+        )
+        # Ids are generated here, so the whole tree (links and ancestry) is known
+        # before anything is inserted
+        turn.root_id = parent.root_id if parent else turn.id
+        turn.depth = parent.depth + 1 if parent else 0
+        turn.path = [*parent.path, turn.id] if parent else [turn.id]
+        return turn
+
+    purple_1_turn = make_turn(purple_1)
+    purple_2_turn = make_turn(purple_2, purple_1_turn)
+    blue_1_turn = make_turn(blue_1, purple_1_turn)
+    blue_2_turn = make_turn(blue_2, blue_1_turn)
+    blue_3_turn = make_turn(blue_3, blue_2_turn)
+    green_1_turn = make_turn(green_1, blue_2_turn)
+
+    purple_1_turn.primary_child_id = purple_2_turn.id
+    purple_1_turn.branched_child_ids = [blue_1_turn.id]
+    blue_1_turn.primary_child_id = blue_2_turn.id
+    blue_2_turn.primary_child_id = blue_3_turn.id
+    blue_2_turn.branched_child_ids = [green_1_turn.id]
+
+    # One batched INSERT, in the same transaction as the delete
     session.add_all(
         [
             purple_1_turn,
@@ -123,28 +99,211 @@ def seed_turns(session: Session, user_id: UUID | None = None) -> bool:
     )
     session.commit()
 
-    purple_1_turn.primary_child_id = purple_2_turn.id
-    purple_2_turn.parent_id = purple_1_turn.id
+    return True
 
-    purple_1_turn.branched_child_ids = [blue_1_turn.id]
-    blue_1_turn.parent_id = purple_1_turn.id
 
-    blue_1_turn.primary_child_id = blue_2_turn.id
-    blue_2_turn.parent_id = blue_1_turn.id
+# Synthetic data for load testing and benchmarks: forests of conversation trees,
+# generated as COPY rows rather than ORM objects
 
-    blue_2_turn.primary_child_id = blue_3_turn.id
-    blue_3_turn.parent_id = blue_2_turn.id
+TURN_COPY_COLUMNS = (
+    "id",
+    "created_at",
+    "parent_id",
+    "primary_child_id",
+    "branched_child_ids",
+    "root_id",
+    "depth",
+    "path",
+    "title",
+    "user_id",
+    "human_text",
+    "model",
+    "bot_text",
+    "status",
+    "attempts",
+)
 
-    blue_2_turn.branched_child_ids = [green_1_turn.id]
-    green_1_turn.parent_id = blue_2_turn.id
 
-    session.commit()
+# Words for synthetic texts, drawn Zipf-style (the nth about 1/n as often as the
+# first), so full-text search has very common, middling and rare words to find
+SYNTHETIC_WORDS = tuple(f"word{i}" for i in range(10_000))
+_SYNTHETIC_WORD_WEIGHTS = tuple(
+    itertools.accumulate(1 / rank for rank in range(1, len(SYNTHETIC_WORDS) + 1))
+)
 
-    return True
 
+def synthetic_text(words: int) -> str:
+    return " ".join(
+        random.choices(SYNTHETIC_WORDS, cum_weights=_SYNTHETIC_WORD_WEIGHTS, k=words)
+    )
 
-if __name__ == "__main__":
-    from database.database import engine
 
+@dataclass(frozen=True)
+class TreeShape:
+    """
+    A primary thread `depth` turns long, and every `branch_every` turns along it,
+    `branching` branches of `branch_depth` turns each
+    """
+
+    depth: int = 50
+    branching: int = 2
+    branch_every: int = 10
+    branch_depth: int = 5
+
+    def branch_points(self) -> range:
+        """Indexes along the primary thread that get branches"""
+        return range(self.branch_every, self.depth, self.branch_every)
+
+    def size(self) -> int:
+        branches = len(self.branch_points()) * self.branching
+        return self.depth + branches * self.branch_depth
+
+
+@dataclass
+class SyntheticTree:
+    user_id: UUID
+    # The primary thread, root first
+    trunk: list[UUID]
+    # The turns along it that have branches
+    branch_points: list[UUID]
+
+
+def synthetic_tree(
+    user_id: UUID, shape: TreeShape, start: datetime.datetime
+) -> tuple[list[tuple], SyntheticTree]:
+    """One tree's turns, as TURN_COPY_COLUMNS rows (parents first)"""
+    turns: list[dict] = []
+    user_id_text = str(user_id)
+
+    def add(parent: dict | None) -> dict:
+        turn_id = uuid4()
+        # Each id is formatted once, not once per descendant's path
+        turn_id_text = str(turn_id)
+        turn = {
+            "id": turn_id_text,
+            "uuid": turn_id,
+            "created_at": start + datetime.timedelta(seconds=len(turns)),
+            "parent_id": parent["id"] if parent else None,
+            "primary_child_id": None,
+            "branched_child_ids": [],
+            "root_id": parent["root_id"] if parent else turn_id_text,
+            "depth": parent["depth"] + 1 if parent else 0,
+            "path": [*parent["path"], turn_id_text] if parent else [turn_id_text],
+            "title": f"Synthetic {start:%Y-%m-%d %H:%M:%S}",
+            "user_id": user_id_text,
+            "human_text": f"Question {len(turns)}: {synthetic_text(8)}",
+            "model": "gemini-2.5-flash",
+            "bot_text": f"Answer {len(turns)}: {synthetic_text(24)}",
+            "status": "complete",
+            "attempts": 1,
+        }
+        turns.append(turn)
+        return turn
+
+    def thread(parent: dict | None, length: int) -> list[dict]:
+        """`length` turns, each the primary child of the one before"""
+        chain = [add(parent)]
+        for _ in range(length - 1):
+            child = add(chain[-1])
+            chain[-1]["primary_child_id"] = child["id"]
+            chain.append(child)
+        return chain
+
+    trunk = thread(None, shape.depth)
+    for i in shape.branch_points():
+        for _ in range(shape.branching):
+            branch = thread(trunk[i], shape.branch_depth)
+            trunk[i]["branched_child_ids"].append(branch[0]["id"])
+
+    rows = [tuple(turn[column] for column in TURN_COPY_COLUMNS) for turn in turns]
+    tree = SyntheticTree(
+        user_id=user_id,
+        trunk=[turn["uuid"] for turn in trunk],
+        branch_points=[trunk[i]["uuid"] for i in shape.branch_points()],
+    )
+    return rows, tree
+
+
+def seed_forest(
+    session: Session,
+    user_ids: Sequence[UUID],
+    *,
+    turns: int,
+    shape: TreeShape = TreeShape(),
+) -> list[SyntheticTree]:
+    """
+    At least `turns` turns, as trees of `shape` handed out to the users round robin,
+    newest last. Doesn't commit.
+    """
+    count = math.ceil(turns / shape.size())
+    # A tree's worth of seconds apart, ending now
+    start = datetime.datetime.now(datetime.UTC) - datetime.timedelta(
+        seconds=count * shape.size()
+    )
+    trees: list[SyntheticTree] = []
+
+    def rows() -> Iterator[tuple]:
+        for i in range(count):
+            tree_rows, tree = synthetic_tree(
+                user_ids[i % len(user_ids)],
+                shape,
+                start + datetime.timedelta(seconds=i * shape.size()),
+            )
+            trees.append(tree)
+            yield from tree_rows
+
+    copy_rows(session, Turn.__table__, TURN_COPY_COLUMNS, rows())
+    # Fresh statistics, so the planner knows about the new rows straight away
+    session.exec(text("ANALYZE main.turn"))
+    return trees
+
+
+def seed_synthetic_users(session: Session, count: int, *, prefix: str) -> list[UUID]:
+    """`count` users with uids `prefix`0, `prefix`1, ... Doesn't commit."""
+    return copy_users(
+        session, ((f"{prefix}{i}", f"{prefix}{i}@example.com") for i in range(count))
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Seed the example conversations for test@test.com, or with"
+        " --turns, a synthetic forest for load testing"
+    )
+    parser.add_argument("--turns", type=int, help="Synthetic turns to load")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--uid-prefix", default="synthetic_")
+    parser.add_argument("--depth", type=int, default=TreeShape.depth)
+    parser.add_argument("--branching", type=int, default=TreeShape.branching)
+    parser.add_argument("--branch-every", type=int, default=TreeShape.branch_every)
+    parser.add_argument("--branch-depth", type=int, default=TreeShape.branch_depth)
+    parser.add_argument(
+        "--test", action="store_true", help="Seed TEST_DATABASE_URL, not DATABASE_URL"
+    )
+    args = parser.parse_args()
+
+    from database.database import get_engine, get_test_engine
+
+    engine = get_test_engine() if args.test else get_engine()
     with Session(engine) as session:
-        seed_turns(session)
+        if args.turns is None:
+            seed_turns(session)
+            return
+
+        shape = TreeShape(
+            depth=args.depth,
+            branching=args.branching,
+            branch_every=args.branch_every,
+            branch_depth=args.branch_depth,
+        )
+        user_ids = seed_synthetic_users(session, args.users, prefix=args.uid_prefix)
+        trees = seed_forest(session, user_ids, turns=args.turns, shape=shape)
+        session.commit()
+        print(
+            f"Seeded {len(user_ids)} users and {len(trees)} trees"
+            f" ({len(trees) * shape.size()} turns)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""
+Reuse of conversation prefixes across replies and branches.
+
+Every child of a turn is sent the same history (everything up to and including that
+turn), so repeated replies and branches from one node rebuild and resend an identical
+prefix. Two caches, both keyed by that ancestor turn's id:
+
+- `CachedHistory` keeps built histories in an in-process LRU, so a hit skips the
+  lineage query and payload building.
+- `ProviderCache` (opt-in, GEMINI_CONTEXT_CACHE=1) uploads long prefixes to Gemini as
+  cached content, so a hit sends a cache reference instead of the prefix, and the
+  prefix's input tokens are billed at the cached rate.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from threading import Lock
+
+from google.genai import types
+from llm.history import History, HistoryBuilder
+from models.turn import Turn
+from sqlmodel import Session
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+class LRUCache:
+    """A bounded, thread-safe mapping that evicts the least recently used entry"""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key]
+
+    def put(self, key, value) -> None:
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+class CachedHistory(HistoryBuilder):
+    """Memoizes another builder's histories by the turn they lead up to"""
+
+    def __init__(self, builder: HistoryBuilder, *, maxsize: int):
+        self.builder = builder
+        self.cache = LRUCache(maxsize)
+
+    def build(self, session: Session, turn: Turn) -> History:
+        if turn.parent_id is None:
+            return self.builder.build(session, turn)
+
+        history = self.cache.get(turn.parent_id)
+        if history is None:
+            history = self.builder.build(session, turn)
+            if history.cacheable:
+                self.cache.put(turn.parent_id, history)
+        return history
+
+
+class ProviderCache:
+    """
+    Gemini cached content for histories of at least `min_tokens` (smaller ones are
+    below the API's minimum, and not worth the storage).
+
+    A history is uploaded in the background the first time it's seen, and that request
+    sends it inline as usual; later replies and branches from the same turn refer to
+    the cached copy until shortly before it expires.
+    """
+
+    def __init__(self, client, model: str, *, ttl: int, min_tokens: int, maxsize: int):
+        self.client = client
+        self.model = model
+        self.ttl = ttl
+        self.min_tokens = min_tokens
+        # Ancestor turn id -> (cached content name, or None while it's being created;
+        # expiry as time.monotonic())
+        self.entries = LRUCache(maxsize)
+        self.hits = 0
+        self.misses = 0
+        self.failures = 0
+        # Keeps the background uploads from being garbage collected mid-flight
+        self._uploads: set[asyncio.Task] = set()
+
+    def cached_content_for(self, history: History) -> str | None:
+        """
+        The name of cached content holding `history`, or None to send it inline. Must
+        be called from the event loop.
+        """
+        if history.last_turn_id is None or history.tokens < self.min_tokens:
+            return None
+
+        entry = self.entries.get(history.last_turn_id)
+        if entry is not None:
+            name, expires_at = entry
+            # Leave a margin so the cache doesn't expire mid-request
+            if name and expires_at - 30 > time.monotonic():
+                self.hits += 1
+                return name
+            if name is None:
+                # Still uploading
+                self.misses += 1
+                return None
+
+        self.misses += 1
+        self.entries.put(history.last_turn_id, (None, time.monotonic() + self.ttl))
+        upload = asyncio.create_task(self._upload(history))
+        self._uploads.add(upload)
+        upload.add_done_callback(self._uploads.discard)
+        return None
+
+    async def _upload(self, history: History) -> None:
+        try:
+            cached = await self.client.aio.caches.create(
+                model=self.model,
+                config=types.CreateCachedContentConfig(
+                    contents=history.contents, ttl=f"{self.ttl}s"
+                ),
+            )
+        except Exception as e:
+            self.failures += 1
+            self.entries.pop(history.last_turn_id)
+            logger.error(f"Caching history up to {history.last_turn_id} failed: {e}")
+            return
+
+        self.entries.put(
+            history.last_turn_id, (cached.name, time.monotonic() + self.ttl)
+        )
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self.entries),
+            "maxsize": self.entries.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.entries.evictions,
+            "failures": self.failures,
+        }
+
+    @classmethod
+    def from_env(cls, client, model: str) -> "ProviderCache | None":
+        if os.environ.get("GEMINI_CONTEXT_CACHE", "0") != "1":
+            return None
+        return cls(
+            client,
+            model,
+            ttl=int(os.environ.get("GEMINI_CONTEXT_CACHE_TTL", 600)),
+            min_tokens=int(os.environ.get("GEMINI_CONTEXT_CACHE_MIN_TOKENS", 4096)),
+            maxsize=int(os.environ.get("GEMINI_CONTEXT_CACHE_SIZE", 1000)),
+        )
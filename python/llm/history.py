@@ -0,0 +1,156 @@
+"""
+What a reply sends the model as the conversation so far.
+
+Sending a thread's whole lineage makes every reply cost (and take) more than the last,
+and a deep enough branch won't fit in the model's context at all. `BudgetedHistory`
+sends only the most recent ancestors that fit a token budget, with the rolling summary
+stored on the newest turn it left out (if there is one) standing in for the rest.
+"""
+
+import os
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from uuid import UUID
+
+from models.turn import Turn
+from sqlmodel import Session
+from web.dao import conversations
+
+# Close enough for English text with Gemini's tokenizer, and free to compute
+CHARS_PER_TOKEN = 4
+
+SUMMARY_PREFIX = "Summary of our conversation so far:"
+
+
+def approx_tokens(text: str | None) -> int:
+    return -(-len(text) // CHARS_PER_TOKEN) if text else 0
+
+
+def turn_tokens(turn: Turn) -> int:
+    return approx_tokens(turn.human_text) + approx_tokens(turn.bot_text)
+
+
+def user_content(text: str) -> dict:
+    return {"role": "user", "parts": [{"text": text}]}
+
+
+def model_content(text: str) -> dict:
+    return {"role": "model", "parts": [{"text": text}]}
+
+
+def _contents(turns: list[Turn]) -> list[dict]:
+    contents = []
+    for turn in turns:
+        if turn.human_text:
+            contents.append(user_content(turn.human_text))
+        if turn.bot_text:
+            contents.append(model_content(turn.bot_text))
+    return contents
+
+
+def _complete(turns: list[Turn]) -> bool:
+    return all(turn.bot_text is not None for turn in turns)
+
+
+@dataclass
+class History:
+    """A chat history in the shape the Gemini chat API expects"""
+
+    contents: list[dict]
+    # Approximate tokens in `contents`
+    tokens: int
+    # Ancestors sent verbatim
+    turns: int
+    # Whether a summary stands in for earlier ancestors
+    summarized: bool = False
+    # The newest turn in the history, i.e. the parent of the turn it was built for.
+    # Every child of that turn gets the same history.
+    last_turn_id: UUID | None = None
+    # Whether the history is the final one for its children: nothing in it is still
+    # generating, and nothing was left out that a summary could later stand in for
+    cacheable: bool = True
+
+
+class HistoryBuilder(ABC):
+    @abstractmethod
+    def build(self, session: Session, turn: Turn) -> History:
+        """The history to send along with `turn`'s message (`turn` excluded)"""
+
+
+class FullHistory(HistoryBuilder):
+    """Every ancestor, verbatim"""
+
+    def build(self, session: Session, turn: Turn) -> History:
+        ancestors = conversations.get_ancestors(session, turn)
+        return History(
+            contents=_contents(ancestors),
+            tokens=sum(turn_tokens(ancestor) for ancestor in ancestors),
+            turns=len(ancestors),
+            last_turn_id=turn.parent_id,
+            cacheable=_complete(ancestors),
+        )
+
+
+class BudgetedHistory(HistoryBuilder):
+    """
+    The nearest `recent_turns` ancestors, fewer if that's needed to keep the history
+    within `max_tokens`. (The new message isn't counted, so that all of a turn's
+    children get the same history.)
+
+    With `summaries`, left-out turns are expected to get a rolling summary later, so a
+    history still missing one isn't cacheable.
+    """
+
+    def __init__(self, *, max_tokens: int, recent_turns: int, summaries: bool = False):
+        self.max_tokens = max_tokens
+        self.recent_turns = recent_turns
+        self.summaries = summaries
+
+    def build(self, session: Session, turn: Turn) -> History:
+        # One more than the window, for the summary of what comes before it
+        ancestors = conversations.get_ancestors(
+            session, turn, limit=self.recent_turns + 1
+        )
+        budget = self.max_tokens
+
+        window = ancestors[-self.recent_turns :] if self.recent_turns else []
+        included: list[Turn] = []
+        tokens = 0
+        for ancestor in reversed(window):
+            cost = turn_tokens(ancestor)
+            if tokens + cost > budget:
+                break
+            included.append(ancestor)
+            tokens += cost
+        included.reverse()
+
+        contents = _contents(included)
+        summarized = False
+
+        if turn.depth > len(included):
+            # Covers everything up to and including the newest left-out ancestor
+            summary = ancestors[len(ancestors) - len(included) - 1].summary
+            summary_text = f"{SUMMARY_PREFIX}\n\n{summary}"
+            summary_tokens = approx_tokens(summary_text) + approx_tokens("OK")
+            if summary and tokens + summary_tokens <= budget:
+                contents = [user_content(summary_text), model_content("OK"), *contents]
+                tokens += summary_tokens
+                summarized = True
+
+        return History(
+            contents=contents,
+            tokens=tokens,
+            turns=len(included),
+            summarized=summarized,
+            last_turn_id=turn.parent_id,
+            cacheable=_complete(ancestors)
+            and (summarized or turn.depth == len(included) or not self.summaries),
+        )
+
+    @classmethod
+    def from_env(cls, *, summaries: bool = False) -> "BudgetedHistory":
+        return cls(
+            max_tokens=int(os.environ.get("HISTORY_MAX_TOKENS", 8000)),
+            recent_turns=int(os.environ.get("HISTORY_RECENT_TURNS", 20)),
+            summaries=summaries,
+        )
@@ -1,115 +1,324 @@
+import asyncio
 import logging
 import os
+import re
+from collections.abc import AsyncIterator
+from functools import cache
 from uuid import UUID
 
 from google import genai
-from models.turn import Turn
+from google.genai import types
+from llm.context_cache import CachedHistory, ProviderCache
+from llm.history import (
+    BudgetedHistory,
+    History,
+    HistoryBuilder,
+    approx_tokens,
+    user_content,
+)
+from models.turn import Turn, TurnStatus
 from sqlmodel import Session
-from web.dao import conversations
+from web.timing import timed
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
-client = genai.Client()  # will read GEMINI_API_KEY automatically
+
+# Created on first use rather than at import, and again in a forked child (e.g. a
+# gunicorn worker under --preload), which mustn't share its parent's HTTP connections.
+# Reads GEMINI_API_KEY (and GOOGLE_GEMINI_BASE_URL, e.g. to point at a local stub model
+# server) automatically.
+@cache
+def get_client() -> genai.Client:
+    return genai.Client()
+
 
 # TODO: abstract the model
 MODEL = "gemini-2.5-flash-lite"
 
 USE_GEMINI = os.environ.get("USE_GEMINI", "0") == "1"
 
+TITLE_PROMPT = (
+    "Make a very short title for this chat, i.e. summarize the point of it in two or"
+    " three words, no formatting at all"
+)
 
-def gemini_with_fallback(
-    session: Session, turn_id: UUID, *, create_title: bool = False
-) -> None:
+# Titles are only made for the message that starts a conversation (or branch), and
+# the start of that message is plenty to summarize it
+TITLE_INPUT_CHARS = 1000
+
+# Keep a rolling summary on each turn, for the history to fall back on once the turn
+# has dropped out of the recent window. Costs a (concurrent) model call per reply.
+SUMMARIZE_HISTORY = os.environ.get("SUMMARIZE_HISTORY", "0") == "1"
+
+# What each reply sends as the conversation so far (see llm.history), memoized per
+# parent turn for repeated replies and branches from it (see llm.context_cache)
+history_builder: HistoryBuilder = CachedHistory(
+    BudgetedHistory.from_env(summaries=SUMMARIZE_HISTORY),
+    maxsize=int(os.environ.get("HISTORY_CACHE_SIZE", 1000)),
+)
+
+
+@cache
+def get_provider_cache() -> ProviderCache | None:
+    """Long histories uploaded as Gemini cached content, or None if that's off"""
+    return ProviderCache.from_env(get_client(), MODEL)
+
+
+def _forget_clients() -> None:
+    get_client.cache_clear()
+    get_provider_cache.cache_clear()
+
+
+os.register_at_fork(after_in_child=_forget_clients)
+
+SUMMARY_PROMPT = (
+    "Update the summary of this chat with its latest exchange. Keep the names, facts,"
+    " decisions and open questions that later messages might refer to. At most 200"
+    " words, no formatting at all"
+)
+
+SUMMARY_INPUT_CHARS = 4000
+
+
+def _history_for(session: Session, turn: Turn) -> History:
+    """What to send as the conversation leading up to `turn`"""
+    history = history_builder.build(session, turn)
+    logger.info(
+        f"Turn {turn.id}: sending {history.turns} of {turn.depth} earlier turns"
+        f"{' and a summary' if history.summarized else ''},"
+        f" ~{history.tokens + approx_tokens(turn.human_text)} tokens"
+    )
+    return history
+
+
+def _prompt_tokens(history: History, prompt: str) -> int:
+    return history.tokens + approx_tokens(prompt)
+
+
+def _title_contents(prompt: str) -> list[dict]:
     """
-    Stub function for Gemini API interaction.
-    In the real implementation, this would call the actual Gemini API.
+    The title request: just the (truncated) opening message, not the history or the
+    answer, so it doesn't have to wait for the answer and costs few input tokens
     """
-    if USE_GEMINI:
-        return gemini_with_history(session, turn_id, create_title=create_title)
-    else:
-        return gemini_fallback(session, turn_id, create_title=create_title)
+    return [user_content(f"{TITLE_PROMPT}\n\n{prompt[:TITLE_INPUT_CHARS]}")]
 
 
-def gemini_with_history(
-    session: Session, turn_id: UUID, *, create_title: bool = False
-) -> None:
+# Generation only touches the database (in a worker thread) before and after the model
+# call, and ends each transaction so the connection goes back to the pool while the
+# model is generating. A single event loop can then have hundreds of generations in
+# flight without pinning a thread or a connection for each one.
+
+
+def _summary_contents(session: Session, turn: Turn) -> list[dict] | None:
+    """
+    The request for the rolling summary of the conversation up to `turn`'s parent, or
+    None if it already has one. (The parent's exchange is complete, so its summary can
+    be made while `turn`'s answer is generating.)
+    """
+    if not turn.parent_id:
+        return None
+    parent = session.get(Turn, turn.parent_id)
+    if parent.summary or not parent.bot_text:
+        return None
+    previous = session.get(Turn, parent.parent_id).summary if parent.parent_id else None
+
+    return [
+        user_content(
+            f"{SUMMARY_PROMPT}\n\n"
+            f"Summary so far:\n{previous or '(none, the chat has just started)'}\n\n"
+            f"Latest exchange:\n"
+            f"User: {parent.human_text[:SUMMARY_INPUT_CHARS]}\n"
+            f"Assistant: {parent.bot_text[:SUMMARY_INPUT_CHARS]}"
+        )
+    ]
+
+
+def _load_prompt(
+    session: Session, turn_id: UUID
+) -> tuple[History, str, list[dict] | None]:
+    """The history, the message, and the parent's summary request (if it needs one)"""
     turn = session.get(Turn, turn_id)
     if not turn:
         raise ValueError(f"Turn {turn_id} not found")
 
-    prev_conversation = conversations.get_full_conversation_from_turn_id(
-        session, turn_id, turn.user_id
-    )
+    # The fallback doesn't need the history, so don't pay for the lineage query
+    if USE_GEMINI:
+        history = _history_for(session, turn)
+        summary_contents = (
+            _summary_contents(session, turn) if SUMMARIZE_HISTORY else None
+        )
+    else:
+        history, summary_contents = History(contents=[], tokens=0, turns=0), None
+    prompt = turn.human_text
 
-    history = []
+    # End the read transaction (commit rather than rollback, which would also roll
+    # back an outer transaction the session was bound to)
+    session.commit()
+    return history, prompt, summary_contents
 
-    for turn in prev_conversation:
-        if turn.human_text:
-            history.append(
-                {
-                    "role": "user",
-                    "parts": [{"text": turn.human_text}],
-                }
-            )
-        if turn.bot_text:
-            history.append(
-                {
-                    "role": "model",
-                    "parts": [{"text": turn.bot_text}],
-                }
-            )
 
-    chat = client.chats.create(model=MODEL, history=history)
-    response = chat.send_message(turn.human_text)
-    turn.bot_text = response.text
-    # Don't think we need `add`
+def _save_reply(
+    session: Session,
+    turn_id: UUID,
+    bot_text: str,
+    title: str | None = None,
+    *,
+    prompt_tokens: int | None = None,
+    parent_summary: str | None = None,
+) -> None:
+    turn = session.get(Turn, turn_id)
+    turn.bot_text = bot_text
+    turn.status = TurnStatus.COMPLETE
+    turn.claimed_at = None
+    turn.prompt_tokens = prompt_tokens
+    if title:
+        turn.title = title[:50]
     session.add(turn)
+    if parent_summary:
+        parent = session.get(Turn, turn.parent_id)
+        parent.summary = parent_summary
+        session.add(parent)
     session.commit()
 
+
+async def _none() -> None:
+    return None
+
+
+async def _agenerate_title(prompt: str) -> str | None:
+    if not (USE_GEMINI and prompt):
+        return None
     try:
-        chat_for_title = client.chats.create(model=MODEL, history=history)
-        response = chat_for_title.send_message(
-            "Make a very short title for this chat, i.e. summarize the point of it in two or three words, no formatting at all"
+        response = await get_client().aio.models.generate_content(
+            model=MODEL, contents=_title_contents(prompt)
         )
-        turn.title = response.text[:50]
-        session.add(turn)
-        session.commit()
+        return response.text
     except Exception as e:
         logger.error(f"Title failed: {e}")
+        return None
+
 
+async def _agenerate_summary(contents: list[dict]) -> str | None:
+    try:
+        response = await get_client().aio.models.generate_content(
+            model=MODEL, contents=contents
+        )
+        return response.text
+    except Exception as e:
+        logger.error(f"Summary failed: {e}")
+        return None
 
-def gemini_fallback(
+
+def _achat(history: History):
+    """A chat continuing `history`, by reference to cached content where there is one"""
+    provider_cache = get_provider_cache()
+    cached_content = (
+        provider_cache.cached_content_for(history) if provider_cache else None
+    )
+    if cached_content:
+        return get_client().aio.chats.create(
+            model=MODEL,
+            config=types.GenerateContentConfig(cached_content=cached_content),
+        )
+    return get_client().aio.chats.create(model=MODEL, history=history.contents)
+
+
+def cache_stats() -> dict:
+    """Hit/miss counters for the history and (if on) provider context caches"""
+    stats = {"history": history_builder.cache.stats()}
+    if provider_cache := get_provider_cache():
+        stats["provider"] = provider_cache.stats()
+    return stats
+
+
+async def agemini_with_fallback(
     session: Session, turn_id: UUID, *, create_title: bool = False
 ) -> None:
-    turn = session.get(Turn, turn_id)
-    if not turn:
-        raise ValueError(f"Turn {turn_id} not found")
+    """
+    Fill in the turn's bot_text (and with `create_title`, its title): from Gemini with
+    USE_GEMINI, otherwise a canned reply
+    """
+    with timed("history"):
+        history, prompt, summary_contents = await asyncio.to_thread(
+            _load_prompt, session, turn_id
+        )
 
-    # Generate a simple response based on the human input
-    bot_response = f"I see that you said {turn.human_text}"
+    async def answer() -> str:
+        if USE_GEMINI:
+            chat = _achat(history)
+            response = await chat.send_message(prompt)
+            return response.text
+        return f"I see that you said {prompt}"
 
-    # Update the turn with the bot response
-    turn.bot_text = bot_response
-    session.add(turn)
-    session.commit()
+    # The title and summary don't depend on the answer: one model round trip of
+    # latency rather than three
+    with timed("llm"):
+        bot_text, title, parent_summary = await asyncio.gather(
+            answer(),
+            _agenerate_title(prompt) if create_title else _none(),
+            _agenerate_summary(summary_contents) if summary_contents else _none(),
+        )
 
+    with timed("save"):
+        await asyncio.to_thread(
+            _save_reply,
+            session,
+            turn_id,
+            bot_text,
+            title,
+            prompt_tokens=_prompt_tokens(history, prompt) if USE_GEMINI else None,
+            parent_summary=parent_summary,
+        )
 
-def gemini(session: Session, turn_id: UUID) -> None:
+
+async def astream_with_fallback(
+    session: Session, turn_id: UUID, *, create_title: bool = False
+) -> AsyncIterator[str]:
     """
-    Stub function for Gemini API interaction.
-    In the real implementation, this would call the actual Gemini API.
+    Like `agemini_with_fallback`, but yields the response text as it is generated.
+    `bot_text` is saved once the response is complete.
     """
-    turn = session.get(Turn, turn_id)
-    if not turn:
-        raise ValueError(f"Turn {turn_id} not found")
+    with timed("history"):
+        history, prompt, summary_contents = await asyncio.to_thread(
+            _load_prompt, session, turn_id
+        )
 
-    resp = client.models.generate_content(
-        model=MODEL,
-        contents=turn.human_text,
+    title_task = asyncio.create_task(
+        _agenerate_title(prompt) if create_title else _none()
+    )
+    summary_task = asyncio.create_task(
+        _agenerate_summary(summary_contents) if summary_contents else _none()
     )
+    try:
+        chunks = []
+        with timed("llm"):
+            if USE_GEMINI:
+                chat = _achat(history)
+                async for chunk in await chat.send_message_stream(prompt):
+                    if chunk.text:
+                        chunks.append(chunk.text)
+                        yield chunk.text
+            else:
+                # Deterministic stand-in: the fallback text word by word. Split after
+                # each space so the chunks join back into exactly the fallback text.
+                for word in re.split(r"(?<= )", f"I see that you said {prompt}"):
+                    chunks.append(word)
+                    yield word
+            title, parent_summary = await title_task, await summary_task
 
-    # Update the turn with the bot response
-    turn.bot_text = resp.text
-    session.add(turn)
-    session.commit()
+        bot_text = "".join(chunks)
+        with timed("save"):
+            await asyncio.to_thread(
+                _save_reply,
+                session,
+                turn_id,
+                bot_text,
+                title,
+                prompt_tokens=_prompt_tokens(history, prompt) if USE_GEMINI else None,
+                parent_summary=parent_summary,
+            )
+    finally:
+        # e.g. the client disconnected mid-stream
+        for task in (title_task, summary_task):
+            task.cancel()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Generation worker: fills in `bot_text` for turns the API queued (USE_JOB_QUEUE=1).
+
+Each process runs `--concurrency` job loops on one event loop; the model calls are
+async, so a single process can keep many generations in flight. Scale throughput by
+running more processes (see the `worker` entry in the Procfile).
+
+    PYTHONPATH=$PYTHONPATH:python python -m llm.worker [--concurrency 50]
+"""
+
+import argparse
+import asyncio
+import logging
+from uuid import UUID
+
+from database.database import get_engine
+from llm.llm import agemini_with_fallback
+from models.turn import Turn
+from sqlmodel import Session
+from web.dao.generation_jobs import claim_generation_job, release_failed_job
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+def _starts_conversation(session: Session, turn_id: UUID) -> bool:
+    """Root turns and branches get a title of their own; plain replies don't"""
+    turn = session.get(Turn, turn_id)
+    parent = session.get(Turn, turn.parent_id) if turn.parent_id else None
+    starts_conversation = parent is None or turn.id in parent.branched_child_ids
+    session.commit()
+    return starts_conversation
+
+
+async def process_next_job(session: Session) -> bool:
+    """Claim and generate one queued turn. Returns False if the queue was empty."""
+    turn_id = await asyncio.to_thread(claim_generation_job, session)
+    if turn_id is None:
+        return False
+
+    try:
+        create_title = await asyncio.to_thread(_starts_conversation, session, turn_id)
+        await agemini_with_fallback(session, turn_id, create_title=create_title)
+    except Exception as e:
+        status = await asyncio.to_thread(release_failed_job, session, turn_id)
+        logger.error(f"Generation for turn {turn_id} failed ({status}): {e}")
+
+    return True
+
+
+async def run(concurrency: int, poll_interval: float) -> None:
+    async def job_loop():
+        while True:
+            with Session(get_engine()) as session:
+                if not await process_next_job(session):
+                    await asyncio.sleep(poll_interval)
+
+    await asyncio.gather(*(job_loop() for _ in range(concurrency)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument(
+        "--poll-interval",
+        type=float,
+        default=0.5,
+        help="Seconds an idle job loop waits before checking the queue again",
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(run(args.concurrency, args.poll_interval))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,19 @@
+from uuid import UUID
+
+from models.metadata import MAIN
+from sqlalchemy import BigInteger
+from sqlalchemy_utils import UUIDType
+from sqlmodel import Column, Field, SQLModel
+
+
+class TreeVersion(SQLModel, table=True):
+    """
+    A counter per conversation tree, bumped with every change to its turns (see
+    models.turn), for ETags. Only written by Postgres; a tree without a row yet is at 0.
+    """
+
+    metadata = MAIN
+    __tablename__ = "tree_version"
+
+    root_id: UUID = Field(sa_column=Column(UUIDType, primary_key=True))
+    version: int = Field(sa_column=Column(BigInteger, nullable=False))
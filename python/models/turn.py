@@ -1,18 +1,40 @@
 from datetime import datetime
+from enum import StrEnum
 from uuid import UUID, uuid4
 
 import sqlalchemy
 import sqlalchemy_utils
 from models.metadata import MAIN
-from sqlalchemy import DateTime, func
+from sqlalchemy import DDL, Computed, DateTime, Index, event, func
 from sqlalchemy.dialects import postgresql
 from sqlalchemy_utils import UUIDType
 from sqlmodel import Column, Field, SQLModel
 
 
+class TurnStatus(StrEnum):
+    """Progress of generating a turn's bot_text"""
+
+    PENDING = "pending"
+    RUNNING = "running"
+    COMPLETE = "complete"
+    FAILED = "failed"
+
+
 class Turn(SQLModel, table=True):
     metadata = MAIN
     __tablename__ = "turn"
+    __table_args__ = (
+        Index("ix_turn_root_id_depth", "root_id", "depth"),
+        Index("ix_turn_user_id_created_at_id", "user_id", "created_at", "id"),
+        Index("ix_turn_parent_id", "parent_id"),
+        # The generation job queue: only turns still waiting on (or stuck in)
+        # generation, oldest first
+        Index(
+            "ix_turn_generation_queue",
+            "created_at",
+            postgresql_where=sqlalchemy.text("status IN ('pending', 'running')"),
+        ),
+    )
 
     id: UUID = Field(
         sa_column=Column(
@@ -37,6 +59,14 @@ class Turn(SQLModel, table=True):
         sa_type=postgresql.ARRAY(sqlalchemy_utils.UUIDType),
         default_factory=list,
     )
+    # Materialized ancestry: the conversation tree's root turn, the distance from it,
+    # and the ids from the root down to (and including) this turn
+    root_id: UUID | None
+    depth: int = 0
+    path: list[UUID] = Field(
+        sa_type=postgresql.ARRAY(sqlalchemy_utils.UUIDType),
+        default_factory=list,
+    )
     title: str
     user_id: UUID
     human_text: str
@@ -44,5 +74,85 @@ class Turn(SQLModel, table=True):
     # TODO: other human input e.g. files, model, mode, style, etc
     # TODO: maybe put some validation on below being non-null once the LLM has returned
     bot_text: str | None
+    status: TurnStatus = Field(default=TurnStatus.PENDING, sa_type=sqlalchemy.String)
+    # Generation attempts so far, and when the current one was claimed by a worker
+    attempts: int = 0
+    claimed_at: datetime | None = Field(default=None, sa_type=DateTime(timezone=True))
+    # Approximate tokens sent to the model (history plus human_text) for bot_text
+    prompt_tokens: int | None = None
+    # Rolling summary of the conversation up to and including this turn, sent in place
+    # of it (and its ancestors) once it's too far back to be sent verbatim
+    summary: str | None = None
     # TODO: other bot input
     # TODO: llm_request_id once that is set up
+
+
+# The text search configuration the turns' texts are indexed with
+SEARCH_CONFIG = "english"
+
+# Full-text search over a turn's texts (see web.dao.conversations.search_turns), the
+# human's words weighted above the bot's, kept up to date by Postgres. On the table but
+# not the model, so loading turns doesn't drag their search vectors along.
+search_vector = Column(
+    "search_vector",
+    postgresql.TSVECTOR,
+    Computed(
+        f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(human_text, '')), 'A')"
+        f" || setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(bot_text, '')), 'B')",
+        persisted=True,
+    ),
+)
+Turn.__table__.append_column(search_vector)
+Index("ix_turn_search_vector", search_vector, postgresql_using="gin")
+
+
+@event.listens_for(Turn, "before_insert")
+def _set_root_ancestry(mapper, connection, target: Turn) -> None:
+    # A turn without a parent starts its own tree. Replies and branches get their
+    # ancestry from their parent in web.dao.conversations.
+    if target.parent_id is None and target.root_id is None:
+        target.root_id = target.id
+        target.depth = 0
+        target.path = [target.id]
+
+
+# Versions for ETags (see web.app), bumped by Postgres in the transaction making the
+# change, however it's made (ORM, Core or COPY): User.turns_version for any change to
+# the user's turns, TreeVersion.version for any in the tree. Bumping a counter row
+# locks it until commit, so a later commit always sees (and leaves) a higher version.
+# A change's timestamp wouldn't do: one made earlier can commit later.
+BUMP_TURN_VERSIONS = """
+CREATE OR REPLACE FUNCTION main.bump_turn_versions() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    UPDATE main."user" SET turns_version = turns_version + 1
+    WHERE id IN (SELECT user_id FROM changed_turns);
+    INSERT INTO main.tree_version (root_id, version)
+    SELECT DISTINCT root_id, 1 FROM changed_turns WHERE root_id IS NOT NULL
+    ON CONFLICT (root_id) DO UPDATE SET version = tree_version.version + 1;
+    RETURN NULL;
+END
+$$
+"""
+# Per statement, not per row, so bulk loads bump each counter once
+TURN_VERSION_TRIGGERS = {
+    "turn_versions_insert": "AFTER INSERT ON main.turn REFERENCING NEW TABLE",
+    "turn_versions_update": "AFTER UPDATE ON main.turn REFERENCING NEW TABLE",
+    "turn_versions_delete": "AFTER DELETE ON main.turn REFERENCING OLD TABLE",
+}
+
+event.listen(Turn.__table__, "after_create", DDL(BUMP_TURN_VERSIONS))
+for name, when in TURN_VERSION_TRIGGERS.items():
+    event.listen(
+        Turn.__table__,
+        "after_create",
+        DDL(
+            f"CREATE TRIGGER {name} {when} AS changed_turns"
+            " FOR EACH STATEMENT EXECUTE FUNCTION main.bump_turn_versions()"
+        ),
+    )
+event.listen(
+    Turn.__table__,
+    "after_drop",
+    DDL("DROP FUNCTION IF EXISTS main.bump_turn_versions()"),
+)
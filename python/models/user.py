@@ -3,7 +3,7 @@ from datetime import datetime
 
 import sqlalchemy
 from models.metadata import MAIN
-from sqlalchemy import DateTime, func
+from sqlalchemy import BigInteger, DateTime, func
 from sqlalchemy_utils import UUIDType
 from sqlmodel import Column, Field, SQLModel
 
@@ -29,6 +29,12 @@ class User(SQLModel, table=True):
         )
     )
 
+    # Bumped with every change to the user's turns (see models.turn), for ETags
+    turns_version: int = Field(
+        default=0,
+        sa_column=Column(BigInteger, nullable=False, server_default="0"),
+    )
+
     uid: str = Field(unique=True)
     email: str = Field(unique=True)
     # TODO: name, etc
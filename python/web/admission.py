@@ -0,0 +1,203 @@
+"""
+Admission control for the LLM-backed endpoints, so one user can't starve everyone else.
+
+Each request that will call the model first gets a `Slot` from `AdmissionControl.admit`,
+and gives it back once the model is done with it. A user is turned away with
+`AdmissionRejected` (a 429 with Retry-After, in web/app.py) when they have
+
+- already used up their token bucket: LLM_RATE_PER_MINUTE requests a minute, in bursts
+  of up to LLM_RATE_BURST, or
+- LLM_MAX_CONCURRENT_PER_USER requests in flight (or queued) already.
+
+Past LLM_MAX_CONCURRENT requests in flight in all, further ones queue, first come first
+served, for up to LLM_QUEUE_SECONDS before they're turned away too.
+
+The state is in process, like /metrics: each gunicorn worker applies the limits on its
+own, so a user's effective limits are up to the worker count times these. That keeps a
+database round trip (and a pooled connection) off every request; set the limits per
+worker accordingly.
+"""
+
+import asyncio
+import math
+import os
+import time
+from collections import deque
+from uuid import UUID
+
+from web.metrics import Counter, Histogram
+
+LLM_RATE_PER_MINUTE = float(os.environ.get("LLM_RATE_PER_MINUTE", 20))
+LLM_RATE_BURST = int(os.environ.get("LLM_RATE_BURST", 10))
+LLM_MAX_CONCURRENT_PER_USER = int(os.environ.get("LLM_MAX_CONCURRENT_PER_USER", 3))
+LLM_MAX_CONCURRENT = int(os.environ.get("LLM_MAX_CONCURRENT", 50))
+LLM_QUEUE_SECONDS = float(os.environ.get("LLM_QUEUE_SECONDS", 5))
+
+# What Retry-After says when the limit hit is a concurrency one, which frees up as soon
+# as a model call finishes
+BUSY_RETRY_AFTER_SECONDS = 1
+
+# Full buckets are the same as no bucket, so they're dropped once there are this many
+MAX_BUCKETS = 10_000
+
+rejections = Counter(
+    "llm_admission_rejections_total",
+    "LLM-backed requests turned away with a 429, by the limit they hit",
+    ("reason",),
+)
+queue_wait = Histogram(
+    "llm_admission_queue_seconds",
+    "Time LLM-backed requests waited for a place under LLM_MAX_CONCURRENT",
+)
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(f"{reason}; retry after {retry_after}s")
+        # "rate", "user_concurrency" or "busy"
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class Slot:
+    """A request's place under the limits, until `release` (which is idempotent)"""
+
+    def __init__(self, control: "AdmissionControl", user_id: UUID):
+        self._control = control
+        self._user_id = user_id
+        self._held = True
+
+    def release(self) -> None:
+        if self._held:
+            self._held = False
+            self._control._release(self._user_id)
+
+    def hand_over(self) -> "Slot":
+        """
+        A new Slot holding this one's place, for work that outlives the request's
+        dependencies (a streamed response). Releasing this one then does nothing.
+        """
+        self._held = False
+        return Slot(self._control, self._user_id)
+
+
+class AdmissionControl:
+    """
+    The limits' state. Only touched from the event loop, so it needs no locks: nothing
+    awaits between checking a limit and counting against it.
+    """
+
+    def __init__(
+        self,
+        *,
+        rate_per_minute: float = LLM_RATE_PER_MINUTE,
+        burst: int = LLM_RATE_BURST,
+        max_per_user: int = LLM_MAX_CONCURRENT_PER_USER,
+        max_total: int = LLM_MAX_CONCURRENT,
+        queue_seconds: float = LLM_QUEUE_SECONDS,
+    ):
+        self.rate = rate_per_minute / 60
+        self.burst = burst
+        self.max_per_user = max_per_user
+        self.max_total = max_total
+        self.queue_seconds = queue_seconds
+        # User -> (tokens, when they were counted)
+        self._buckets: dict[UUID, tuple[float, float]] = {}
+        # User -> requests in flight or queued
+        self._per_user: dict[UUID, int] = {}
+        # Requests in flight (not queued)
+        self._total = 0
+        # Queued requests, each waiting on a place being handed to it
+        self._waiters: deque[asyncio.Future] = deque()
+
+    async def admit(self, user_id: UUID) -> Slot:
+        """
+        A Slot for a request of the user's, or AdmissionRejected. Only admitted requests
+        use up a token, so being turned away (busy, say) doesn't count against the user.
+        """
+        if self._per_user.get(user_id, 0) >= self.max_per_user:
+            self._reject("user_concurrency", BUSY_RETRY_AFTER_SECONDS)
+        if wait := self._token_wait(user_id):
+            self._reject("rate", math.ceil(wait))
+
+        self._per_user[user_id] = self._per_user.get(user_id, 0) + 1
+        if self._total < self.max_total:
+            self._total += 1
+        else:
+            await self._queue(user_id)
+
+        if wait := self._take_token(user_id):
+            # The user's other requests used up the bucket while this one queued
+            self._release(user_id)
+            self._reject("rate", math.ceil(wait))
+        return Slot(self, user_id)
+
+    async def _queue(self, user_id: UUID) -> None:
+        """Wait for a request in flight to hand over its place"""
+        start = time.monotonic()
+        place = asyncio.get_running_loop().create_future()
+        self._waiters.append(place)
+        try:
+            async with asyncio.timeout(self.queue_seconds):
+                await place
+        except BaseException as e:
+            if place.done() and not place.cancelled():
+                # Handed a place just as the wait ended
+                self._release_place()
+            self._user_done(user_id)
+            if isinstance(e, TimeoutError):
+                self._reject("busy", BUSY_RETRY_AFTER_SECONDS)
+            raise
+        finally:
+            queue_wait.observe(time.monotonic() - start)
+
+    def _reject(self, reason: str, retry_after: int):
+        rejections.inc(reason=reason)
+        raise AdmissionRejected(reason, retry_after)
+
+    def _tokens(self, user_id: UUID, now: float) -> float:
+        tokens, counted_at = self._buckets.get(user_id, (self.burst, now))
+        return min(self.burst, tokens + (now - counted_at) * self.rate)
+
+    def _token_wait(self, user_id: UUID) -> float:
+        """Seconds until the user's bucket has a token, or 0 if it has one now"""
+        tokens = self._tokens(user_id, time.monotonic())
+        return (1 - tokens) / self.rate if tokens < 1 else 0
+
+    def _take_token(self, user_id: UUID) -> float:
+        """As _token_wait, but taking the token if there is one"""
+        now = time.monotonic()
+        tokens = self._tokens(user_id, now)
+        if tokens < 1:
+            return (1 - tokens) / self.rate
+        self._buckets[user_id] = (tokens - 1, now)
+        if len(self._buckets) > MAX_BUCKETS:
+            self._drop_full_buckets(now)
+        return 0
+
+    def _drop_full_buckets(self, now: float) -> None:
+        self._buckets = {
+            user_id: (tokens, counted_at)
+            for user_id, (tokens, counted_at) in self._buckets.items()
+            if tokens + (now - counted_at) * self.rate < self.burst
+        }
+
+    def _user_done(self, user_id: UUID) -> None:
+        count = self._per_user[user_id] - 1
+        if count:
+            self._per_user[user_id] = count
+        else:
+            del self._per_user[user_id]
+
+    def _release_place(self) -> None:
+        # Straight to the longest waiting request, if any, so none can jump the queue
+        while self._waiters:
+            place = self._waiters.popleft()
+            if not place.done():
+                place.set_result(None)
+                return
+        self._total -= 1
+
+    def _release(self, user_id: UUID) -> None:
+        self._user_done(user_id)
+        self._release_place()
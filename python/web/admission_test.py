@@ -0,0 +1,79 @@
+import asyncio
+from uuid import uuid4
+
+import pytest
+from web.admission import AdmissionControl, AdmissionRejected
+
+
+def test_rate_limit(monkeypatch):
+    """Each user has a bucket of `burst` requests, refilled at the rate"""
+    now = 1000.0
+    monkeypatch.setattr("web.admission.time.monotonic", lambda: now)
+    control = AdmissionControl(rate_per_minute=6, burst=2, max_per_user=10)
+    alice, bob = uuid4(), uuid4()
+
+    async def admit(user_id):
+        (await control.admit(user_id)).release()
+
+    asyncio.run(admit(alice))
+    asyncio.run(admit(alice))
+    with pytest.raises(AdmissionRejected) as rejected:
+        asyncio.run(admit(alice))
+    assert rejected.value.reason == "rate"
+    assert rejected.value.retry_after == 10
+    # Other users have their own buckets
+    asyncio.run(admit(bob))
+
+    now += 10
+    asyncio.run(admit(alice))
+
+
+def test_rejected_requests_keep_their_tokens():
+    """A request turned away as busy doesn't use up one of the user's tokens"""
+    control = AdmissionControl(burst=1, max_total=1, queue_seconds=0.05)
+    alice, bob = uuid4(), uuid4()
+
+    async def run():
+        alice_slot = await control.admit(alice)
+        with pytest.raises(AdmissionRejected) as rejected:
+            await control.admit(bob)
+        assert rejected.value.reason == "busy"
+        alice_slot.release()
+        (await control.admit(bob)).release()
+
+    asyncio.run(run())
+
+
+def test_concurrency_limits():
+    """Past the per-user cap requests are rejected; past the total, they queue"""
+    control = AdmissionControl(max_per_user=2, max_total=3, queue_seconds=0.2)
+    alice, bob, carol = uuid4(), uuid4(), uuid4()
+
+    async def run():
+        alice_slots = [await control.admit(alice), await control.admit(alice)]
+        with pytest.raises(AdmissionRejected) as rejected:
+            await control.admit(alice)
+        assert rejected.value.reason == "user_concurrency"
+
+        bob_slot = await control.admit(bob)
+        # All three places are taken, so Carol waits for one
+        carol_slot = asyncio.create_task(control.admit(carol))
+        await asyncio.sleep(0.05)
+        assert not carol_slot.done()
+        alice_slots.pop().release()
+        (await carol_slot).release()
+
+        # ...for up to queue_seconds
+        carol_slot = await control.admit(carol)
+        with pytest.raises(AdmissionRejected) as rejected:
+            await control.admit(carol)
+        assert rejected.value.reason == "busy"
+
+        for slot in (*alice_slots, bob_slot, carol_slot):
+            slot.release()
+            # Releasing again does nothing
+            slot.release()
+        assert control._total == 0
+        assert not control._per_user
+
+    asyncio.run(run())
@@ -1,32 +1,69 @@
+import asyncio
+import base64
 import datetime
+import hashlib
+import hmac
+import json
 import logging
 import os
+import time
+from collections.abc import Callable
+from contextlib import asynccontextmanager
 from uuid import UUID
 
+import anyio
 from auth.firebase import (
     authenticate as authenticate_to_firebase,
 )
-from auth.firebase import get_current_user
-from database.database import get_session
-from fastapi import Depends, FastAPI, HTTPException
+from auth.firebase import get_current_user, get_token_verifier
+from database.database import get_engine, get_session, pool_stats
+from fastapi import Depends, FastAPI, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, JSONResponse
-from fastapi.staticfiles import StaticFiles
-from llm.llm import gemini_with_fallback
-from models.turn import Turn
+from fastapi.responses import (
+    JSONResponse,
+    PlainTextResponse,
+    StreamingResponse,
+)
+from llm.llm import agemini_with_fallback, astream_with_fallback, cache_stats
+from models.turn import Turn, TurnStatus
 from models.user import User
 from pydantic import BaseModel
-from sqlmodel import Session, select
-from web.dao import conversations
-from web.dao.conversations import get_full_conversation_from_turn_id, reply_to_turn
+from sqlmodel import Session
+from starlette.concurrency import run_in_threadpool
+from web import metrics
+from web.admission import AdmissionControl, AdmissionRejected, Slot
+from web.dao import conversations, users
+from web.dao.conversations import reply_to_turn
+from web.dao.generation_jobs import STALE_AFTER, initial_status, set_turn_status
 from web.routers import admin
-from web.schemas.turn import TurnResponse
+from web.schemas.turn import (
+    ConversationTreeResponse,
+    SearchResultResponse,
+    TreeTurnResponse,
+    TurnResponse,
+)
 from web.schemas.user import CurrentUser
+from web.responses import FastJSONResponse
+from web.static_assets import StaticAssets
+from web.timing import TimingMiddleware, timed
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
-authenticate_to_firebase()
+# Leave new turns for the generation worker (llm/worker.py) instead of generating the
+# response inside the request
+USE_JOB_QUEUE = os.environ.get("USE_JOB_QUEUE", "0") == "1"
+
+# Longest a client can long-poll GET /api/turn/{turn_id} for
+MAX_TURN_WAIT_SECONDS = 30
+TURN_POLL_INTERVAL = 0.5
+
+# Most turns GET /api/turns returns the text of at once
+MAX_BATCH_TURNS = 200
+
+# Bearer token for the operational endpoints (/metrics and the /.*-stats ones), which
+# show route names, latencies and pool and cache usage. Unset, they're not served.
+OPS_TOKEN = os.environ.get("OPS_TOKEN")
 
 
 # TODO: move these into schemas
@@ -54,6 +91,12 @@ class ConversationListItem(BaseModel):
     created_at: datetime.datetime
 
 
+class ConversationListResponse(BaseModel):
+    items: list[ConversationListItem]
+    # Opaque; pass back as `cursor` to get the next page. None on the last page.
+    next_cursor: str | None
+
+
 class ReplyRequest(BaseModel):
     parent_turn_id: UUID
     text: str
@@ -64,7 +107,17 @@ class BranchReplyRequest(BaseModel):
     text: str
 
 
-app = FastAPI(title="Simple User Project API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Here rather than at import, so each worker sets up its own app (and a missing
+    # setting still stops the server starting). Not needed if tokens are verified some
+    # other way, as in the load test (see benchmarks/load_app.py).
+    if get_token_verifier not in app.dependency_overrides:
+        authenticate_to_firebase()
+    yield
+
+
+app = FastAPI(title="Simple User Project API", lifespan=lifespan)
 
 
 app.add_middleware(
@@ -78,9 +131,15 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-static_dir = os.path.join(os.path.dirname(__file__), "static")
-if os.path.exists(static_dir):
-    app.mount("/static", StaticFiles(directory=static_dir), name="static")
+# Added last so it's the outermost middleware, and times everything else
+app.add_middleware(TimingMiddleware)
+
+# The built frontend, read into memory (see web/static_assets.py). At import rather than
+# in the lifespan: it's the same in every worker, so under gunicorn --preload it's read
+# and compressed once, in the master, and the workers share the bytes copy-on-write
+# rather than each compressing the whole build again before they're ready.
+static_assets = StaticAssets(os.path.join(os.path.dirname(__file__), "static"))
+static_assets.load()
 
 
 @app.get("/.health")
@@ -88,6 +147,38 @@ def get_status():
     return JSONResponse(content={"success": True})
 
 
+def require_ops_token(request: Request) -> None:
+    if not OPS_TOKEN:
+        raise HTTPException(status_code=404, detail="Not found")
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(
+        token.encode(), OPS_TOKEN.encode()
+    ):
+        raise HTTPException(
+            status_code=401,
+            detail="Invalid ops token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+
+@app.get("/.pool-stats", dependencies=[Depends(require_ops_token)])
+def get_pool_stats():
+    """Database connection pool usage and checkout wait times for this worker process"""
+    return JSONResponse(content=pool_stats(get_engine()))
+
+
+@app.get("/.cache-stats", dependencies=[Depends(require_ops_token)])
+def get_cache_stats():
+    """Context cache hit/miss counters for this worker process"""
+    return JSONResponse(content=cache_stats())
+
+
+@app.get("/metrics", dependencies=[Depends(require_ops_token)])
+def get_metrics():
+    """Request, phase and query timings for this worker process, for Prometheus"""
+    return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
 @app.get("/api/me", response_model=CurrentUser)
 async def read_me(user: CurrentUser = Depends(get_current_user)):
     return user
@@ -99,160 +190,596 @@ def create_user(payload: CreateUserRequest, session: Session = Depends(get_sessi
     session.add(user)
     session.commit()
     session.refresh(user)
+    users.forget_user_ids(user.uid)
 
     return UserDataResponse(user_id=str(user.id))
 
 
-@app.post("/api/conversation/create", response_model=CreateConversationResponse)
-async def create_conversation(
-    payload: CreateConversationRequest,
+def _lookup_user_id(session: Session, uid: str) -> UUID | None:
+    user_id = users.get_user_id(session, uid)
+    # Don't hold on to the connection while the handler awaits something else
+    session.commit()
+    return user_id
+
+
+async def get_current_user_id(
     current_user: CurrentUser = Depends(get_current_user),
     session: Session = Depends(get_session),
-):
+) -> UUID:
     """
-    Create a new conversation by creating the initial turn and generating a response
+    The database id of the authenticated user. After the user's first request this
+    is an in-process lookup, not a query.
     """
-    # First, get the User record from the database using the Firebase UID
-    user = session.exec(select(User).where(User.uid == current_user.uid)).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found in database")
+    with timed("user"):
+        user_id = users.cached_user_id(current_user.uid) or await run_in_threadpool(
+            _lookup_user_id, session, current_user.uid
+        )
+    if not user_id:
+        raise HTTPException(status_code=404, detail="User not found")
+    return user_id
+
 
+def _create_root_turn(session: Session, user_id: UUID, text: str) -> UUID:
     # Create a new Turn with the user's input
     turn = Turn(
-        user_id=user.id,
-        human_text=payload.text,
+        user_id=user_id,
+        human_text=text,
         parent_id=None,  # This is the root turn of a new conversation
-        title=f"{payload.text[:20]}",  # TODO: fix
+        title=f"{text[:20]}",  # TODO: fix
         model="gemini-2.5-flash",
         bot_text=None,  # Will be filled by the stub function
+        **initial_status(queued=USE_JOB_QUEUE),
     )
 
     session.add(turn)
     session.commit()
     session.refresh(turn)
 
-    # Get the turn ID before calling the stub
-    turn_id = turn.id
+    return turn.id
+
+
+# The LLM-backed handlers below are async so a slow model call only parks a coroutine.
+# Their (sync) database work runs in the threadpool, and the connection is back in the
+# pool while the model is generating. Each holds a Slot (see web/admission.py) while it
+# does, so one user's requests can't crowd out everyone else's.
 
+llm_admission = AdmissionControl()
+
+
+async def admit_llm_request(user_id: UUID = Depends(get_current_user_id)):
+    """The request's Slot, released once the handler returns; or a 429"""
+    with timed("admission"):
+        try:
+            slot = await llm_admission.admit(user_id)
+        except AdmissionRejected as e:
+            raise HTTPException(
+                status_code=429,
+                detail="Too many requests",
+                headers={"Retry-After": str(e.retry_after)},
+            )
     try:
-        # Call the Gemini stub to generate a response
-        gemini_with_fallback(session, turn_id, create_title=True)
+        yield slot
+    finally:
+        slot.release()
+
+
+async def _generate(session: Session, turn_id: UUID, *, create_title: bool = False):
+    """
+    Fill in the new turn's bot_text, or with USE_JOB_QUEUE leave it pending for a
+    generation worker. Without it, the turn was inserted running, so no worker (if
+    there is one) generates it as well.
+    """
+    if USE_JOB_QUEUE:
+        return
+
+    try:
+        await agemini_with_fallback(session, turn_id, create_title=create_title)
     except Exception as e:
-        # If the stub fails, we should still return the turn ID
-        # but log the error for debugging
-        logger.error(f"Error calling Gemini stub: {e}")
+        # The turn is still returned, but marked failed rather than left running
+        logger.error(f"Generation for turn {turn_id} failed: {e}")
+        await run_in_threadpool(set_turn_status, session, turn_id, TurnStatus.FAILED)
+
+
+@app.post("/api/conversation/create", response_model=CreateConversationResponse)
+async def create_conversation(
+    payload: CreateConversationRequest,
+    user_id: UUID = Depends(get_current_user_id),
+    slot: Slot = Depends(admit_llm_request),
+    session: Session = Depends(get_session),
+):
+    """
+    Create a new conversation by creating the initial turn and generating a response
+    """
+    with timed("write"):
+        turn_id = await run_in_threadpool(
+            _create_root_turn, session, user_id, payload.text
+        )
+
+    await _generate(session, turn_id, create_title=True)
 
     return CreateConversationResponse(turn_id=turn_id)
 
 
-@app.get("/api/conversations", response_model=list[ConversationListItem])
+def _encode_cursor(created_at: datetime.datetime, turn_id: UUID) -> str:
+    raw = f"{created_at.isoformat()}|{turn_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> tuple[datetime.datetime, UUID]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        created_at, turn_id = raw.split("|")
+        return datetime.datetime.fromisoformat(created_at), UUID(turn_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+# Conditional GETs: the conversation endpoints send an ETag derived from a version of
+# the data behind them, bumped whenever it changes (see models/turn.py), so a client
+# revalidating with If-None-Match gets a 304 after one key lookup, without the response
+# being queried or serialized again. Browsers do this themselves for responses marked
+# no-cache.
+
+
+def _schema_fingerprint(model) -> str:
+    """Changes when the response's shape does, so a deploy invalidates old ETags"""
+    schema = json.dumps(model.model_json_schema(), sort_keys=True)
+    return hashlib.sha256(schema.encode()).hexdigest()[:8]
+
+
+CONVERSATION_LIST_SCHEMA = _schema_fingerprint(ConversationListResponse)
+TURN_SCHEMA = _schema_fingerprint(TurnResponse)
+TREE_SCHEMA = _schema_fingerprint(ConversationTreeResponse)
+
+
+def _etag(*parts) -> str:
+    """A strong ETag: the same parts mean a byte-identical response"""
+    digest = hashlib.sha256("|".join(map(str, parts)).encode()).hexdigest()[:32]
+    return f'"{digest}"'
+
+
+def _cache_headers(etag: str) -> dict[str, str]:
+    return {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+
+def _not_modified(request: Request, etag: str) -> Response | None:
+    """A 304 if the request's If-None-Match matches `etag`, otherwise None"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        # If-None-Match compares weakly, so W/ tags count too
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        if etag in tags or "*" in tags:
+            return Response(status_code=304, headers=_cache_headers(etag))
+    return None
+
+
+# The turn columns each response needs, named as in the response models. The handlers
+# below return FastJSONResponses of just these, rather than Turns for FastAPI to
+# validate against response_model (which is still what the docs show): see
+# web/responses.py.
+TURN_COLUMNS = [getattr(Turn, name) for name in TurnResponse.model_fields]
+TREE_COLUMNS = [getattr(Turn, name) for name in TreeTurnResponse.model_fields]
+TREE_COLUMNS_WITHOUT_BODIES = [
+    column for column in TREE_COLUMNS if column.key not in ("human_text", "bot_text")
+]
+
+
+@app.get("/api/conversations", response_model=ConversationListResponse)
 def list_conversations(
-    current_user: CurrentUser = Depends(get_current_user),
+    request: Request,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: str | None = None,
+    user_id: UUID = Depends(get_current_user_id),
     session: Session = Depends(get_session),
 ):
-    user = session.exec(select(User).where(User.uid == current_user.uid)).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-
-    turns = conversations.get_separable_conversations(session, user.id)
-
-    return [
-        ConversationListItem(
-            root_turn_id=t.id,  # TODO: this is wrong
-            identifying_turn_id=t.id,  # or another ID if you track branches separately
-            title=t.title,
-            created_at=t.created_at,
-        )
-        for t in turns
-    ]
+    version = conversations.get_user_version(session, user_id)
+    etag = _etag(CONVERSATION_LIST_SCHEMA, user_id, version, limit, cursor)
+    if not_modified := _not_modified(request, etag):
+        return not_modified
+
+    # Fetch one extra row to find out whether there is a next page
+    rows = conversations.get_separable_conversation_rows(
+        session,
+        user_id,
+        (Turn.id, Turn.title, Turn.created_at),
+        limit=limit + 1,
+        before=_decode_cursor(cursor) if cursor else None,
+    )
+    page = rows[:limit]
+
+    content = {
+        "items": [
+            {
+                "root_turn_id": row["id"],  # TODO: this is wrong
+                # or another ID if you track branches separately
+                "identifying_turn_id": row["id"],
+                "title": row["title"],
+                "created_at": row["created_at"],
+            }
+            for row in page
+        ],
+        "next_cursor": (
+            _encode_cursor(page[-1]["created_at"], page[-1]["id"])
+            if len(rows) > limit
+            else None
+        ),
+    }
+    return FastJSONResponse(content, headers=_cache_headers(etag))
 
 
 @app.get("/api/conversation/{turn_id}", response_model=list[TurnResponse])
 def get_conversation_by_turn_id(
+    request: Request,
     turn_id: UUID,
-    current_user: CurrentUser = Depends(get_current_user),
+    user_id: UUID = Depends(get_current_user_id),
     session: Session = Depends(get_session),
 ):
-    user = session.exec(select(User).where(User.uid == current_user.uid)).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
+    version = conversations.get_tree_version(session, turn_id, user_id)
+    if version is None:
+        # Not found, or not the user's
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    etag = _etag(TURN_SCHEMA, user_id, turn_id, version)
+    if not_modified := _not_modified(request, etag):
+        return not_modified
 
-    full_convo = get_full_conversation_from_turn_id(session, turn_id, user.id)
+    full_convo = conversations.get_full_conversation_rows(
+        session, turn_id, user_id, TURN_COLUMNS
+    )
 
     if not full_convo:
         raise HTTPException(status_code=404, detail="Conversation not found")
 
-    return full_convo
+    return FastJSONResponse(full_convo, headers=_cache_headers(etag))
 
 
-@app.post("/api/conversation/reply", response_model=TurnResponse)
-def reply_to_conversation(
-    payload: ReplyRequest,
-    current_user: CurrentUser = Depends(get_current_user),
+@app.get("/api/conversation/{turn_id}/tree", response_model=ConversationTreeResponse)
+def get_conversation_tree(
+    request: Request,
+    turn_id: UUID,
+    bodies: bool = True,
+    user_id: UUID = Depends(get_current_user_id),
     session: Session = Depends(get_session),
 ):
-    user = session.exec(select(User).where(User.uid == current_user.uid)).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
+    """
+    Every turn in the conversation tree containing `turn_id`, as an adjacency list, for
+    drawing its branches in one round trip. With bodies=false the turns' texts are left
+    out (and not read from the database); fetch them with GET /api/turns as needed.
+    """
+    version = conversations.get_tree_version(session, turn_id, user_id)
+    if version is None:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    etag = _etag(TREE_SCHEMA, user_id, turn_id, version, bodies)
+    if not_modified := _not_modified(request, etag):
+        return not_modified
 
-    new_turn = reply_to_turn(
-        session=session,
-        user_id=user.id,
-        parent_turn_id=payload.parent_turn_id,
-        text=payload.text,
+    if bodies:
+        turns = conversations.get_conversation_tree_rows(
+            session, turn_id, user_id, TREE_COLUMNS
+        )
+    else:
+        turns = conversations.get_conversation_tree_rows(
+            session, turn_id, user_id, TREE_COLUMNS_WITHOUT_BODIES
+        )
+        for turn in turns:
+            turn["human_text"] = turn["bot_text"] = None
+    return FastJSONResponse(
+        {"root_id": turns[0]["id"], "turns": turns}, headers=_cache_headers(etag)
     )
 
-    # Optional: call Gemini stub to populate bot_text
-    try:
-        gemini_with_fallback(session, new_turn.id)
-    except Exception as e:
-        logger.error(f"Stub failed: {e}")
 
-    return new_turn
+@app.get("/api/turns", response_model=list[TurnResponse])
+def get_turns(
+    ids: list[UUID] = Query(..., max_length=MAX_BATCH_TURNS),
+    user_id: UUID = Depends(get_current_user_id),
+    session: Session = Depends(get_session),
+):
+    """
+    The turns with the given ids (`?ids=...&ids=...`), in no particular order. Ids that
+    aren't the user's turns are left out.
+    """
+    return conversations.get_turns(session, ids, user_id)
+
+
+@app.get("/api/search", response_model=list[SearchResultResponse])
+def search(
+    q: str = Query(..., min_length=1, max_length=500),
+    limit: int = Query(20, ge=1, le=50),
+    user_id: UUID = Depends(get_current_user_id),
+    session: Session = Depends(get_session),
+):
+    """
+    The user's turns matching `q` (words, "quoted phrases", or, -word), best first,
+    with highlighted snippets and the conversation tree each is in
+    """
+    return [
+        SearchResultResponse(**row._mapping)
+        for row in conversations.search_turns(session, user_id, q, limit=limit)
+    ]
+
+
+@app.post("/api/conversation/reply", response_model=TurnResponse)
+async def reply_to_conversation(
+    payload: ReplyRequest,
+    user_id: UUID = Depends(get_current_user_id),
+    slot: Slot = Depends(admit_llm_request),
+    session: Session = Depends(get_session),
+):
+    with timed("write"):
+        new_turn_id = await run_in_threadpool(
+            lambda: (
+                reply_to_turn(
+                    session=session,
+                    user_id=user_id,
+                    parent_turn_id=payload.parent_turn_id,
+                    text=payload.text,
+                    queued=USE_JOB_QUEUE,
+                ).id
+            )
+        )
+
+    await _generate(session, new_turn_id)
+
+    return await run_in_threadpool(session.get, Turn, new_turn_id)
 
 
 @app.post("/api/conversation/branch-reply", response_model=TurnResponse)
-def branch_reply_to_conversation(
+async def branch_reply_to_conversation(
     payload: BranchReplyRequest,
-    current_user: CurrentUser = Depends(get_current_user),
+    user_id: UUID = Depends(get_current_user_id),
+    slot: Slot = Depends(admit_llm_request),
     session: Session = Depends(get_session),
 ):
-    user = session.exec(select(User).where(User.uid == current_user.uid)).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
+    with timed("write"):
+        new_turn_id = await run_in_threadpool(
+            lambda: (
+                conversations.branch_reply_to_turn(
+                    session=session,
+                    user_id=user_id,
+                    parent_turn_id=payload.parent_turn_id,
+                    text=payload.text,
+                    queued=USE_JOB_QUEUE,
+                ).id
+            )
+        )
+
+    await _generate(session, new_turn_id, create_title=True)
 
-    new_turn = conversations.branch_reply_to_turn(
-        session=session,
-        user_id=user.id,
-        parent_turn_id=payload.parent_turn_id,
-        text=payload.text,
+    return await run_in_threadpool(session.get, Turn, new_turn_id)
+
+
+def _get_turn_response(
+    session: Session, turn_id: UUID, user_id: UUID
+) -> TurnResponse | None:
+    turn = session.get(Turn, turn_id)
+    response = (
+        TurnResponse.model_validate(turn, from_attributes=True)
+        if turn and turn.user_id == user_id
+        else None
     )
+    # End the transaction so every poll sees the latest committed status
+    session.commit()
+    return response
 
-    try:
-        gemini_with_fallback(session, new_turn.id, create_title=True)
-    except Exception as e:
-        logger.error(f"Branch stub failed: {e}")
 
-    return new_turn
+@app.get("/api/turn/{turn_id}", response_model=TurnResponse)
+async def get_turn(
+    turn_id: UUID,
+    wait: float = Query(0, ge=0, le=MAX_TURN_WAIT_SECONDS),
+    user_id: UUID = Depends(get_current_user_id),
+    session: Session = Depends(get_session),
+):
+    """
+    A single turn, including its generation `status`. With `wait`, long-polls for up to
+    that many seconds until generation has finished (completed or failed).
+    """
+    turn = await _wait_for_turn(session, turn_id, user_id, wait)
+    if not turn:
+        raise HTTPException(status_code=404, detail="Turn not found")
+    return turn
+
+
+async def _wait_for_turn(
+    session: Session, turn_id: UUID, user_id: UUID, wait: float
+) -> TurnResponse | None:
+    """
+    The turn once generation has finished, or as it is after `wait` seconds. None if
+    it isn't the user's.
+    """
+    deadline = time.monotonic() + wait
+    while True:
+        turn = await run_in_threadpool(_get_turn_response, session, turn_id, user_id)
+        if not turn or turn.status in (TurnStatus.COMPLETE, TurnStatus.FAILED):
+            return turn
+        if time.monotonic() >= deadline:
+            return turn
+        await asyncio.sleep(min(TURN_POLL_INTERVAL, deadline - time.monotonic()))
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+class _ClosingStreamingResponse(StreamingResponse):
+    """
+    A StreamingResponse that calls `on_close` once it's over, however it ends. The
+    body's own `finally` only runs if iterating it ever started, which it doesn't if
+    the client goes away before the response does (or sending its start fails).
+    """
+
+    def __init__(self, content, on_close: Callable[[], None], **kwargs):
+        super().__init__(content, **kwargs)
+        self.on_close = on_close
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.on_close()
+
+
+def _stream_reply(
+    session: Session,
+    turn_id: UUID,
+    user_id: UUID,
+    slot: Slot,
+    *,
+    create_title: bool = False,
+) -> StreamingResponse:
+    """
+    Server-Sent Events for generating the bot response to `turn_id`: a `turn` event
+    with the turn ID, a `chunk` event per piece of text as it arrives, then `done`
+    (or `error`). `bot_text` is saved once generation completes. `slot` is held until
+    the stream ends.
+
+    With USE_JOB_QUEUE a worker generates the response, and it's sent as one chunk once
+    the worker is done (or an `error` if that takes longer than a worker may hold a
+    turn; the turn can still be polled for with GET /api/turn/{turn_id}).
+    """
+    # The request's session is closed once the handler returns, before the body is
+    # streamed, so generation gets its own session on the same bind
+    bind = session.get_bind()
+
+    async def events():
+        stream_session = Session(bind)
+        try:
+            yield _sse("turn", {"turn_id": str(turn_id)})
+            if USE_JOB_QUEUE:
+                turn = await _wait_for_turn(
+                    stream_session, turn_id, user_id, STALE_AFTER.total_seconds()
+                )
+                if turn.status != TurnStatus.COMPLETE:
+                    detail = (
+                        "Generation failed"
+                        if turn.status == TurnStatus.FAILED
+                        else "Still generating"
+                    )
+                    yield _sse("error", {"detail": detail})
+                    return
+                yield _sse("chunk", {"text": turn.bot_text})
+            else:
+                async for chunk in astream_with_fallback(
+                    stream_session, turn_id, create_title=create_title
+                ):
+                    yield _sse("chunk", {"text": chunk})
+        except Exception as e:
+            logger.error(f"Streaming stub failed: {e}")
+            if not USE_JOB_QUEUE:
+                await run_in_threadpool(
+                    set_turn_status, stream_session, turn_id, TurnStatus.FAILED
+                )
+            yield _sse("error", {"detail": "Generation failed"})
+            return
+        except BaseException:
+            # The client went away (GeneratorExit, or a cancellation) mid-generation.
+            # Don't leave the turn running, or clients polling for it never stop. The
+            # request is being cancelled, so shield the update from that.
+            if not USE_JOB_QUEUE:
+                with anyio.CancelScope(shield=True):
+                    await run_in_threadpool(
+                        set_turn_status, stream_session, turn_id, TurnStatus.FAILED
+                    )
+            raise
+        finally:
+            slot.release()
+            with anyio.CancelScope(shield=True):
+                await run_in_threadpool(stream_session.close)
+        yield _sse("done", {"turn_id": str(turn_id)})
+
+    return _ClosingStreamingResponse(
+        events(),
+        # Slot.release is idempotent, so this is a no-op if the stream got to its end
+        on_close=slot.release,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.post("/api/conversation/create/stream")
+async def create_conversation_stream(
+    payload: CreateConversationRequest,
+    user_id: UUID = Depends(get_current_user_id),
+    slot: Slot = Depends(admit_llm_request),
+    session: Session = Depends(get_session),
+):
+    """Streaming variant of /api/conversation/create"""
+    with timed("write"):
+        turn_id = await run_in_threadpool(
+            _create_root_turn, session, user_id, payload.text
+        )
+
+    return _stream_reply(session, turn_id, user_id, slot.hand_over(), create_title=True)
+
+
+@app.post("/api/conversation/reply/stream")
+async def reply_to_conversation_stream(
+    payload: ReplyRequest,
+    user_id: UUID = Depends(get_current_user_id),
+    slot: Slot = Depends(admit_llm_request),
+    session: Session = Depends(get_session),
+):
+    """Streaming variant of /api/conversation/reply"""
+    with timed("write"):
+        new_turn_id = await run_in_threadpool(
+            lambda: (
+                reply_to_turn(
+                    session=session,
+                    user_id=user_id,
+                    parent_turn_id=payload.parent_turn_id,
+                    text=payload.text,
+                    queued=USE_JOB_QUEUE,
+                ).id
+            )
+        )
+
+    return _stream_reply(session, new_turn_id, user_id, slot.hand_over())
+
+
+@app.post("/api/conversation/branch-reply/stream")
+async def branch_reply_to_conversation_stream(
+    payload: BranchReplyRequest,
+    user_id: UUID = Depends(get_current_user_id),
+    slot: Slot = Depends(admit_llm_request),
+    session: Session = Depends(get_session),
+):
+    """Streaming variant of /api/conversation/branch-reply"""
+    with timed("write"):
+        new_turn_id = await run_in_threadpool(
+            lambda: (
+                conversations.branch_reply_to_turn(
+                    session=session,
+                    user_id=user_id,
+                    parent_turn_id=payload.parent_turn_id,
+                    text=payload.text,
+                    queued=USE_JOB_QUEUE,
+                ).id
+            )
+        )
+
+    return _stream_reply(
+        session, new_turn_id, user_id, slot.hand_over(), create_title=True
+    )
 
 
 app.include_router(admin.router)
 
 
+@app.api_route("/static/{path:path}", methods=["GET", "HEAD"])
+def serve_static(path: str, request: Request):
+    asset = static_assets.get(path)
+    if asset is None:
+        raise HTTPException(status_code=404, detail="Not found")
+    return asset.response(request)
+
+
 @app.get("/{full_path:path}")
-def serve_spa(full_path: str):
+def serve_spa(full_path: str, request: Request):
     """Serve the frontend SPA for all routes that don't match API endpoints"""
 
-    # Don't serve SPA for API routes or static files
-    if full_path.startswith("api/") or full_path.startswith("static/"):
+    # Don't serve SPA for API routes
+    if full_path.startswith("api/"):
         raise HTTPException(status_code=404, detail="Not found")
 
-    # Check if static directory exists
-    if not os.path.exists(static_dir):
+    index = static_assets.get("index.html")
+    if index is None:
         raise HTTPException(status_code=404, detail="Frontend not built")
-
-    index_file = os.path.join(static_dir, "index.html")
-    if os.path.exists(index_file):
-        return FileResponse(index_file)
-
-    raise HTTPException(status_code=404, detail="Frontend not built")
+    return index.response(request)
@@ -1,12 +1,27 @@
+import asyncio
+import json
+import logging
 import os
+import re
+from types import SimpleNamespace
+from uuid import UUID, uuid4
 
 import pytest
-from database.database import create_all_tables
+import sqlalchemy
+import web.app
+import web.timing
+from database.database import TimedQueuePool, create_all_tables, pool_stats
 from fastapi.testclient import TestClient
+from llm.worker import process_next_job
 from models.turn import Turn
 from models.user import User
+from sqlalchemy import event
 from sqlmodel import Session, create_engine, select
+from web.admission import AdmissionControl
 from web.app import app, get_current_user, get_session
+from web.dao import users
+from web.routers import admin
+from web.static_assets import StaticAssets
 
 # SQLite test database
 # SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
@@ -43,6 +58,8 @@ def db_session_fixture():
         session.close()
         transaction.rollback()
         connection.close()
+        # The rolled back users' ids are gone
+        users.forget_user_ids()
 
 
 def override_get_session():
@@ -69,6 +86,13 @@ app.dependency_overrides[get_current_user] = override_get_current_user
 client = TestClient(app)
 
 
+@pytest.fixture(name="ops_headers")
+def ops_headers_fixture(monkeypatch):
+    """Turns on the operational endpoints, returning the headers that authorize them"""
+    monkeypatch.setattr(web.app, "OPS_TOKEN", "test-ops-token")
+    return {"Authorization": "Bearer test-ops-token"}
+
+
 def test_create_user(db_session: Session):
     """Tests the create_user endpoint."""
     # Use a custom dependency override for this test to inject our fixture session
@@ -175,13 +199,649 @@ def test_list_conversations(db_session: Session):
     # Parse the response
     data = response.json()
 
-    # Expecting 3 conversations
-    assert isinstance(data, list)
-    assert len(data) == 3
+    # Expecting 3 conversations, all on the first page
+    assert isinstance(data["items"], list)
+    assert len(data["items"]) == 3
+    assert data["next_cursor"] is None
 
     # Optional: verify contents of the response
-    for item in data:
+    for item in data["items"]:
         assert "root_turn_id" in item
         assert "identifying_turn_id" in item
         assert "title" in item
         assert "created_at" in item
+
+
+def test_list_conversations_pagination(db_session: Session):
+    """
+    Pages through the seeded conversations one at a time using next_cursor.
+    """
+    from database import seed
+
+    user = User(uid="test_uid_123", email="test@example.com")
+    db_session.add(user)
+    db_session.commit()
+    seed.seed_turns(db_session, user.id)
+
+    app.dependency_overrides[get_session] = lambda: db_session
+
+    seen = []
+    cursor = None
+    while True:
+        params = {"limit": 1}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get("/api/conversations", params=params)
+        assert response.status_code == 200
+
+        data = response.json()
+        assert len(data["items"]) == 1
+        seen.extend(item["identifying_turn_id"] for item in data["items"])
+
+        cursor = data["next_cursor"]
+        if cursor is None:
+            break
+
+    full = client.get("/api/conversations").json()
+    assert seen == [item["identifying_turn_id"] for item in full["items"]]
+
+    response = client.get("/api/conversations", params={"cursor": "not-a-cursor"})
+    assert response.status_code == 400
+
+
+def test_conversation_tree(db_session: Session):
+    """
+    GET /api/conversation/{turn_id}/tree returns the whole tree in one query, with or
+    without the texts, and GET /api/turns fetches texts by id
+    """
+    user = User(uid="test_uid_123", email="test@example.com")
+    db_session.add(user)
+    db_session.commit()
+
+    app.dependency_overrides[get_session] = lambda: db_session
+
+    response = client.post("/api/conversation/create", json={"text": "Hello"})
+    root_id = response.json()["turn_id"]
+    reply = client.post(
+        "/api/conversation/reply", json={"parent_turn_id": root_id, "text": "And?"}
+    ).json()
+    branch = client.post(
+        "/api/conversation/branch-reply",
+        json={"parent_turn_id": root_id, "text": "Or?"},
+    ).json()
+
+    tree = client.get(f"/api/conversation/{branch['id']}/tree").json()
+    assert tree["root_id"] == root_id
+    turns = {turn["id"]: turn for turn in tree["turns"]}
+    assert tree["turns"][0]["id"] == root_id
+    assert set(turns) == {root_id, reply["id"], branch["id"]}
+    assert turns[root_id]["primary_child_id"] == reply["id"]
+    assert turns[root_id]["branched_child_ids"] == [branch["id"]]
+    assert turns[branch["id"]]["parent_id"] == root_id
+    assert turns[branch["id"]]["human_text"] == "Or?"
+
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        response = client.get(
+            f"/api/conversation/{root_id}/tree", params={"bodies": "false"}
+        )
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+    assert response.status_code == 200
+    assert [turn["id"] for turn in response.json()["turns"]] == list(turns)
+    assert all(
+        turn["human_text"] is None and turn["bot_text"] is None
+        for turn in response.json()["turns"]
+    )
+    # The version (for the ETag), then the tree, without the texts
+    tree_statements = [s for s in statements if "main.turn" in s]
+    assert len(tree_statements) == 2, tree_statements
+    assert "bot_text" not in tree_statements[-1]
+
+    response = client.get(
+        "/api/turns", params={"ids": [reply["id"], branch["id"], str(uuid4())]}
+    )
+    assert response.status_code == 200
+    texts = {turn["id"]: turn["human_text"] for turn in response.json()}
+    assert texts == {reply["id"]: "And?", branch["id"]: "Or?"}
+
+    response = client.get(f"/api/conversation/{uuid4()}/tree")
+    assert response.status_code == 404
+
+    too_many = [str(uuid4()) for _ in range(web.app.MAX_BATCH_TURNS + 1)]
+    assert client.get("/api/turns", params={"ids": too_many}).status_code == 422
+
+
+def test_search(db_session: Session):
+    from database import seed
+
+    user = User(uid="test_uid_123", email="test@example.com")
+    db_session.add(user)
+    db_session.commit()
+    seed.seed_turns(db_session, user.id)
+
+    app.dependency_overrides[get_session] = lambda: db_session
+
+    response = client.get("/api/search", params={"q": "depletion region"})
+    assert response.status_code == 200
+    (result,) = response.json()
+    assert result["title"] == "Green"
+    assert "\x02depletion\x03 \x02region\x03" in result["snippet"]
+    tree = client.get(f"/api/conversation/{result['turn_id']}/tree").json()
+    assert tree["root_id"] == result["root_id"]
+
+    assert client.get("/api/search", params={"q": ""}).status_code == 422
+
+
+def test_fast_json_matches_response_models(db_session: Session):
+    """
+    The conversation endpoints encode projected rows themselves; the bytes are what
+    validating Turns against their response models would have produced
+    """
+    from database import seed
+    from fastapi.responses import JSONResponse
+    from pydantic import TypeAdapter
+    from web.dao import conversations
+    from web.schemas.turn import ConversationTreeResponse, TurnResponse
+
+    user = User(uid="test_uid_123", email="test@example.com")
+    db_session.add(user)
+    db_session.commit()
+    seed.seed_turns(db_session, user.id)
+
+    app.dependency_overrides[get_session] = lambda: db_session
+
+    def encoded(adapter: TypeAdapter, value) -> bytes:
+        python = adapter.dump_python(
+            adapter.validate_python(value, from_attributes=True), mode="json"
+        )
+        return JSONResponse(python).body
+
+    page = conversations.get_separable_conversations(db_session, user.id, limit=2)
+    expected = encoded(
+        TypeAdapter(web.app.ConversationListResponse),
+        {
+            "items": [
+                {
+                    "root_turn_id": turn.id,
+                    "identifying_turn_id": turn.id,
+                    "title": turn.title,
+                    "created_at": turn.created_at,
+                }
+                for turn in page
+            ],
+            "next_cursor": web.app._encode_cursor(page[-1].created_at, page[-1].id),
+        },
+    )
+    assert client.get("/api/conversations", params={"limit": 2}).content == expected
+
+    turn = page[0]
+    lineage = conversations.get_full_conversation_from_turn_id(
+        db_session, turn.id, user.id
+    )
+    expected = encoded(TypeAdapter(list[TurnResponse]), lineage)
+    assert client.get(f"/api/conversation/{turn.id}").content == expected
+
+    tree = conversations.get_conversation_tree(db_session, turn.id, user.id)
+    expected = encoded(
+        TypeAdapter(ConversationTreeResponse), {"root_id": tree[0].id, "turns": tree}
+    )
+    assert client.get(f"/api/conversation/{turn.id}/tree").content == expected
+
+
+def test_conditional_get(db_session: Session):
+    """
+    The conversation endpoints answer a matching If-None-Match with a 304, without
+    querying the conversations, until a turn in them changes.
+    """
+    from database import seed
+
+    user = User(uid="test_uid_123", email="test@example.com")
+    db_session.add(user)
+    db_session.commit()
+    seed.seed_turns(db_session, user.id)
+
+    app.dependency_overrides[get_session] = lambda: db_session
+
+    conversation = client.get("/api/conversations").json()["items"][0]
+    turn_id = conversation["identifying_turn_id"]
+
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    for url in ("/api/conversations", f"/api/conversation/{turn_id}"):
+        response = client.get(url)
+        assert response.status_code == 200
+        etag = response.headers["etag"]
+        assert re.fullmatch(r'"[0-9a-f]+"', etag)
+        assert response.headers["cache-control"] == "private, no-cache"
+
+        statements.clear()
+        event.listen(engine, "before_cursor_execute", record)
+        try:
+            response = client.get(url, headers={"If-None-Match": f'"other", {etag}'})
+        finally:
+            event.remove(engine, "before_cursor_execute", record)
+        assert response.status_code == 304
+        assert response.content == b""
+        assert response.headers["etag"] == etag
+        # Only the version lookup
+        assert len(statements) == 1, statements
+
+    list_etag = client.get("/api/conversations").headers["etag"]
+    tree_etag = client.get(f"/api/conversation/{turn_id}").headers["etag"]
+
+    response = client.post(
+        "/api/conversation/reply", json={"parent_turn_id": turn_id, "text": "And?"}
+    )
+    assert response.status_code == 200
+
+    for url, etag in (
+        ("/api/conversations", list_etag),
+        (f"/api/conversation/{turn_id}", tree_etag),
+    ):
+        response = client.get(url, headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.headers["etag"] != etag
+
+
+def test_create_conversation_stream(db_session: Session):
+    """
+    Streams the fake backend's response over SSE and checks it is saved at the end.
+    """
+    user = User(uid="test_uid_123", email="test@example.com")
+    db_session.add(user)
+    db_session.commit()
+
+    app.dependency_overrides[get_session] = lambda: db_session
+
+    with client.stream(
+        "POST", "/api/conversation/create/stream", json={"text": "Hello, Gemini!"}
+    ) as response:
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        body = "".join(response.iter_text())
+
+    events = []
+    for message in body.strip().split("\n\n"):
+        event_line, data_line = message.split("\n")
+        events.append((event_line.removeprefix("event: "), json.loads(data_line[6:])))
+
+    assert events[0][0] == "turn"
+    assert events[-1][0] == "done"
+    chunks = [data["text"] for event, data in events if event == "chunk"]
+    assert len(chunks) > 1
+    assert "".join(chunks) == "I see that you said Hello, Gemini!"
+
+    turn_id = events[0][1]["turn_id"]
+    db_turn = db_session.exec(select(Turn).where(Turn.id == turn_id)).one()
+    assert db_turn.bot_text == "I see that you said Hello, Gemini!"
+
+
+def test_llm_admission(db_session: Session, monkeypatch):
+    """LLM-backed requests past the user's limits get a 429 with Retry-After"""
+    user = User(uid="test_uid_123", email="test@example.com")
+    db_session.add(user)
+    db_session.commit()
+
+    app.dependency_overrides[get_session] = lambda: db_session
+    admission = AdmissionControl(rate_per_minute=2, burst=2)
+    monkeypatch.setattr(web.app, "llm_admission", admission)
+
+    response = client.post("/api/conversation/create", json={"text": "Hello"})
+    assert response.status_code == 200
+    with client.stream(
+        "POST", "/api/conversation/create/stream", json={"text": "Hello"}
+    ) as response:
+        assert response.status_code == 200
+        response.read()
+    # Both slots were given back, the streamed one once its stream ended
+    assert admission._total == 0
+
+    response = client.post("/api/conversation/create", json={"text": "Hello"})
+    assert response.status_code == 429
+    assert 0 < int(response.headers["retry-after"]) <= 30
+
+    # Only the LLM-backed endpoints are limited
+    assert client.get("/api/conversations").status_code == 200
+
+
+def test_queued_turn_generated_by_worker(db_session: Session, monkeypatch):
+    """
+    With the job queue on, create returns a pending turn that a worker then fills in;
+    GET /api/turn/{turn_id} reports its progress.
+    """
+    user = User(uid="test_uid_123", email="test@example.com")
+    db_session.add(user)
+    db_session.commit()
+
+    app.dependency_overrides[get_session] = lambda: db_session
+    monkeypatch.setattr(web.app, "USE_JOB_QUEUE", True)
+
+    response = client.post("/api/conversation/create", json={"text": "Hello, Gemini!"})
+    assert response.status_code == 200
+    turn_id = response.json()["turn_id"]
+
+    response = client.get(f"/api/turn/{turn_id}")
+    assert response.status_code == 200
+    assert response.json()["status"] == "pending"
+    assert response.json()["bot_text"] is None
+
+    assert asyncio.run(process_next_job(db_session))
+    # Nothing else is queued
+    assert not asyncio.run(process_next_job(db_session))
+
+    response = client.get(f"/api/turn/{turn_id}", params={"wait": 5})
+    assert response.status_code == 200
+    assert response.json()["status"] == "complete"
+    assert response.json()["bot_text"] == "I see that you said Hello, Gemini!"
+
+    assert client.get(f"/api/turn/{uuid4()}").status_code == 404
+
+
+def test_inline_turns_not_claimed_by_worker(db_session: Session, monkeypatch):
+    """
+    Without the job queue the web process generates turns itself, so a worker polling
+    the same database doesn't generate them too.
+    """
+    user = User(uid="test_uid_123", email="test@example.com")
+    db_session.add(user)
+    db_session.commit()
+
+    app.dependency_overrides[get_session] = lambda: db_session
+    claimed = []
+    agemini_with_fallback = web.app.agemini_with_fallback
+    astream_with_fallback = web.app.astream_with_fallback
+
+    async def generate(session, turn_id, **kwargs):
+        # A worker polls while the reply is being generated
+        claimed.append(await process_next_job(db_session))
+        return await agemini_with_fallback(session, turn_id, **kwargs)
+
+    async def stream(session, turn_id, **kwargs):
+        claimed.append(await process_next_job(db_session))
+        async for chunk in astream_with_fallback(session, turn_id, **kwargs):
+            yield chunk
+
+    monkeypatch.setattr(web.app, "agemini_with_fallback", generate)
+    monkeypatch.setattr(web.app, "astream_with_fallback", stream)
+
+    response = client.post("/api/conversation/create", json={"text": "Hello"})
+    turn_ids = [response.json()["turn_id"]]
+    with client.stream(
+        "POST", "/api/conversation/create/stream", json={"text": "Hello"}
+    ) as response:
+        body = response.read().decode()
+    turn_ids.append(json.loads(body.split("\n")[1].removeprefix("data: "))["turn_id"])
+
+    assert claimed == [False, False]
+    for turn_id in turn_ids:
+        turn = db_session.get(Turn, UUID(turn_id))
+        db_session.refresh(turn)
+        assert turn.status == "complete"
+        assert turn.attempts == 0
+        assert turn.bot_text == "I see that you said Hello"
+
+
+def test_stream_disconnect_fails_turn(db_session: Session):
+    """A turn whose stream is closed mid-generation is failed, not left running"""
+    user = User(uid="test_uid_123", email="test@example.com")
+    db_session.add(user)
+    db_session.commit()
+    turn_id = web.app._create_root_turn(db_session, user.id, "Hello")
+
+    slot = asyncio.run(AdmissionControl().admit(user.id))
+    response = web.app._stream_reply(db_session, turn_id, user.id, slot)
+
+    async def disconnect():
+        events = response.body_iterator
+        assert (await anext(events)).startswith("event: turn")
+        await events.aclose()
+
+    asyncio.run(disconnect())
+    turn = db_session.get(Turn, turn_id)
+    db_session.refresh(turn)
+    assert turn.status == "failed"
+
+
+def test_stream_never_started_releases_slot(db_session: Session):
+    """A client gone before the stream starts still gives back the request's slot"""
+    user = User(uid="test_uid_123", email="test@example.com")
+    db_session.add(user)
+    db_session.commit()
+    turn_id = web.app._create_root_turn(db_session, user.id, "Hello")
+
+    admission = AdmissionControl()
+    slot = asyncio.run(admission.admit(user.id))
+    response = web.app._stream_reply(db_session, turn_id, user.id, slot)
+    sent = []
+
+    async def receive():
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        # A slow connection: the client is gone before the response starts
+        sent.append(message)
+        await asyncio.Event().wait()
+
+    asyncio.run(response({"type": "http"}, receive, send))
+    assert [message["type"] for message in sent] == ["http.response.start"]
+    assert admission._total == 0
+    assert not admission._per_user
+
+
+def test_user_id_resolved_once(db_session: Session):
+    """The uid -> user id lookup is cached after the first request, per uid"""
+    app.dependency_overrides[get_session] = lambda: db_session
+
+    assert client.get("/api/conversations").status_code == 404
+    # Unknown users aren't cached, so creating one takes effect straight away
+    response = client.post(
+        "/api/user", json={"uid": "test_uid_123", "email": "test@example.com"}
+    )
+    user_id = UUID(response.json()["user_id"])
+    assert users.cached_user_id("test_uid_123") is None
+
+    assert client.get("/api/conversations").status_code == 200
+    assert users.cached_user_id("test_uid_123") == user_id
+
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        assert client.get("/api/conversations").status_code == 200
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+    assert statements
+    assert not any("main.user" in statement for statement in statements)
+
+
+def test_user_id_cache_evicts_least_recently_used(db_session: Session, monkeypatch):
+    monkeypatch.setattr(users, "MAX_CACHED_USERS", 2)
+    for uid in ("lru_a", "lru_b", "lru_c"):
+        db_session.add(User(uid=uid, email=f"{uid}@test.com"))
+    db_session.commit()
+
+    a = users.get_user_id(db_session, "lru_a")
+    users.get_user_id(db_session, "lru_b")
+    # Looking "lru_a" up again leaves "lru_b" the least recently used
+    assert users.cached_user_id("lru_a") == a
+    c = users.get_user_id(db_session, "lru_c")
+
+    assert users.cached_user_id("lru_b") is None
+    assert users.cached_user_id("lru_a") == a
+    assert users.cached_user_id("lru_c") == c
+
+
+def test_pool_stats(ops_headers):
+    """Checkouts, and the time spent waiting for them, are recorded per pool"""
+    pool_engine = create_engine(
+        DATABASE_URL,
+        poolclass=TimedQueuePool,
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=0.1,
+    )
+    try:
+        with pool_engine.connect():
+            with pytest.raises(sqlalchemy.exc.TimeoutError):
+                pool_engine.connect()
+
+        stats = pool_stats(pool_engine)
+        assert stats["checkouts"] == 1
+        assert stats["timeouts"] == 1
+        assert stats["checked_out"] == 0
+        assert stats["wait_seconds_max"] >= 0.1
+    finally:
+        pool_engine.dispose()
+
+    assert client.get("/.pool-stats").status_code == 401
+    assert client.get("/.pool-stats", headers=ops_headers).status_code == 200
+
+
+def test_static_assets(tmp_path, monkeypatch):
+    """The built frontend is served from memory, compressed and cached as it allows"""
+    script = b"console.log('gptree');\n" * 100
+    (tmp_path / "assets").mkdir()
+    (tmp_path / "index.html").write_bytes(b"<!doctype html><title>gptree</title>")
+    (tmp_path / "assets" / "index-Bx1x3k9a.js").write_bytes(script)
+    (tmp_path / "assets" / "index-Bx1x3k9a.js.br").write_bytes(b"prebuilt brotli")
+    static_assets = StaticAssets(str(tmp_path))
+    static_assets.load()
+    monkeypatch.setattr(web.app, "static_assets", static_assets)
+
+    # Any other path is the SPA's, and gets index.html, revalidated by ETag
+    response = client.get("/conversation/123")
+    assert response.status_code == 200
+    assert response.text == "<!doctype html><title>gptree</title>"
+    assert response.headers["cache-control"] == "no-cache"
+    assert "content-encoding" not in response.headers  # Too small to compress
+    response = client.get("/", headers={"If-None-Match": response.headers["etag"]})
+    assert response.status_code == 304
+
+    # Hashed assets are immutable, and come in the encoding the client prefers
+    response = client.get(
+        "/static/assets/index-Bx1x3k9a.js", headers={"Accept-Encoding": "gzip"}
+    )
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["cache-control"] == "public, max-age=31536000, immutable"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.content == script
+    gzip_etag = response.headers["etag"]
+
+    response = client.get(
+        "/static/assets/index-Bx1x3k9a.js", headers={"Accept-Encoding": "identity"}
+    )
+    assert "content-encoding" not in response.headers
+    assert response.content == script
+    assert response.headers["etag"] != gzip_etag
+
+    with client.stream(
+        "GET",
+        "/static/assets/index-Bx1x3k9a.js",
+        headers={"Accept-Encoding": "gzip, br"},
+    ) as response:
+        assert response.headers["content-encoding"] == "br"
+        assert response.read() == b"prebuilt brotli"
+
+    assert client.get("/static/assets/missing.js").status_code == 404
+    assert client.get("/static/assets/index-Bx1x3k9a.js.br").status_code == 404
+    assert client.get("/api/missing").status_code == 404
+
+
+@pytest.mark.parametrize("path", ["/metrics", "/.pool-stats", "/.cache-stats"])
+def test_ops_endpoints_need_token(path: str, monkeypatch):
+    """The operational endpoints are off without OPS_TOKEN, and need it when it's set"""
+    assert client.get(path).status_code == 404
+
+    monkeypatch.setattr(web.app, "OPS_TOKEN", "test-ops-token")
+    assert client.get(path).status_code == 401
+    response = client.get(path, headers={"Authorization": "Bearer wrong"})
+    assert response.status_code == 401
+    response = client.get(path, headers={"Authorization": "Bearer test-ops-token"})
+    assert response.status_code == 200
+
+
+def test_request_timing(db_session: Session, monkeypatch, caplog, ops_headers):
+    """
+    Each request reports its phases and query count in Server-Timing, adds them to
+    /metrics, and is logged with its queries when slow
+    """
+    user = User(uid="test_uid_123", email="test@example.com")
+    db_session.add(user)
+    db_session.commit()
+
+    app.dependency_overrides[get_session] = lambda: db_session
+
+    response = client.post("/api/conversation/create", json={"text": "Hello"})
+    turn_id = response.json()["turn_id"]
+
+    route = 'route="/api/conversation/reply"'
+    samples = (
+        f"http_request_db_queries_count{{{route}}}",
+        f'http_request_phase_seconds_count{{{route},phase="llm"}}',
+    )
+
+    def counts():
+        # The metrics are kept for the whole process, so earlier tests count too
+        lines = client.get("/metrics", headers=ops_headers).text.splitlines()
+        values = dict(line.rsplit(" ", 1) for line in lines if not line.startswith("#"))
+        return [int(values.get(sample, 0)) for sample in samples]
+
+    before = counts()
+    monkeypatch.setattr(web.timing, "SLOW_REQUEST_SECONDS", 0)
+    with caplog.at_level(logging.WARNING, logger="web.timing"):
+        response = client.post(
+            "/api/conversation/reply", json={"parent_turn_id": turn_id, "text": "Hi"}
+        )
+    assert response.status_code == 200
+
+    timings = dict(
+        metric.split(";", 1) for metric in response.headers["Server-Timing"].split(", ")
+    )
+    assert {"user", "write", "history", "llm", "save", "db", "total"} <= set(timings)
+    queries = int(re.search(r'desc="(\d+) queries"', timings["db"]).group(1))
+    assert queries > 0
+
+    (record,) = [r for r in caplog.records if r.name == "web.timing"]
+    assert "POST /api/conversation/reply 200" in record.message
+    assert f"{queries} queries" in record.message
+    assert "INSERT INTO main.turn" in record.message
+
+    assert counts() == [count + 1 for count in before]
+
+
+def test_seed_user_syncs_firebase_users(db_session: Session, monkeypatch):
+    """New Firebase users are inserted; ones already in the database are skipped"""
+    db_session.add(User(uid="existing_uid", email="existing@example.com"))
+    db_session.commit()
+
+    class Page:
+        users = [
+            SimpleNamespace(uid="existing_uid", email="existing@example.com"),
+            SimpleNamespace(uid="new_uid_1", email="new_1@example.com"),
+            SimpleNamespace(uid="new_uid_2", email="new_2@example.com"),
+        ]
+        has_next_page = False
+
+    monkeypatch.setattr(admin.fb_auth, "list_users", Page)
+
+    assert admin.seed_user(db_session)
+    assert admin.seed_user(db_session)
+
+    uids = [fb_user.uid for fb_user in Page.users]
+    synced = db_session.exec(
+        select(User.uid).where(User.uid.in_(uids)).order_by(User.uid)
+    ).all()
+    assert synced == uids
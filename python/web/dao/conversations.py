@@ -1,12 +1,56 @@
+from collections.abc import Sequence
+from datetime import datetime
 from uuid import UUID
 
-from models.turn import Turn  # Adjust import as needed
-from sqlalchemy import any_
-from sqlalchemy.orm import aliased
+from models.tree_version import TreeVersion
+from models.turn import SEARCH_CONFIG, Turn, search_vector  # Adjust import as needed
+from models.user import User
+from sqlalchemy import Select, any_, func, tuple_, union, update
+from sqlalchemy.orm import QueryableAttribute, aliased, defer
 from sqlmodel import Session, or_, select
+from web.dao.generation_jobs import initial_status
 
+# What search snippets mark the start and end of each match with: control characters,
+# so they can't be confused with the turn's text (or need escaping to show it)
+SNIPPET_START = "\x02"
+SNIPPET_STOP = "\x03"
+SNIPPET_OPTIONS = (
+    f'StartSel="{SNIPPET_START}", StopSel="{SNIPPET_STOP}",'
+    ' MaxFragments=2, MaxWords=20, MinWords=8, FragmentDelimiter=" … "'
+)
 
-def get_separable_conversations(session: Session, user_id: UUID) -> list[Turn]:
+
+def get_separable_conversations(
+    session: Session,
+    user_id: UUID,
+    *,
+    limit: int | None = None,
+    before: tuple[datetime, UUID] | None = None,
+) -> list[Turn]:
+    """
+    Newest first, ordered by (created_at, id). Pass the (created_at, id) of the last
+    turn of the previous page as `before` to continue from it (keyset pagination).
+    """
+    stmt = _separable_conversations(user_id, limit=limit, before=before)
+    return session.exec(stmt).all()
+
+
+def get_separable_conversation_rows(
+    session: Session,
+    user_id: UUID,
+    columns: Sequence[QueryableAttribute],
+    *,
+    limit: int | None = None,
+    before: tuple[datetime, UUID] | None = None,
+) -> list[dict]:
+    """As get_separable_conversations, but only `columns` of each turn (see `_rows`)"""
+    stmt = _separable_conversations(user_id, limit=limit, before=before)
+    return _rows(session, stmt, columns)
+
+
+def _separable_conversations(
+    user_id: UUID, *, limit: int | None, before: tuple[datetime, UUID] | None
+) -> Select:
     TurnAlias = aliased(Turn)
 
     stmt = (
@@ -19,43 +63,263 @@ def get_separable_conversations(session: Session, user_id: UUID) -> list[Turn]:
                 Turn.id == any_(TurnAlias.branched_child_ids),
             ),
         )
-        .order_by(Turn.created_at.desc())
+        .order_by(Turn.created_at.desc(), Turn.id.desc())
     )
 
-    return session.exec(stmt).all()
+    if before is not None:
+        stmt = stmt.where(tuple_(Turn.created_at, Turn.id) < tuple_(*before))
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    return stmt
 
 
 def get_full_conversation_from_turn_id(
     session: Session, turn_id: UUID, user_id: UUID
 ) -> list[Turn]:
-    # Traverse up to root
-    current = session.get(Turn, turn_id)
+    # Each path is O(depth) long, so don't load them all back for an O(depth) lineage
+    stmt = _lineage(turn_id).options(defer(Turn.path))
+    full_convo = list(session.exec(stmt).all())
+
+    if not full_convo:
+        return []
+
+    current = next(turn for turn in full_convo if turn.id == turn_id)
     if current.user_id != user_id:
         raise ValueError("User is not authorized")
 
-    if not current:
+    return full_convo
+
+
+def get_full_conversation_rows(
+    session: Session,
+    turn_id: UUID,
+    user_id: UUID,
+    columns: Sequence[QueryableAttribute],
+) -> list[dict]:
+    """
+    As get_full_conversation_from_turn_id, but only `columns` of each turn (see
+    `_rows`)
+    """
+    return _owned_rows(session, _lineage(turn_id), columns, turn_id, user_id)
+
+
+def _lineage(turn_id: UUID) -> Select:
+    # Ancestors come straight from the starting turn's materialized path; the primary
+    # chain below it is walked with a recursive CTE. Both are fetched in a single
+    # round trip and ordered by depth.
+    ancestors = select(func.unnest(Turn.path).label("id")).where(Turn.id == turn_id)
+
+    ChildAlias = aliased(Turn)
+    descendants = (
+        select(Turn.id, Turn.primary_child_id)
+        .where(Turn.id == turn_id)
+        .cte("descendants", recursive=True)
+    )
+    descendants = descendants.union_all(
+        select(ChildAlias.id, ChildAlias.primary_child_id).join(
+            descendants, ChildAlias.id == descendants.c.primary_child_id
+        )
+    )
+
+    lineage = union(ancestors, select(descendants.c.id)).subquery("lineage")
+
+    return select(Turn).join(lineage, Turn.id == lineage.c.id).order_by(Turn.depth)
+
+
+def get_ancestors(
+    session: Session, turn: Turn, *, limit: int | None = None
+) -> list[Turn]:
+    """
+    The turns above `turn`, root first. With `limit`, only the nearest `limit` of
+    them: a deep thread's earlier turns aren't read at all.
+    """
+    ancestor_ids = turn.path[:-1]
+    if limit is not None:
+        ancestor_ids = ancestor_ids[-limit:] if limit else []
+    if not ancestor_ids:
+        return []
+
+    stmt = (
+        select(Turn)
+        .where(Turn.id.in_(ancestor_ids))
+        .options(defer(Turn.path))
+        .order_by(Turn.depth)
+    )
+    return list(session.exec(stmt).all())
+
+
+def get_conversation_tree(session: Session, turn_id: UUID, user_id: UUID) -> list[Turn]:
+    """
+    Every turn in the tree containing `turn_id`, ordered by depth (and creation time
+    within a depth), fetched with a single scan of the root_id index.
+    """
+    tree = list(session.exec(_tree(turn_id).options(defer(Turn.path))).all())
+
+    if tree and tree[0].user_id != user_id:
+        raise ValueError("User is not authorized")
+
+    return tree
+
+
+def get_conversation_tree_rows(
+    session: Session,
+    turn_id: UUID,
+    user_id: UUID,
+    columns: Sequence[QueryableAttribute],
+) -> list[dict]:
+    """As get_conversation_tree, but only `columns` of each turn (see `_rows`)"""
+    return _owned_rows(session, _tree(turn_id), columns, turn_id, user_id)
+
+
+def _tree(turn_id: UUID) -> Select:
+    root_id = select(Turn.root_id).where(Turn.id == turn_id).scalar_subquery()
+    return (
+        select(Turn)
+        .where(Turn.root_id == root_id)
+        .order_by(Turn.depth, Turn.created_at)
+    )
+
+
+# The *_rows variants select just the columns a response needs, as plain dicts keyed by
+# column name, for encoding straight to JSON: building Turn objects (and then response
+# models from them) costs far more than the query for long lineages and big trees
+
+
+def _rows(
+    session: Session, stmt: Select, columns: Sequence[QueryableAttribute]
+) -> list[dict]:
+    names = [column.key for column in columns]
+    # execute rather than exec: sqlmodel's exec would return just the first column
+    rows = session.execute(stmt.with_only_columns(*columns)).all()
+    return [dict(zip(names, row)) for row in rows]
+
+
+def _owned_rows(
+    session: Session,
+    stmt: Select,
+    columns: Sequence[QueryableAttribute],
+    turn_id: UUID,
+    user_id: UUID,
+) -> list[dict]:
+    """`_rows`, checking that `turn_id`, among them, is the user's"""
+    names = [column.key for column in columns]
+    stmt = stmt.with_only_columns(
+        Turn.id.label("owner_check_id"),
+        Turn.user_id.label("owner_check_user_id"),
+        *columns,
+    )
+    rows = session.execute(stmt).all()
+
+    if not rows:
         return []
 
-    earlier = [current]
+    if next(row[1] for row in rows if row[0] == turn_id) != user_id:
+        raise ValueError("User is not authorized")
+
+    return [dict(zip(names, row[2:])) for row in rows]
 
-    while current.parent_id:
-        current = session.get(Turn, current.parent_id)
-        earlier = [current, *earlier]
 
-    # Traverse down primary_child_id path as long as it's part of the original lineage
-    # TODO: this is inelegant
-    current = session.get(Turn, turn_id)
-    if not current.primary_child_id:
-        return earlier
-    current = session.get(Turn, current.primary_child_id)
-    while current:
-        earlier.append(current)
-        if not current.primary_child_id:
-            break
-        next_turn = session.get(Turn, current.primary_child_id)
-        current = next_turn
+def get_turns(session: Session, turn_ids: list[UUID], user_id: UUID) -> list[Turn]:
+    """The user's turns among `turn_ids`, in no particular order; others are left out"""
+    stmt = (
+        select(Turn)
+        .where(Turn.id.in_(turn_ids), Turn.user_id == user_id)
+        .options(defer(Turn.path))
+    )
+    return list(session.exec(stmt).all())
 
-    return earlier
+
+def search_turns(
+    session: Session, user_id: UUID, query: str, *, limit: int = 20
+) -> list:
+    """
+    The user's turns matching `query` (web search syntax: words, "quoted phrases", or,
+    -word), best match first, as rows of (turn_id, root_id, title, created_at, rank,
+    snippet). Matches in the snippets are wrapped in SNIPPET_START and SNIPPET_STOP.
+    """
+    tsquery = func.websearch_to_tsquery(SEARCH_CONFIG, query)
+    rank = func.ts_rank_cd(search_vector, tsquery)
+
+    # Rank and pick the page first: the headlines re-parse the texts, so they're only
+    # made for the turns returned
+    matches = (
+        select(
+            Turn.id,
+            Turn.root_id,
+            Turn.title,
+            Turn.created_at,
+            Turn.human_text,
+            Turn.bot_text,
+            rank.label("rank"),
+        )
+        .where(Turn.user_id == user_id, search_vector.op("@@")(tsquery))
+        .order_by(rank.desc(), Turn.created_at.desc())
+        .limit(limit)
+        .subquery("matches")
+    )
+    snippet = func.ts_headline(
+        SEARCH_CONFIG,
+        func.concat_ws(" … ", matches.c.human_text, matches.c.bot_text),
+        tsquery,
+        SNIPPET_OPTIONS,
+    )
+    stmt = select(
+        matches.c.id.label("turn_id"),
+        matches.c.root_id,
+        matches.c.title,
+        matches.c.created_at,
+        matches.c.rank,
+        snippet.label("snippet"),
+    ).order_by(matches.c.rank.desc(), matches.c.created_at.desc())
+    return list(session.exec(stmt).all())
+
+
+def get_user_version(session: Session, user_id: UUID) -> int | None:
+    """
+    A counter bumped with every change to the user's turns (None if there's no such
+    user): the conversation list can only have changed if this has. One key lookup.
+    """
+    stmt = select(User.turns_version).where(User.id == user_id)
+    return session.exec(stmt).first()
+
+
+def get_tree_version(session: Session, turn_id: UUID, user_id: UUID) -> int | None:
+    """
+    A counter bumped with every change to the tree containing `turn_id` (None if
+    there's no such turn of the user's): no lineage in the tree can have changed unless
+    this has.
+    """
+    stmt = (
+        select(func.coalesce(TreeVersion.version, 0))
+        .select_from(Turn)
+        .outerjoin(TreeVersion, TreeVersion.root_id == Turn.root_id)
+        .where(Turn.id == turn_id, Turn.user_id == user_id)
+    )
+    return session.exec(stmt).first()
+
+
+def _with_ancestry(turn: Turn, parent: Turn) -> Turn:
+    turn.root_id = parent.root_id
+    turn.depth = parent.depth + 1
+    turn.path = [*parent.path, turn.id]
+    return turn
+
+
+def _insert_child(session: Session, child: Turn, link) -> Turn:
+    """
+    Insert `child` and point its parent at it with `link` (an UPDATE of the parent row),
+    in one transaction. The child's id is generated here rather than by the database,
+    so both statements go out in the same flush, and its created_at comes back with
+    the INSERT, so there is nothing to refresh afterwards.
+    """
+    session.add(child)
+    session.flush()
+    session.exec(link)
+    # Keep the returned turn's loaded attributes: committing would expire them, and
+    # the next access would re-select the row
+    session.expunge(child)
+    session.commit()
+    return child
 
 
 # Double-check that the last turn in a conversation is being returned, not the identifying
@@ -65,32 +329,40 @@ def reply_to_turn(
     user_id: UUID,
     parent_turn_id: UUID,
     text: str,
+    *,
+    queued: bool = True,
 ) -> Turn:
+    """
+    The new turn is pending, for a generation worker, unless not `queued`: then it's
+    running, for the caller to generate (see generation_jobs.initial_status).
+    """
     prev_turn = session.get(Turn, parent_turn_id)
 
     if not prev_turn or prev_turn.user_id != user_id:
         raise ValueError("Invalid turn or unauthorized")
 
     # Create the reply turn
-    new_turn = Turn(
-        user_id=user_id,
-        human_text=text,
-        model="gemini-2.5-flash",
-        title=prev_turn.title,
-        parent_id=prev_turn.id,
-        bot_text=None,
+    new_turn = _with_ancestry(
+        Turn(
+            user_id=user_id,
+            human_text=text,
+            model="gemini-2.5-flash",
+            title=prev_turn.title,
+            parent_id=prev_turn.id,
+            bot_text=None,
+            **initial_status(queued=queued),
+        ),
+        prev_turn,
     )
 
-    session.add(new_turn)
-    session.commit()
-    session.refresh(new_turn)
-
     # Update prev_turn to point to new_turn
-    prev_turn.primary_child_id = new_turn.id
-    session.add(prev_turn)
-    session.commit()
-
-    return new_turn
+    return _insert_child(
+        session,
+        new_turn,
+        update(Turn)
+        .where(Turn.id == prev_turn.id)
+        .values(primary_child_id=new_turn.id),
+    )
 
 
 def branch_reply_to_turn(
@@ -98,31 +370,37 @@ def branch_reply_to_turn(
     user_id: UUID,
     parent_turn_id: UUID,
     text: str,
+    *,
+    queued: bool = True,
 ) -> Turn:
+    """`queued` as for reply_to_turn"""
     parent = session.get(Turn, parent_turn_id)
 
     if not parent or parent.user_id != user_id:
         raise ValueError("Invalid parent or unauthorized")
 
     # Create a new Turn
-    new_turn = Turn(
-        user_id=user_id,
-        human_text=text,
-        model="gemini-2.5-flash",
-        title=parent.title + " - branch",
-        parent_id=parent.id,
-        bot_text=None,
+    new_turn = _with_ancestry(
+        Turn(
+            user_id=user_id,
+            human_text=text,
+            model="gemini-2.5-flash",
+            title=parent.title + " - branch",
+            parent_id=parent.id,
+            bot_text=None,
+            **initial_status(queued=queued),
+        ),
+        parent,
     )
 
-    session.add(new_turn)
-    session.commit()
-    session.refresh(new_turn)
-
-    # Update branched_child_ids
-    parent.branched_child_ids = parent.branched_child_ids or []
-    parent.branched_child_ids.append(new_turn.id)
-
-    session.add(parent)
-    session.commit()
-
-    return new_turn
+    # Append to branched_child_ids in the database rather than writing back a list
+    # read earlier, so concurrent branches from one parent can't drop each other
+    return _insert_child(
+        session,
+        new_turn,
+        update(Turn)
+        .where(Turn.id == parent.id)
+        .values(
+            branched_child_ids=func.array_append(Turn.branched_child_ids, new_turn.id)
+        ),
+    )
@@ -1,11 +1,17 @@
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from uuid import UUID, uuid4
 
 import pytest
 from database import seed
 from database.database import create_all_tables
+from llm.context_cache import CachedHistory
+from llm.history import BudgetedHistory, FullHistory, approx_tokens
 from models.turn import Turn
 from models.user import User
-from sqlmodel import Session, create_engine, select
+from sqlalchemy import event
+from sqlmodel import Session, create_engine, delete, select, text
 from web.dao import conversations
 
 # TODO: DRY with other test files
@@ -165,3 +171,473 @@ def test_branch_reply_to_turn(db_session: Session):
     assert updated_prev.primary_child_id is None
     assert updated_prev.branched_child_ids == [updated_new.id]
     assert updated_new.human_text == "What does conductivity mean?"
+
+
+def test_reply_and_branch_are_one_transaction(db_session: Session):
+    user = User(uid="transaction_test_uid", email="transaction@test.com")
+    db_session.add(user)
+    db_session.commit()
+    parent = Turn(user_id=user.id, human_text="Q", bot_text="A", model="m", title="T")
+    db_session.add(parent)
+    db_session.commit()
+    user_id, parent_id = user.id, parent.id
+    # Start from a cold session, as a request would
+    db_session.expunge_all()
+
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement.split()[0])
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        reply = conversations.reply_to_turn(db_session, user_id, parent_id, "reply")
+        branch = conversations.branch_reply_to_turn(
+            db_session, user_id, parent_id, "branch"
+        )
+        # Nothing is re-selected to read the returned turns
+        assert reply.created_at and branch.created_at
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+    # Load the parent, insert the child, link it to the parent (and commit, which
+    # inside the test's outer transaction is a savepoint release)
+    per_call = ["SELECT", "INSERT", "UPDATE"]
+    assert [s for s in statements if s != "RELEASE"] == per_call + per_call
+
+    parent = db_session.get(Turn, parent_id)
+    assert parent.primary_child_id == reply.id
+    assert parent.branched_child_ids == [branch.id]
+
+
+def test_concurrent_branches_are_not_lost():
+    """Parallel branches from one parent each get appended to its branched_child_ids"""
+    branches = 50
+    with Session(engine) as session:
+        user = User(uid="concurrent_branch_uid", email="concurrent@test.com")
+        session.add(user)
+        session.commit()
+        parent = Turn(
+            user_id=user.id, human_text="Q", bot_text="A", model="m", title="T"
+        )
+        session.add(parent)
+        session.commit()
+        user_id, parent_id = user.id, parent.id
+
+    def branch(i: int) -> UUID:
+        with Session(engine) as session:
+            return conversations.branch_reply_to_turn(
+                session, user_id, parent_id, f"Branch {i}"
+            ).id
+
+    try:
+        with ThreadPoolExecutor(max_workers=branches) as pool:
+            branch_ids = list(pool.map(branch, range(branches)))
+
+        with Session(engine) as session:
+            parent = session.get(Turn, parent_id)
+            assert sorted(parent.branched_child_ids) == sorted(branch_ids)
+    finally:
+        with Session(engine) as session:
+            session.exec(delete(Turn).where(Turn.user_id == user_id))
+            session.exec(delete(User).where(User.id == user_id))
+            session.commit()
+
+
+def test_versions_follow_commit_order():
+    """
+    A change made first but committed last still moves the versions on, so a client
+    that saw the other change first doesn't keep getting 304s without it
+    """
+    with Session(engine) as session:
+        user = User(uid="version_uid", email="version@test.com")
+        session.add(user)
+        session.commit()
+        root = Turn(user_id=user.id, human_text="Q", bot_text="A", model="m", title="T")
+        session.add(root)
+        session.commit()
+        reply = conversations.reply_to_turn(session, user.id, root.id, "Q2")
+        user_id, root_id, reply_id = user.id, root.id, reply.id
+
+    def versions() -> tuple:
+        with Session(engine) as session:
+            return (
+                conversations.get_user_version(session, user_id),
+                conversations.get_tree_version(session, reply_id, user_id),
+            )
+
+    def answer(session: Session, turn_id: UUID, text: str) -> None:
+        turn = session.get(Turn, turn_id)
+        turn.bot_text = text
+        session.add(turn)
+        session.flush()
+
+    first, second = Session(engine), Session(engine)
+    try:
+        # The first change is made, but not committed, before the second
+        answer(first, root_id, "A, edited")
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            committed = pool.submit(
+                lambda: (answer(second, reply_id, "A2"), second.commit())
+            )
+            # The second waits for the first to commit, rather than committing first
+            # with a version the first's commit wouldn't move past
+            time.sleep(0.2)
+            seen = versions()
+            first.commit()
+            committed.result()
+        after = versions()
+        assert after[0] > seen[0]
+        assert after[1] > seen[1]
+    finally:
+        first.close()
+        second.close()
+        with Session(engine) as session:
+            session.exec(delete(Turn).where(Turn.user_id == user_id))
+            session.exec(delete(User).where(User.id == user_id))
+            session.commit()
+
+
+def test_full_conversation_from_leaf_and_missing_turn(db_session: Session):
+    user = User(uid="test_uid_123", email="test@example.com")
+    db_session.add(user)
+    db_session.commit()
+
+    seed.seed_turns(db_session, user.id)
+
+    stmt = select(Turn).where(
+        Turn.human_text == "Why does the depletion region create an electric field?"
+    )
+    leaf = db_session.exec(stmt).one()
+
+    full_convo = conversations.get_full_conversation_from_turn_id(
+        db_session, leaf.id, user.id
+    )
+
+    expected_texts = [
+        "Can you explain to me the BJT (semiconductor)?",
+        "Can you explain to me the basics of semiconductors first?",
+        "Can you explain the p-n junction?",
+        "Why does the depletion region create an electric field?",
+    ]
+    assert [turn.human_text for turn in full_convo] == expected_texts
+
+    assert (
+        conversations.get_full_conversation_from_turn_id(db_session, uuid4(), user.id)
+        == []
+    )
+
+    with pytest.raises(ValueError):
+        conversations.get_full_conversation_from_turn_id(db_session, leaf.id, uuid4())
+
+
+def test_conversation_tree_and_ancestry(db_session: Session):
+    user = User(uid="test_uid_123", email="test@example.com")
+    db_session.add(user)
+    db_session.commit()
+
+    seed.seed_turns(db_session, user.id)
+
+    root = db_session.exec(
+        select(Turn).where(
+            Turn.human_text == "Can you explain to me the BJT (semiconductor)?"
+        )
+    ).one()
+    new_turn = conversations.branch_reply_to_turn(
+        session=db_session,
+        user_id=user.id,
+        parent_turn_id=root.id,
+        text="What about MOSFETs?",
+    )
+
+    assert new_turn.root_id == root.id
+    assert new_turn.depth == 1
+    assert new_turn.path == [root.id, new_turn.id]
+
+    tree = conversations.get_conversation_tree(db_session, new_turn.id, user.id)
+    assert len(tree) == 7
+    assert tree[0].id == root.id
+    assert all(turn.root_id == root.id for turn in tree)
+    assert [turn.depth for turn in tree] == sorted(turn.depth for turn in tree)
+
+    with pytest.raises(ValueError):
+        conversations.get_conversation_tree(db_session, new_turn.id, uuid4())
+
+
+def test_search_turns(db_session: Session):
+    user = User(uid="test_uid_123", email="test@example.com")
+    db_session.add(user)
+    db_session.commit()
+
+    seed.seed_turns(db_session, user.id)
+
+    root = db_session.exec(
+        select(Turn).where(
+            Turn.human_text == "Can you explain to me the BJT (semiconductor)?"
+        )
+    ).one()
+    new_turn = conversations.branch_reply_to_turn(
+        session=db_session,
+        user_id=user.id,
+        parent_turn_id=root.id,
+        text="What about MOSFETs?",
+    )
+
+    (hit,) = conversations.search_turns(db_session, user.id, "mosfet")
+    assert (hit.turn_id, hit.root_id) == (new_turn.id, root.id)
+    assert hit.title == new_turn.title
+    start, stop = conversations.SNIPPET_START, conversations.SNIPPET_STOP
+    assert f"What about {start}MOSFETs{stop}" in hit.snippet
+
+    # Stemmed, and the human's words rank above the bot's
+    hits = conversations.search_turns(db_session, user.id, "amplify")
+    assert [hit.turn_id for hit in hits] == [root.primary_child_id, root.id]
+    assert hits[0].rank > hits[1].rank
+    assert f"{start}amplify{stop}" in hits[1].snippet
+
+    hits = conversations.search_turns(db_session, user.id, "semiconductors -bjt")
+    assert hits
+    assert all("BJT" not in hit.snippet for hit in hits)
+    hits = conversations.search_turns(db_session, user.id, "junction", limit=1)
+    assert len(hits) == 1
+
+    assert conversations.search_turns(db_session, user.id, '"junction p-n"') == []
+    assert conversations.search_turns(db_session, uuid4(), "mosfet") == []
+
+
+def test_seed_forest(db_session: Session):
+    """Synthetic trees are loaded with consistent links and ancestry"""
+    shape = seed.TreeShape(depth=12, branching=2, branch_every=5, branch_depth=3)
+    user_ids = seed.seed_synthetic_users(db_session, 2, prefix="test_forest_")
+    trees = seed.seed_forest(db_session, user_ids, turns=3 * shape.size(), shape=shape)
+
+    assert len(trees) == 3
+    assert [tree.user_id for tree in trees] == [*user_ids, user_ids[0]]
+
+    tree = trees[0]
+    middle = tree.trunk[len(tree.trunk) // 2]
+    convo = conversations.get_full_conversation_from_turn_id(
+        db_session, middle, tree.user_id
+    )
+    assert [turn.id for turn in convo] == tree.trunk
+
+    full_tree = conversations.get_conversation_tree(db_session, middle, tree.user_id)
+    assert len(full_tree) == shape.size() == 12 + 2 * 2 * 3
+    by_id = {turn.id: turn for turn in full_tree}
+    for turn in full_tree[1:]:
+        parent = by_id[turn.parent_id]
+        assert turn.path == [*parent.path, turn.id]
+        assert turn.id in (parent.primary_child_id, *parent.branched_child_ids)
+    branch_points = [by_id[turn_id] for turn_id in tree.branch_points]
+    assert [len(turn.branched_child_ids) for turn in branch_points] == [2, 2]
+
+    # Each tree's branches are separate conversations, as well as its root
+    listed = conversations.get_separable_conversations(db_session, user_ids[1])
+    assert len(listed) == 1 + 2 * 2
+
+
+# Large enough that the planner would never pick an index on a table this size
+# unless it actually helps; override to iterate faster locally. Seeding that many
+# takes a while, so the plan test only runs with EXPLAIN_TESTS=1, like the benchmarks
+EXPLAIN_TESTS = os.environ.get("EXPLAIN_TESTS") == "1"
+EXPLAIN_TURN_COUNT = int(os.environ.get("EXPLAIN_TURN_COUNT", 1_000_000))
+
+
+def _seed_synthetic_turns(session: Session, count: int) -> None:
+    # Spread turns over 1000 users; a third are roots and the rest replies
+    session.exec(
+        text(
+            """
+            INSERT INTO main.turn (
+                id, created_at, parent_id, primary_child_id, branched_child_ids,
+                root_id, depth, path, title, user_id, human_text, model, bot_text,
+                status, attempts
+            )
+            SELECT
+                gen_random_uuid(),
+                now() - i * interval '1 second',
+                CASE WHEN i % 3 = 0 THEN NULL ELSE gen_random_uuid() END,
+                NULL,
+                '{}',
+                NULL,
+                0,
+                '{}',
+                'Synthetic',
+                md5((i % 1000)::text)::uuid,
+                'Question',
+                'gemini-2.5-flash',
+                'Answer',
+                'complete',
+                1
+            FROM generate_series(1, :count) AS i
+            """
+        ).bindparams(count=count)
+    )
+    session.exec(text("ANALYZE main.turn"))
+
+
+def _explain(session: Session, run) -> str:
+    """Run `run()` and return the query plan of the last statement it executed"""
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    connection = session.connection()
+    event.listen(connection, "before_cursor_execute", capture)
+    try:
+        run()
+    finally:
+        event.remove(connection, "before_cursor_execute", capture)
+
+    statement, parameters = statements[-1]
+    cursor = connection.connection.cursor()
+    cursor.execute(f"EXPLAIN {statement}", parameters)
+    return "\n".join(row[0] for row in cursor.fetchall())
+
+
+@pytest.mark.skipif(not EXPLAIN_TESTS, reason="set EXPLAIN_TESTS=1 to check plans")
+def test_query_plans_use_indexes(db_session: Session):
+    user = User(uid="test_uid_123", email="test@example.com")
+    db_session.add(user)
+    db_session.commit()
+    # seed_turns clears the table, so it has to run before the synthetic load
+    seed.seed_turns(db_session, user.id)
+    turn = db_session.exec(select(Turn).where(Turn.user_id == user.id)).first()
+
+    _seed_synthetic_turns(db_session, EXPLAIN_TURN_COUNT)
+
+    # A page (plus one), as GET /api/conversations asks for
+    plan = _explain(
+        db_session,
+        lambda: conversations.get_separable_conversations(
+            db_session, user.id, limit=51
+        ),
+    )
+    assert "ix_turn_user_id_created_at_id" in plan
+
+    plan = _explain(
+        db_session,
+        lambda: conversations.get_tree_version(db_session, turn.id, user.id),
+    )
+    # (tree_version is too small here for its key to beat a scan)
+    assert "turn_pkey" in plan
+
+    plan = _explain(
+        db_session,
+        lambda: db_session.exec(select(Turn).where(Turn.parent_id == turn.id)).all(),
+    )
+    assert "ix_turn_parent_id" in plan
+
+    plan = _explain(
+        db_session,
+        lambda: conversations.get_full_conversation_from_turn_id(
+            db_session, turn.id, user.id
+        ),
+    )
+    assert "turn_pkey" in plan
+    assert "Seq Scan on turn" not in plan
+
+    plan = _explain(
+        db_session,
+        lambda: conversations.get_conversation_tree(db_session, turn.id, user.id),
+    )
+    assert "ix_turn_root_id_depth" in plan
+
+    plan = _explain(
+        db_session,
+        lambda: conversations.search_turns(db_session, user.id, "depletion region"),
+    )
+    assert "ix_turn_search_vector" in plan
+
+
+def _thread(session: Session, length: int) -> list[Turn]:
+    """A single thread of `length` answered turns ("q0"/"a0", "q1"/"a1", ...)"""
+    user = User(uid="history_test_uid", email="history@test.com")
+    session.add(user)
+    session.commit()
+
+    turn = Turn(
+        user_id=user.id, human_text="q0", bot_text="a0", model="m", title="Thread"
+    )
+    session.add(turn)
+    session.commit()
+    turns = [turn]
+    for i in range(1, length):
+        turn = conversations.reply_to_turn(session, user.id, turn.id, f"q{i}")
+        turn.bot_text = f"a{i}"
+        session.add(turn)
+        session.commit()
+        turns.append(turn)
+    return turns
+
+
+def _texts(contents: list[dict]) -> list[str]:
+    return [content["parts"][0]["text"] for content in contents]
+
+
+def test_full_history(db_session: Session):
+    turns = _thread(db_session, 4)
+
+    history = FullHistory().build(db_session, turns[-1])
+
+    assert _texts(history.contents) == ["q0", "a0", "q1", "a1", "q2", "a2"]
+    assert history.turns == 3
+    assert history.tokens == 6 * approx_tokens("q0")
+    assert not history.summarized
+
+
+def test_budgeted_history_window_budget_and_summary(db_session: Session):
+    turns = _thread(db_session, 6)
+    leaf = turns[-1]
+
+    # The recent-turns window
+    history = BudgetedHistory(max_tokens=1000, recent_turns=2).build(db_session, leaf)
+    assert _texts(history.contents) == ["q3", "a3", "q4", "a4"]
+    assert history.turns == 2
+    assert not history.summarized
+
+    # The token budget (each exchange is ~2 tokens, and the message itself 1)
+    history = BudgetedHistory(max_tokens=5, recent_turns=10).build(db_session, leaf)
+    assert _texts(history.contents) == ["q3", "a3", "q4", "a4"]
+    assert history.tokens == 4
+
+    # Left-out turns are replaced by the newest one's rolling summary
+    turns[2].summary = "Counted to two"
+    db_session.add(turns[2])
+    db_session.commit()
+    history = BudgetedHistory(max_tokens=1000, recent_turns=2).build(db_session, leaf)
+    assert history.summarized
+    assert "Counted to two" in _texts(history.contents)[0]
+    assert _texts(history.contents)[2:] == ["q3", "a3", "q4", "a4"]
+    assert history.tokens == sum(map(approx_tokens, _texts(history.contents)))
+
+    # Short threads are sent whole
+    history = BudgetedHistory(max_tokens=1000, recent_turns=10).build(db_session, leaf)
+    assert history.turns == 5
+
+
+def test_cached_history(db_session: Session):
+    turns = _thread(db_session, 3)
+    user_id = turns[0].user_id
+    builder = CachedHistory(
+        BudgetedHistory(max_tokens=1000, recent_turns=10), maxsize=1
+    )
+
+    # Replies and branches from the same turn share its history
+    first = builder.build(db_session, turns[-1])
+    branch = conversations.branch_reply_to_turn(db_session, user_id, turns[1].id, "b")
+    assert builder.build(db_session, branch) is first
+    assert builder.cache.stats()["hits"] == 1
+    assert builder.cache.stats()["misses"] == 1
+
+    # Histories with turns still generating aren't kept
+    pending = conversations.reply_to_turn(db_session, user_id, turns[-1].id, "q3")
+    child = conversations.reply_to_turn(db_session, user_id, pending.id, "q4")
+    builder.build(db_session, child)
+    assert len(builder.cache) == 1
+    assert builder.cache.stats()["evictions"] == 0
+
+    # Least recently used entries are evicted
+    builder.build(db_session, pending)
+    assert builder.cache.stats()["evictions"] == 1
@@ -0,0 +1,106 @@
+"""
+A Postgres-backed queue of turns waiting for their bot response.
+
+There is no separate jobs table: a turn with status `pending` *is* the job. Workers
+claim the oldest one with `FOR UPDATE SKIP LOCKED`, so any number of them can poll
+concurrently without handing the same turn out twice.
+"""
+
+from datetime import UTC, datetime, timedelta
+from uuid import UUID
+
+from models.turn import Turn, TurnStatus
+from sqlalchemy import and_, func, update
+from sqlmodel import Session, or_, select
+
+# A turn that has been `running` this long is assumed to belong to a dead worker
+STALE_AFTER = timedelta(minutes=5)
+
+MAX_ATTEMPTS = 3
+
+
+def initial_status(*, queued: bool) -> dict:
+    """
+    The status fields of a new turn: pending, for a worker to claim, if `queued`;
+    otherwise already running, claimed by the process that inserts it and generates its
+    reply itself, so no worker picks it up too.
+    """
+    if queued:
+        return {"status": TurnStatus.PENDING}
+    return {"status": TurnStatus.RUNNING, "claimed_at": datetime.now(UTC)}
+
+
+def _abandoned(stale_after: timedelta):
+    return and_(
+        Turn.status == TurnStatus.RUNNING,
+        Turn.claimed_at < func.now() - stale_after,
+    )
+
+
+def claim_generation_job(
+    session: Session, *, stale_after: timedelta = STALE_AFTER
+) -> UUID | None:
+    """
+    Mark the oldest pending (or abandoned) turn as running and return its id, or None
+    if there is nothing to do.
+
+    A turn running for longer than `stale_after` is abandoned. It's only retried if a
+    worker claimed it and it has attempts left; otherwise it's marked failed, so
+    clients waiting on it stop. That covers a turn that keeps killing its worker, and
+    one a web process inserted to generate itself (see `initial_status`) and never
+    finished: those are never claimed, so have no attempts.
+    """
+    session.exec(
+        update(Turn)
+        .where(
+            _abandoned(stale_after),
+            or_(Turn.attempts == 0, Turn.attempts >= MAX_ATTEMPTS),
+        )
+        .values(status=TurnStatus.FAILED, claimed_at=None)
+    )
+
+    next_job = (
+        select(Turn.id)
+        .where(
+            or_(
+                Turn.status == TurnStatus.PENDING,
+                and_(_abandoned(stale_after), Turn.attempts < MAX_ATTEMPTS),
+            )
+        )
+        .order_by(Turn.created_at)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+    stmt = (
+        update(Turn)
+        .where(Turn.id == next_job)
+        .values(
+            status=TurnStatus.RUNNING,
+            attempts=Turn.attempts + 1,
+            claimed_at=func.now(),
+        )
+        .returning(Turn.id)
+    )
+
+    turn_id = session.exec(stmt).scalar_one_or_none()
+    session.commit()
+    return turn_id
+
+
+def set_turn_status(session: Session, turn_id: UUID, status: TurnStatus) -> None:
+    session.exec(
+        update(Turn).where(Turn.id == turn_id).values(status=status, claimed_at=None)
+    )
+    session.commit()
+
+
+def release_failed_job(session: Session, turn_id: UUID) -> TurnStatus:
+    """
+    Put a turn whose generation failed back in the queue, unless it has used up its
+    attempts, in which case it is marked failed. Returns the new status.
+    """
+    turn = session.get(Turn, turn_id)
+    status = TurnStatus.PENDING if turn.attempts < MAX_ATTEMPTS else TurnStatus.FAILED
+    set_turn_status(session, turn_id, status)
+    return status
@@ -0,0 +1,122 @@
+import os
+from datetime import UTC, datetime, timedelta
+
+import pytest
+from database.database import create_all_tables
+from models.turn import Turn, TurnStatus
+from models.user import User
+from sqlmodel import Session, create_engine
+from web.dao import generation_jobs
+
+DATABASE_URL = os.environ["TEST_DATABASE_URL"]
+
+# Fix for PostgreSQL URLs from Heroku
+if DATABASE_URL.startswith("postgres://"):
+    DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
+
+engine = create_engine(DATABASE_URL)
+
+create_all_tables(engine)
+
+
+@pytest.fixture(name="db_session")
+def db_session_fixture():
+    """
+    A transactional fixture that yields a database session and
+    rolls back the transaction after the test.
+    """
+    connection = engine.connect()
+    transaction = connection.begin()
+    session = Session(bind=connection)
+    try:
+        yield session
+    finally:
+        session.close()
+        transaction.rollback()
+        connection.close()
+
+
+def test_claim_and_release_generation_job(db_session: Session):
+    user = User(uid="queue_test_uid", email="queue@test.com")
+    db_session.add(user)
+    db_session.commit()
+
+    done = Turn(
+        user_id=user.id,
+        human_text="Done",
+        bot_text="Answer",
+        model="gemini-2.5-flash",
+        title="Done",
+        status=TurnStatus.COMPLETE,
+    )
+    queued = Turn(
+        user_id=user.id, human_text="Queued", model="gemini-2.5-flash", title="Queued"
+    )
+    db_session.add_all([done, queued])
+    db_session.commit()
+
+    assert generation_jobs.claim_generation_job(db_session) == queued.id
+    db_session.refresh(queued)
+    assert queued.status == TurnStatus.RUNNING
+    assert queued.attempts == 1
+    assert queued.claimed_at is not None
+
+    # Running turns aren't handed out again until they look abandoned
+    assert generation_jobs.claim_generation_job(db_session) is None
+    queued.claimed_at -= generation_jobs.STALE_AFTER + timedelta(minutes=1)
+    db_session.add(queued)
+    db_session.commit()
+    assert generation_jobs.claim_generation_job(db_session) == queued.id
+
+    # Failures are retried until the turn runs out of attempts
+    assert (
+        generation_jobs.release_failed_job(db_session, queued.id) == TurnStatus.PENDING
+    )
+    assert generation_jobs.claim_generation_job(db_session) == queued.id
+    assert (
+        generation_jobs.release_failed_job(db_session, queued.id) == TurnStatus.FAILED
+    )
+    assert generation_jobs.claim_generation_job(db_session) is None
+
+
+def test_abandoned_turns_without_attempts_left_fail(db_session: Session):
+    """
+    An abandoned turn isn't retried once it's used up its attempts, nor if a web
+    process was generating it; it's failed instead
+    """
+    user = User(uid="queue_test_uid", email="queue@test.com")
+    db_session.add(user)
+    db_session.commit()
+
+    stale = datetime.now(UTC) - generation_jobs.STALE_AFTER - timedelta(minutes=1)
+    exhausted = Turn(
+        user_id=user.id,
+        human_text="Exhausted",
+        model="gemini-2.5-flash",
+        title="Exhausted",
+        status=TurnStatus.RUNNING,
+        attempts=generation_jobs.MAX_ATTEMPTS,
+        claimed_at=stale,
+    )
+    inline = Turn(
+        user_id=user.id,
+        human_text="Inline",
+        model="gemini-2.5-flash",
+        title="Inline",
+        **generation_jobs.initial_status(queued=False),
+    )
+    db_session.add_all([exhausted, inline])
+    db_session.commit()
+
+    # Generated inline, and not abandoned yet
+    assert generation_jobs.claim_generation_job(db_session) is None
+    db_session.refresh(exhausted)
+    assert exhausted.status == TurnStatus.FAILED
+
+    inline.claimed_at = stale
+    db_session.add(inline)
+    db_session.commit()
+    assert generation_jobs.claim_generation_job(db_session) is None
+    db_session.refresh(inline)
+    assert inline.status == TurnStatus.FAILED
+    assert inline.attempts == 0
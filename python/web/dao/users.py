@@ -0,0 +1,53 @@
+"""
+Looking up users by Firebase uid.
+
+A user's id never changes, so uid -> id is kept in-process after the first lookup.
+Entries only go stale if a user row is deleted and re-created (or the tables reset),
+which is why everything that creates users calls `forget_user_ids`.
+"""
+
+from collections import OrderedDict
+from threading import Lock
+from uuid import UUID
+
+from models.user import User
+from sqlmodel import Session, select
+
+# Users to remember (evicted least recently used first)
+MAX_CACHED_USERS = 100_000
+
+# uid -> user id, least recently used first. Read from the event loop and the
+# threadpool alike, so only touched under the lock.
+_user_ids: OrderedDict[str, UUID] = OrderedDict()
+_lock = Lock()
+
+
+def cached_user_id(uid: str) -> UUID | None:
+    with _lock:
+        user_id = _user_ids.get(uid)
+        if user_id is not None:
+            _user_ids.move_to_end(uid)
+        return user_id
+
+
+def get_user_id(session: Session, uid: str) -> UUID | None:
+    if user_id := cached_user_id(uid):
+        return user_id
+
+    user_id = session.exec(select(User.id).where(User.uid == uid)).first()
+    if user_id is not None:
+        with _lock:
+            _user_ids[uid] = user_id
+            _user_ids.move_to_end(uid)
+            while len(_user_ids) > MAX_CACHED_USERS:
+                _user_ids.popitem(last=False)
+    return user_id
+
+
+def forget_user_ids(*uids: str) -> None:
+    """Drop the cached ids for `uids`, or for everyone if none are given"""
+    with _lock:
+        if not uids:
+            _user_ids.clear()
+        for uid in uids:
+            _user_ids.pop(uid, None)
@@ -0,0 +1,28 @@
+"""
+JSON responses encoded straight from plain values.
+
+Returning a model (or ORM object) from a FastAPI handler validates it against the
+route's response_model, field by field, before encoding it. For lists of hundreds or
+thousands of turns that dominates the request, so the handlers for them select just the
+columns the response needs (see the *_rows functions in web.dao.conversations) and
+return a `FastJSONResponse` of those, which FastAPI passes through as is.
+
+They're encoded with pydantic_core.to_json, so the output is byte for byte what the
+response_model path produces (UUIDs and datetimes as pydantic formats them, UTF-8, no
+whitespace), and clients can't tell the difference.
+It's up to each handler to put in exactly the response model's fields.
+"""
+
+from typing import Any
+
+import pydantic_core
+from fastapi.responses import JSONResponse
+
+
+def dumps(content: Any) -> bytes:
+    return pydantic_core.to_json(content)
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -1,12 +1,14 @@
 # TODO: remove this entire module, this is just for quick iteration early on
+from auth.firebase import authenticate
 from database import seed
+from database.bulk import upsert_users
 from database.database import create_all_tables, get_session, get_test_session
 from fastapi import APIRouter, Depends, HTTPException
 from firebase_admin import auth as fb_auth
-from models.user import User
 from pydantic import BaseModel
 from sqlalchemy import inspect
-from sqlmodel import Session, select
+from sqlmodel import Session
+from web.dao import users
 
 router = APIRouter(prefix="/api", tags=["admin"])
 
@@ -26,6 +28,7 @@ def seed_user(session: Session) -> bool:
     Returns True if it succeeded
     """
     # Get all users from Firebase (paginated)
+    authenticate()
     page = fb_auth.list_users()
     firebase_users = []
 
@@ -33,24 +36,19 @@ def seed_user(session: Session) -> bool:
         firebase_users.extend(page.users)
         page = page.get_next_page() if page.has_next_page else None
 
-    # Process each Firebase user
     for fb_user in firebase_users:
         if not fb_user.email:
             raise ValueError(f"{fb_user} doesn't have an email?")
 
-        # Check if user already exists in DB. TODO: should be `one`?
-        existing_user = session.exec(
-            select(User).where(User.uid == fb_user.uid)
-        ).one_or_none()
-
-        if existing_user:
-            pass
-        else:
-            # Create new user
-            new_user = User(uid=fb_user.uid, email=fb_user.email)
-            session.add(new_user)
+    # One INSERT per batch of users, skipping the ones already in the database,
+    # rather than a SELECT and an INSERT per user
+    created_uids = upsert_users(
+        session, ((fb_user.uid, fb_user.email) for fb_user in firebase_users)
+    )
 
     session.commit()
+    if created_uids:
+        users.forget_user_ids(*created_uids)
     return True
 
 
@@ -65,6 +63,7 @@ def reset_database(session: Session = Depends(get_session)):
 
             inspector = inspect(conn)
             tables = inspector.get_table_names(schema="main")
+        users.forget_user_ids()
 
         return StatusResponse(
             success=True, message=f"Reset successful. Tables now: {tables}"
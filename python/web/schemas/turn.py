@@ -11,4 +11,39 @@ class TurnResponse(BaseModel):
     branched_child_ids: list[UUID]
     human_text: str | None
     bot_text: str | None
+    status: str
+    # Approximate tokens sent to the model for bot_text
+    prompt_tokens: int | None = None
     created_at: datetime
+
+
+class TreeTurnResponse(BaseModel):
+    """A turn's place in its conversation tree, and its text unless left out"""
+
+    id: UUID
+    parent_id: UUID | None
+    primary_child_id: UUID | None
+    branched_child_ids: list[UUID]
+    depth: int
+    title: str
+    status: str
+    created_at: datetime
+    human_text: str | None = None
+    bot_text: str | None = None
+
+
+class ConversationTreeResponse(BaseModel):
+    root_id: UUID
+    # Ordered by depth, so every turn comes after its parent
+    turns: list[TreeTurnResponse]
+
+
+class SearchResultResponse(BaseModel):
+    turn_id: UUID
+    # The conversation tree the turn is in
+    root_id: UUID
+    title: str
+    created_at: datetime
+    rank: float
+    # Excerpts of the turn's texts, each match wrapped in "\x02" and "\x03"
+    snippet: str
@@ -0,0 +1,157 @@
+"""
+The built frontend (see javascript/vite.config.ts), served from memory.
+
+`StaticAssets.load` reads every file under the build directory once, at startup, along
+with gzip (and brotli, if the `brotli` package is installed) versions of the ones worth
+compressing. Requests then don't touch the disk or compress anything: each gets the
+smallest version its Accept-Encoding allows. Compressed files built alongside an asset
+(`index-Bx1x3k9a.js.br`, `...js.gz`, as compression plugins emit them) are used instead
+of compressing it here.
+
+Vite names everything it emits under assets/ by content hash, so those are cached as
+immutable. The rest (index.html and the files from javascript/public) keep their names
+across deploys, so clients revalidate them by ETag.
+"""
+
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+from dataclasses import dataclass
+
+from fastapi import Request, Response
+
+try:
+    import brotli
+except ImportError:  # Optional: without it, only .br files built with the assets count
+    brotli = None
+
+# Vite's build.assetsDir
+HASHED_DIR = "assets/"
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+
+# Below this, compressing saves less than the headers cost
+MIN_COMPRESS_BYTES = 512
+COMPRESSIBLE_TYPES = re.compile(
+    r"^(text/|image/svg\+xml$|application/(javascript|json|manifest\+json|xml)$)"
+)
+
+# Content-Encoding -> suffix of a file compressed with it, in order of preference
+ENCODINGS = {"br": ".br", "gzip": ".gz"}
+
+
+def _compress(encoding: str, body: bytes) -> bytes | None:
+    if encoding == "gzip":
+        # mtime=0 so the same file always compresses the same
+        return gzip.compress(body, compresslevel=9, mtime=0)
+    if encoding == "br" and brotli is not None:
+        return brotli.compress(body, quality=11)
+    return None
+
+
+def _accepted_encodings(accept_encoding: str) -> set[str]:
+    accepted = set()
+    for item in accept_encoding.split(","):
+        coding, _, params = item.partition(";")
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                if float(params[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(coding.strip().lower())
+    return accepted
+
+
+@dataclass
+class Asset:
+    media_type: str
+    cache_control: str
+    # Content-Encoding ("identity" for the file as is) -> body and its ETag
+    bodies: dict[str, bytes]
+    etags: dict[str, str]
+
+    def response(self, request: Request) -> Response:
+        accepted = _accepted_encodings(request.headers.get("accept-encoding", ""))
+        encoding = next(
+            (
+                encoding
+                for encoding in ENCODINGS
+                if encoding in self.bodies and (encoding in accepted or "*" in accepted)
+            ),
+            "identity",
+        )
+        headers = {"ETag": self.etags[encoding], "Cache-Control": self.cache_control}
+        if len(self.bodies) > 1:
+            headers["Vary"] = "Accept-Encoding"
+
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match:
+            tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+            if self.etags[encoding] in tags or "*" in tags:
+                return Response(status_code=304, headers=headers)
+
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        return Response(
+            self.bodies[encoding], media_type=self.media_type, headers=headers
+        )
+
+
+def _load_asset(path: str, name: str) -> Asset:
+    with open(path, "rb") as f:
+        body = f.read()
+    media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+
+    bodies = {"identity": body}
+    if len(body) >= MIN_COMPRESS_BYTES and COMPRESSIBLE_TYPES.match(media_type):
+        for encoding, suffix in ENCODINGS.items():
+            if os.path.exists(path + suffix):
+                with open(path + suffix, "rb") as f:
+                    compressed = f.read()
+            else:
+                compressed = _compress(encoding, body)
+            if compressed is not None and len(compressed) < len(body):
+                bodies[encoding] = compressed
+
+    # A strong ETag per encoding, as each is a different sequence of bytes
+    digest = hashlib.sha256(body).hexdigest()[:32]
+    etags = {
+        encoding: f'"{digest}"' if encoding == "identity" else f'"{digest}-{encoding}"'
+        for encoding in bodies
+    }
+    return Asset(
+        media_type=media_type,
+        cache_control=IMMUTABLE if name.startswith(HASHED_DIR) else REVALIDATE,
+        bodies=bodies,
+        etags=etags,
+    )
+
+
+class StaticAssets:
+    def __init__(self, directory: str):
+        self.directory = directory
+        # Path relative to the directory, with forward slashes -> asset
+        self.assets: dict[str, Asset] = {}
+
+    def load(self) -> None:
+        """
+        Read every file in the directory, if it exists (the frontend may not be built)
+        """
+        assets = {}
+        for root, _, files in os.walk(self.directory):
+            for file in files:
+                path = os.path.join(root, file)
+                stem, suffix = os.path.splitext(path)
+                if suffix in ENCODINGS.values() and os.path.exists(stem):
+                    # A compressed version of another file
+                    continue
+                name = os.path.relpath(path, self.directory).replace(os.sep, "/")
+                assets[name] = _load_asset(path, name)
+        self.assets = assets
+
+    def get(self, name: str) -> Asset | None:
+        return self.assets.get(name)
@@ -0,0 +1,214 @@
+"""
+Where each request's time goes.
+
+`TimingMiddleware` starts a `RequestTimings` for every HTTP request. Code marks the
+request's phases (auth, user lookup, history, model call, ...) with `timed`, and
+SQLAlchemy cursor events add every query the request runs, from whichever thread runs
+it. The timings are then:
+
+- sent back in a Server-Timing header (so they show up in the browser's dev tools),
+- added to the Prometheus metrics served at /metrics, per route,
+- logged, with the request's queries, for requests slower than SLOW_REQUEST_SECONDS.
+
+A request whose query count jumps (an N+1 like walking a lineage turn by turn) stands
+out in all three.
+"""
+
+import logging
+import os
+import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from threading import Lock
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from web.metrics import Histogram
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+SLOW_REQUEST_SECONDS = float(os.environ.get("SLOW_REQUEST_SECONDS", 1))
+
+# Queries kept per request for the slow request log (all of them are counted and timed)
+MAX_LOGGED_QUERIES = 100
+LOGGED_STATEMENT_CHARS = 200
+
+request_duration = Histogram(
+    "http_request_duration_seconds",
+    "Time from receiving a request to sending the last of its response",
+    ("method", "route", "status"),
+)
+phase_duration = Histogram(
+    "http_request_phase_seconds",
+    "Time spent in each phase of a request",
+    ("route", "phase"),
+)
+query_count = Histogram(
+    "http_request_db_queries",
+    "Database queries run per request",
+    ("route",),
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100, 200, 500),
+)
+query_duration = Histogram(
+    "http_request_db_seconds",
+    "Time per request spent in database queries",
+    ("route",),
+)
+
+
+class RequestTimings:
+    def __init__(self):
+        self.start = time.perf_counter()
+        # Phase -> seconds, summed over each time the phase ran
+        self.phases: dict[str, float] = {}
+        self.query_count = 0
+        self.query_seconds = 0.0
+        # (statement, seconds), up to MAX_LOGGED_QUERIES
+        self.queries: list[tuple[str, float]] = []
+        # Queries run in the threadpool while the event loop carries on
+        self._lock = Lock()
+
+    def add_phase(self, phase: str, seconds: float) -> None:
+        with self._lock:
+            self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def add_query(self, statement: str, seconds: float) -> None:
+        with self._lock:
+            self.query_count += 1
+            self.query_seconds += seconds
+            if len(self.queries) < MAX_LOGGED_QUERIES:
+                self.queries.append((statement, seconds))
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.start
+
+    def server_timing(self) -> str:
+        """The Server-Timing header value, as of now"""
+        with self._lock:
+            metrics = [
+                f"{phase};dur={seconds * 1000:.1f}"
+                for phase, seconds in self.phases.items()
+            ]
+            metrics.append(
+                f"db;dur={self.query_seconds * 1000:.1f}"
+                f';desc="{self.query_count} queries"'
+            )
+        metrics.append(f"total;dur={self.elapsed() * 1000:.1f}")
+        return ", ".join(metrics)
+
+    def log_message(self, request: str) -> str:
+        phases = ", ".join(
+            f"{phase} {seconds * 1000:.0f}ms" for phase, seconds in self.phases.items()
+        )
+        lines = [
+            f"Slow request: {request} took {self.elapsed() * 1000:.0f}ms"
+            f" ({phases or 'no phases'});"
+            f" {self.query_count} queries in {self.query_seconds * 1000:.0f}ms"
+        ]
+        for statement, seconds in self.queries:
+            statement = re.sub(r"\s+", " ", statement).strip()
+            lines.append(
+                f"  {seconds * 1000:7.1f}ms {statement[:LOGGED_STATEMENT_CHARS]}"
+            )
+        if self.query_count > len(self.queries):
+            lines.append(f"  ... and {self.query_count - len(self.queries)} more")
+        return "\n".join(lines)
+
+
+_current: ContextVar[RequestTimings | None] = ContextVar("timings", default=None)
+
+
+@contextmanager
+def timed(phase: str):
+    """Time the block as `phase` of the current request (a no-op outside requests)"""
+    timings = _current.get()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if timings is not None:
+            timings.add_phase(phase, time.perf_counter() - start)
+
+
+# Queries are attributed through the context, which run_in_threadpool and
+# asyncio.to_thread both carry over to the worker thread
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    timings = _current.get()
+    starts = conn.info.get("query_start")
+    if timings is not None and starts:
+        timings.add_query(statement, time.perf_counter() - starts.pop())
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(exception_context):
+    conn = exception_context.connection
+    if conn is not None and conn.info.get("query_start"):
+        conn.info["query_start"].pop()
+
+
+class TimingMiddleware:
+    """
+    Records a `RequestTimings` for each HTTP request. A plain ASGI middleware rather
+    than BaseHTTPMiddleware, so streamed responses are timed to their last chunk.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = RequestTimings()
+        token = _current.set(timings)
+        status = 500
+
+        async def send_with_timing(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                # Everything up to the response headers, i.e. all of it unless the
+                # body is streamed
+                MutableHeaders(scope=message).append(
+                    "Server-Timing", timings.server_timing()
+                )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            self._record(scope, timings, status)
+
+    def _record(self, scope: Scope, timings: RequestTimings, status: int) -> None:
+        # The route's path template, not the request path, to keep the label values
+        # bounded
+        route = getattr(scope.get("route"), "path", None) or "unmatched"
+        elapsed = timings.elapsed()
+
+        request_duration.observe(
+            elapsed, method=scope["method"], route=route, status=status
+        )
+        for phase, seconds in timings.phases.items():
+            phase_duration.observe(seconds, route=route, phase=phase)
+        query_count.observe(timings.query_count, route=route)
+        query_duration.observe(timings.query_seconds, route=route)
+
+        if elapsed >= SLOW_REQUEST_SECONDS:
+            logger.warning(
+                timings.log_message(f"{scope['method']} {scope['path']} {status}")
+            )